@@ -0,0 +1,35 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Receive, Scope, Send
+
+if not hasattr(GZipResponder, "apply_compression"):
+    raise ImportError("StreamingGZipMiddleware needs starlette>=0.46 (see requirements.txt)")
+
+
+class _FlushingGZipResponder(GZipResponder):
+    """GZipResponder that sync-flushes the compressor after every streamed chunk.
+
+    Starlette's responder keeps streamed chunks inside the gzip stream until
+    the response ends, which turns NDJSON streams into one final burst.
+    """
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if not more_body:
+            return super().apply_compression(body, more_body=False)
+        self.gzip_file.write(body)
+        self.gzip_file.flush()
+        body = self.gzip_buffer.getvalue()
+        self.gzip_buffer.seek(0)
+        self.gzip_buffer.truncate()
+        return body
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that keeps streaming responses incremental"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _FlushingGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
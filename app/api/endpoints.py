@@ -1,7 +1,16 @@
 from fastapi import APIRouter, HTTPException, status, Query
-from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, AsyncIterator, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+import json
+from datetime import datetime
 from app.core.engine import ComparisonEngine, ComparisonError
-from app.data.db import DBHandler, DatabaseError
+from app.core.retention import RetentionJob
+from app.core.scheduler import ComparisonScheduler
+from app.data.async_db import AsyncDBHandler
+from app.data.db import DatabaseError
+from app.models import BatchComparisonRequest
+from app.services.fetcher import breaker_states
 import logging
 from app.config import settings
 from fastapi import APIRouter
@@ -10,26 +19,46 @@ from fastapi import APIRouter
 # Add prefix to router
 router = APIRouter(prefix="/api/v1")
 engine = ComparisonEngine()
-db_handler = DBHandler()
+scheduler = ComparisonScheduler(engine)
+db_handler = AsyncDBHandler()
+retention = RetentionJob(db_handler)
 logger = logging.getLogger(__name__)
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _ndjson_lines_async(records: AsyncIterator[Dict[str, Any]]):
+    async for record in records:
+        yield json.dumps(record, default=str) + "\n"
+
+
+def _allowed_upstream_hosts() -> set:
+    hosts = settings.UPSTREAM_ALLOWED_HOSTS or [
+        urlsplit(settings.TIBCO_URL).hostname, urlsplit(settings.PYTHON_URL).hostname
+    ]
+    return {host.lower() for host in hosts if host}
+
+
+def _check_upstream_urls(pairs: Sequence[Tuple[Optional[str], Optional[str]]]):
+    """Reject caller-supplied URLs outside UPSTREAM_ALLOWED_HOSTS (None means the configured default)"""
+    allowed = _allowed_upstream_hosts()
+    for index, pair in enumerate(pairs):
+        for url in pair:
+            if url is None:
+                continue
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or (parts.hostname or "").lower() not in allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Pair {index}: {url} is not an allowed upstream URL"
+                )
+
 
 @router.post("/compare")
 async def compare_apis():
     try:
+        # The engine persists the result through its writer; id is the DB row id
         result = await engine.run_comparison()
-
-        # ✅ Save the result to DB
-        db_handler.insert(result.dict())
-
-        latest = db_handler.get_comparisons(limit=1)
-        if not latest:
-            logger.error("Comparison saved but not found in DB.")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Comparison completed but not saved to database"
-            )
-
         return result.dict()
 
     except ComparisonError as e:
@@ -46,10 +75,70 @@ async def compare_apis():
         )
 
 
+@router.post("/compare/large")
+async def compare_large(
+        tibco_url: Optional[str] = Query(None, description="Defaults to TIBCO_URL"),
+        python_url: Optional[str] = Query(None, description="Defaults to PYTHON_URL")
+):
+    """Compare very large XML responses by streaming them; returns the id and metrics only"""
+    _check_upstream_urls([(tibco_url, python_url)])
+    try:
+        return await engine.run_large_comparison(tibco_url=tibco_url, python_url=python_url)
+    except ComparisonError as e:
+        logger.error(f"ComparisonError: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Comparison error: {str(e)}"
+        )
+
+
+@router.post("/compare/batch")
+async def compare_batch(
+        request: BatchComparisonRequest,
+        stream: bool = Query(False, description="Stream each result as NDJSON as soon as it finishes")
+):
+    """Compare many URL pairs in one call; results are saved with a single bulk insert"""
+    pairs = request.url_pairs()
+    if len(pairs) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Batch too large: {len(pairs)} items (max {settings.BATCH_MAX_ITEMS})"
+        )
+    _check_upstream_urls(pairs)
+    if stream:
+        records = engine.iter_batch(
+            pairs,
+            compare_type=request.compare_type,
+            concurrency=request.concurrency
+        )
+        return StreamingResponse(_ndjson_lines_async(records), media_type=NDJSON_MEDIA_TYPE)
+    try:
+        summary = await engine.run_batch(
+            pairs,
+            compare_type=request.compare_type,
+            concurrency=request.concurrency
+        )
+        logger.info(f"Batch comparison finished: {summary['succeeded']}/{summary['total']} succeeded")
+        return summary
+
+    except ComparisonError as e:
+        logger.error(f"ComparisonError in batch: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Comparison error: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in batch: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Server Error"
+        )
+
+
 @router.get("/latest")
 async def get_latest_comparison():
     try:
-        results = db_handler.get_comparisons(limit=1)
+        results = await db_handler.get_comparisons(limit=1)
         if not results:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -70,7 +159,7 @@ async def get_recent_comparisons(
 ):
     """Get recent comparison results with robust error handling"""
     try:
-        results = db_handler.get_comparisons(limit=limit)
+        results = await db_handler.get_comparisons(limit=limit)
         if not results:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -101,10 +190,195 @@ async def get_recent_comparisons(
         )
 
 
+@router.get("/history/stream")
+async def stream_recent_comparisons(
+        limit: int = Query(100, gt=0, le=10000, description="Number of comparisons to stream")
+):
+    """Stream comparison history as NDJSON, one row per line as it is read from the cursor"""
+    return StreamingResponse(
+        _ndjson_lines_async(db_handler.iter_comparisons(limit=limit)),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@router.get("/comparisons")
+async def list_comparisons(
+        limit: int = Query(20, gt=0, le=500, description="Number of comparisons per page"),
+        before_id: Optional[int] = Query(None, gt=0, description="Return comparisons older than this id"),
+        has_differences: Optional[bool] = Query(None, description="Only comparisons with (or without) differences"),
+        url: Optional[str] = Query(None, description="Only comparisons where either side used this URL"),
+        since: Optional[datetime] = Query(None, description="Only comparisons created at or after this time (UTC)")
+):
+    """Lightweight comparison listing (id, created_at, metrics) without response bodies"""
+    try:
+        items = await db_handler.get_comparison_summaries(
+            limit=limit, before_id=before_id, has_differences=has_differences, url=url, since=since
+        )
+        return {
+            "items": items,
+            "next_before_id": items[-1]["id"] if len(items) == limit else None
+        }
+    except DatabaseError as e:
+        logger.error(f"Database error in comparisons listing: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service unavailable"
+        )
+
+
+@router.get("/comparisons/{comparison_id}")
+async def get_comparison_detail(comparison_id: int):
+    """Full comparison, including both responses and the diff"""
+    result = await db_handler.get_comparison(comparison_id)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Comparison {comparison_id} not found"
+        )
+    return result
+
+
+@router.get("/comparisons/{comparison_id}/view")
+async def get_comparison_view(comparison_id: int):
+    """Precomputed field-change summary, unified hunks and side-by-side rows for the dashboard"""
+    try:
+        view = await db_handler.get_view(comparison_id)
+    except DatabaseError as e:
+        logger.error(f"Database error in comparison view: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service unavailable"
+        )
+    if view is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Comparison {comparison_id} not found"
+        )
+    return view
+
+
+@router.get("/comparisons/{comparison_id}/view/index")
+async def get_comparison_view_index(comparison_id: int):
+    """Field changes, totals and the hunk index of a view, without any lines"""
+    try:
+        index = await db_handler.get_view_index(comparison_id)
+    except DatabaseError as e:
+        logger.error(f"Database error in comparison view index: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service unavailable"
+        )
+    if index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Comparison {comparison_id} not found"
+        )
+    return index
+
+
+@router.get("/comparisons/{comparison_id}/view/lines")
+async def get_comparison_view_lines(
+        comparison_id: int,
+        kind: str = Query("unified", pattern="^(unified|split)$", description="unified hunks or side-by-side rows"),
+        offset: int = Query(0, ge=0, description="First line to return"),
+        limit: int = Query(200, gt=0, le=5000, description="Number of lines to return")
+):
+    """A page of view lines, so clients only load what is on screen"""
+    try:
+        page = await db_handler.get_view_lines(comparison_id, kind, offset, limit)
+    except DatabaseError as e:
+        logger.error(f"Database error in comparison view lines: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service unavailable"
+        )
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Comparison {comparison_id} not found"
+        )
+    return page
+
+
+@router.get("/scheduler/status")
+async def scheduler_status():
+    """State of the built-in comparison scheduler and each of its targets"""
+    return scheduler.status()
+
+
+@router.post("/scheduler/pause")
+async def pause_scheduler():
+    if not scheduler.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Scheduler is not running")
+    scheduler.pause()
+    return scheduler.status()
+
+
+@router.post("/scheduler/resume")
+async def resume_scheduler():
+    if not scheduler.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Scheduler is not running")
+    scheduler.resume()
+    return scheduler.status()
+
+
+@router.get("/upstreams/breakers")
+async def upstream_breakers():
+    """Circuit breaker state per upstream host"""
+    return breaker_states()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters for the read cache and the diff cache"""
+    return {
+        "read_cache": db_handler.cache.stats(),
+        "diff_cache": engine.diff_cache.stats()
+    }
+
+
+@router.get("/maintenance/retention")
+async def retention_status():
+    """Retention policy and the outcome of the last run"""
+    return retention.status()
+
+
+@router.post("/maintenance/retention")
+async def run_retention():
+    """Prune/archive old comparisons, sweep orphaned blobs and VACUUM now"""
+    try:
+        return await retention.run_once()
+    except DatabaseError as e:
+        logger.error(f"Retention run failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Retention run failed"
+        )
+
+
+@router.post("/maintenance/vacuum/convert")
+async def convert_auto_vacuum():
+    """Switch an older database file to incremental vacuum with one full VACUUM"""
+    try:
+        return await retention.convert_auto_vacuum()
+    except DatabaseError as e:
+        logger.error(f"auto_vacuum conversion failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="auto_vacuum conversion failed"
+        )
+
+
+@router.get("/db/stats")
+async def db_stats():
+    """Call counts and timings (ms) for each database query issued by the API"""
+    return db_handler.stats.snapshot()
+
+
 @router.get("/debug/history")
 async def debug_history():
     try:
-        results = db_handler.get_comparisons(limit=10)
+        results = await db_handler.get_comparisons(limit=10)
         logger.info(f"Raw DB results: {results}")
         return {
             "db_query": "SELECT * FROM comparisons ORDER BY id DESC LIMIT 10",
@@ -1,22 +1,145 @@
-from pydantic_settings import BaseSettings
-from pathlib import Path
-
-
-class Settings(BaseSettings):
-    TIBCO_URL: str
-    PYTHON_URL: str
-    DB_PATH: Path = Path("comparisons.db")
-    CACHE_SIZE: int = 100
-
-    API_BASE_URL: str  # ← required for FastAPI endpoints
-    DASHBOARD_URL: str = "http://localhost:8501"  # ← Streamlit URL (can override via .env)
-
-    APP_HOST: str = "127.0.0.1"
-    APP_PORT: int = 8000
-    APP_RELOAD: bool = False
-
-    class Config:
-        env_file = ".env"
-
-
-settings = Settings()
+from pydantic_settings import BaseSettings
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class Settings(BaseSettings):
+    TIBCO_URL: str
+    PYTHON_URL: str
+    DB_PATH: Path = Path("comparisons.db")
+    CACHE_SIZE: int = 100  # entries in the in-memory diff cache
+    DIFF_CACHE_ENABLED: bool = True
+
+    # Read cache in front of get_comparison, /latest and /history
+    READ_CACHE_TTL: float = 30.0
+    READ_CACHE_MAX_ENTRIES: int = 256
+    READ_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    API_BASE_URL: str  # ← required for FastAPI endpoints
+    DASHBOARD_URL: str = "http://localhost:8501"  # ← Streamlit URL (can override via .env)
+    DASHBOARD_CACHE_TTL: float = 30.0  # seconds the dashboard caches API responses
+
+    APP_HOST: str = "127.0.0.1"
+    APP_PORT: int = 8000
+    APP_RELOAD: bool = False
+
+    # Shared upstream HTTP client (opened on startup, closed on shutdown)
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 30.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_HTTP2: bool = False  # requires the 'h2' package (pip install httpx[http2])
+    HTTP_ACCEPT_ENCODING: str = "gzip, deflate, br"  # 'br' is dropped unless brotli is installed
+
+    # Compression of API responses (GZipMiddleware)
+    GZIP_MINIMUM_SIZE: int = 1024  # bytes; smaller responses are sent uncompressed
+    GZIP_COMPRESS_LEVEL: int = 6
+
+    # Upstream resilience: retries for GETs, per-host circuit breaker, per-comparison deadline
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF: float = 0.5  # seconds, doubled on each attempt
+    HTTP_RETRY_BACKOFF_MAX: float = 5.0
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_TIMEOUT: float = 30.0  # seconds before a trial request is let through
+    COMPARISON_DEADLINE: float = 60.0  # seconds for fetching and diffing one pair
+    CONDITIONAL_FETCH_ENABLED: bool = True  # revalidate with ETag / Last-Modified, reuse stored body on 304
+    CONDITIONAL_VALIDATORS_CACHE_SIZE: int = 1000  # upstream validators kept in memory (LRU)
+
+    # SQLite connection pool and pragmas
+    DB_POOL_SIZE: int = 8
+    DB_POOL_TIMEOUT: float = 10.0  # seconds to wait for a free connection
+    DB_STREAM_PAGE_SIZE: int = 20  # rows read per connection checkout when streaming history
+    DB_JOURNAL_MODE: str = "WAL"
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_CACHE_SIZE_KB: int = 65536
+    DB_MMAP_SIZE: int = 268435456
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_SLOW_QUERY_MS: float = 200.0  # queries slower than this are logged as warnings
+
+    # Retention: prune (optionally archive) old comparisons, sweep orphan blobs, incremental VACUUM
+    RETENTION_ENABLED: bool = False
+    RETENTION_INTERVAL: float = 3600.0  # seconds between retention runs
+    RETENTION_MAX_AGE_DAYS: float = 30.0  # 0 disables age-based pruning
+    RETENTION_MAX_ROWS: int = 0  # keep at most this many comparisons (and diff_cache rows); 0 = unlimited
+    RETENTION_DIFF_CACHE_MAX_BYTES: int = 0  # stored size of cached diffs and views to keep; 0 = unlimited
+    RETENTION_ARCHIVE_DIR: Optional[Path] = None  # write pruned rows here as gzipped NDJSON before deleting
+    RETENTION_BATCH_SIZE: int = 500
+    RETENTION_VACUUM_PAGES: int = 0  # pages released per run by incremental_vacuum; 0 = all free pages
+    # Older files need one full VACUUM before incremental vacuum works; run it at startup when
+    # set, otherwise on demand via POST /api/v1/maintenance/vacuum/convert
+    RETENTION_CONVERT_AUTO_VACUUM: bool = False
+
+    # Background writer: inserts are committed in batches of up to DB_WRITER_MAX_BATCH
+    DB_WRITER_MAX_BATCH: int = 100
+    DB_WRITER_FLUSH_INTERVAL: float = 0.05  # seconds to wait for more rows before committing
+
+    # Response bodies are stored once per SHA-256 in response_blobs
+    BLOB_COMPRESSION: str = "zlib"  # "zlib", "zstd" (requires 'zstandard') or "none"
+    BLOB_COMPRESSION_LEVEL: int = 6
+
+    # XML diff mode: "text" (unified line diff) or "tree" (structural element diff)
+    XML_DIFF_MODE: str = "text"
+    XML_KEY_ATTRIBUTES: List[str] = ["id", "key", "name"]  # used to pair repeated elements in tree mode
+    # JSON diff mode: "keyed" (pairs list elements on key fields, skips identical subtrees) or "deepdiff"
+    JSON_DIFF_MODE: str = "keyed"
+    JSON_KEY_FIELDS: List[str] = ["skuId", "productId", "id"]  # used to pair list elements in keyed mode
+
+    # Pre-diff normalization: bodies are re-serialized canonically (sorted JSON keys / XML
+    # attributes, no insignificant whitespace) before diffing. Ignore paths are dotted
+    # key/element paths ("@name" for XML attributes); "*" matches within a segment, "**"
+    # any number of segments, and a bare name matches at any depth.
+    NORMALIZE_ENABLED: bool = True
+    NORMALIZE_IGNORE_PATHS: List[str] = ["messageNo", "orderDate", "authCode"]
+    NORMALIZE_DECIMALS: Optional[int] = None  # round decimals to this many places; None leaves them as-is
+    NORMALIZE_TIMESTAMP_RESOLUTION: int = 0  # truncate ISO-8601 timestamps (in UTC) to N seconds; 0 = off
+
+    # Where diffs run: "process" (worker processes), "thread" or "inline" (on the event loop)
+    DIFF_EXECUTOR: str = "process"
+    DIFF_MAX_WORKERS: int = 2
+    DIFF_INLINE_MAX_BYTES: int = 64 * 1024  # combined payload size that is always diffed inline
+    DIFF_TIMEOUT: float = 30.0  # seconds per comparison
+
+    # Large-payload comparisons (/api/v1/compare/large): bodies are streamed to temp files,
+    # which diff workers open by path. The line settings apply to every text-mode diff.
+    STREAM_TEMP_DIR: Optional[Path] = None  # None = the system temp directory
+    STREAM_CHUNK_BYTES: int = 64 * 1024  # also the longest line diffed as one piece
+    STREAM_DIFF_WINDOW: int = 2000  # lines buffered per side when realigning after a change
+    STREAM_MAX_HUNK_LINES: int = 10000
+    VIEW_MAX_BODY_BYTES: int = 20 * 1024 * 1024  # above this, stored views are built from the diff, not the bodies
+    VIEW_CHUNK_LINES: int = 1000  # view rows per stored chunk; a page of lines only reads the chunks it covers
+
+    # Single-flight: identical concurrent /compare calls share one fetch-and-diff
+    COALESCE_ENABLED: bool = True
+    COALESCE_WINDOW: float = 1.0  # seconds after a run starts during which its result is reused
+
+    # Batch comparisons (/api/v1/compare/batch)
+    BATCH_MAX_CONCURRENCY: int = 10
+    BATCH_MAX_ITEMS: int = 1000
+
+    # Hosts that caller-supplied URLs (/compare/batch, /compare/large) may point at;
+    # empty = the hosts of TIBCO_URL and PYTHON_URL
+    UPSTREAM_ALLOWED_HOSTS: List[str] = []
+
+    # Built-in scheduler: runs SCHEDULER_TARGETS (or the TIBCO_URL/PYTHON_URL pair) on an interval
+    SCHEDULER_ENABLED: bool = False
+    SCHEDULER_TARGETS: List[Dict[str, str]] = []  # [{"name": ..., "tibco_url": ..., "python_url": ...}]
+    SCHEDULER_INTERVAL: float = 300.0  # seconds between runs of each target
+    SCHEDULER_JITTER: float = 0.1  # +/- fraction of the interval
+    SCHEDULER_MAX_CONCURRENCY_PER_TARGET: int = 1
+    SCHEDULER_BACKOFF_MAX: float = 3600.0  # cap for the interval after consecutive failures
+
+    class Config:
+        env_file = ".env"
+
+
+settings = Settings()
+
+
+def line_diff_options() -> Dict[str, int]:
+    """Keyword arguments for the text-mode line diff (compare_xml, build_view, compare_xml_stream)"""
+    return {
+        "window": settings.STREAM_DIFF_WINDOW,
+        "max_line_bytes": settings.STREAM_CHUNK_BYTES,
+        "max_hunk_lines": settings.STREAM_MAX_HUNK_LINES,
+    }
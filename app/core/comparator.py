@@ -1,44 +1,927 @@
-from difflib import unified_diff
-from deepdiff import DeepDiff
-import json
-
-# Custom exception for comparison issues
-class ComparisonError(Exception):
-    """Raised when a comparison operation fails"""
-    pass
-
-
-class ResponseComparator:
-    @staticmethod
-    def compare_xml(tibco_xml: str, python_xml: str) -> tuple:
-        try:
-            diff = ''.join(unified_diff(
-                tibco_xml.splitlines(keepends=True),
-                python_xml.splitlines(keepends=True),
-                fromfile="tibco",
-                tofile="python"
-            ))
-
-            metrics = {
-                "tibco_lines": len(tibco_xml.splitlines()),
-                "python_lines": len(python_xml.splitlines()),
-                "changed_lines": diff.count('\n+') + diff.count('\n-')
-            }
-
-            return diff, metrics
-        except Exception as e:
-            print(f"Error comparing XML: {e}")
-            raise ComparisonError("An error occurred while comparing XML.") from e
-
-    @staticmethod
-    def compare_json(tibco_json: dict, python_json: dict) -> tuple:
-        try:
-            diff = DeepDiff(tibco_json, python_json, ignore_order=True)
-            metrics = {
-                "changes": len(diff.get('values_changed', {})),
-                "type_changes": len(diff.get('type_changes', {}))
-            }
-            return json.dumps(diff), metrics
-        except Exception as e:
-            print(f"Error comparing JSON: {e}")
-            raise ComparisonError("An error occurred while comparing JSON.") from e
+from collections import defaultdict, deque
+from difflib import SequenceMatcher
+from deepdiff import DeepDiff
+import io
+from typing import BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import re
+import xml.etree.ElementTree as ET
+
+# Attributes used to pair up repeated sibling elements in tree mode
+DEFAULT_XML_KEY_ATTRIBUTES = ("id", "key", "name")
+
+# Fields used to pair up list elements (objects) in keyed JSON mode
+DEFAULT_JSON_KEY_FIELDS = ("skuId", "productId", "id")
+
+_PREDICATE_RE = re.compile(r"\[[^\]]*\]")
+
+
+# Custom exception for comparison issues
+class ComparisonError(Exception):
+    """Raised when a comparison operation fails"""
+    pass
+
+
+def _local_name(tag: str) -> str:
+    """Strip the '{namespace}' prefix ElementTree puts on qualified tags"""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else str(tag)
+
+
+def _text(elem: ET.Element) -> str:
+    return (elem.text or '').strip()
+
+
+def _tail(elem: ET.Element) -> str:
+    """Text following ``elem`` inside its parent (mixed content)"""
+    return (elem.tail or '').strip()
+
+
+def _serialize(elem: ET.Element) -> str:
+    return ET.tostring(elem, encoding='unicode').strip()
+
+
+def _hash_tree(root: ET.Element) -> Tuple[Dict[int, bytes], int]:
+    """Hash every subtree bottom-up; returns {id(elem): digest} and the node count.
+
+    A digest covers the namespace-qualified tag, attributes, text and tail.
+    """
+    hashes: Dict[int, bytes] = {}
+
+    def visit(elem: ET.Element) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(elem.tag).encode())
+        for name, value in sorted(elem.attrib.items()):
+            h.update(b'\x00@' + name.encode() + b'=' + value.encode())
+        h.update(b'\x00#' + _text(elem).encode())
+        h.update(b'\x00$' + _tail(elem).encode())
+        for child in elem:
+            h.update(visit(child))
+        digest = h.digest()
+        hashes[id(elem)] = digest
+        return digest
+
+    visit(root)
+    return hashes, len(hashes)
+
+
+class _XmlTreeDiff:
+    """Structural diff of two parsed XML documents.
+
+    Elements are matched by path and namespace-qualified tag; repeated
+    siblings are paired by key attribute when present, otherwise by identical
+    content first and then by position. Positional labels are the element's
+    index among its same-tag siblings, so paths are valid XPath. Subtrees
+    with equal hashes are skipped without being walked.
+    """
+
+    def __init__(self, key_attributes: Sequence[str]):
+        self.key_attributes = tuple(key_attributes)
+        self.records: List[dict] = []
+
+    def run(self, tibco_root: ET.Element, python_root: ET.Element) -> Tuple[List[dict], dict]:
+        self.tibco_hashes, tibco_nodes = _hash_tree(tibco_root)
+        self.python_hashes, python_nodes = _hash_tree(python_root)
+
+        root_path = '/' + _local_name(tibco_root.tag)
+        if tibco_root.tag != python_root.tag:
+            self._record('removed', root_path, tibco=_serialize(tibco_root))
+            self._record('added', '/' + _local_name(python_root.tag),
+                         python=_serialize(python_root))
+        else:
+            self._compare(tibco_root, python_root, root_path)
+
+        counts = defaultdict(int)
+        paths = defaultdict(int)
+        for record in self.records:
+            counts[record['change']] += 1
+            paths[_PREDICATE_RE.sub('', record['path'])] += 1
+
+        metrics = {
+            "tibco_nodes": tibco_nodes,
+            "python_nodes": python_nodes,
+            "added": counts['added'],
+            "removed": counts['removed'],
+            "changed": counts['changed'],
+            "changed_nodes": len(self.records),
+            "paths": dict(paths),
+        }
+        return self.records, metrics
+
+    def _record(self, change: str, path: str, tibco=None, python=None):
+        self.records.append({"change": change, "path": path, "tibco": tibco, "python": python})
+
+    def _compare(self, tibco: ET.Element, python: ET.Element, path: str):
+        if self.tibco_hashes[id(tibco)] == self.python_hashes[id(python)]:
+            return
+
+        if _text(tibco) != _text(python):
+            self._record('changed', path, tibco=_text(tibco), python=_text(python))
+        if _tail(tibco) != _tail(python):
+            self._record('changed', f"{path}/following-sibling::text()[1]",
+                         tibco=_tail(tibco), python=_tail(python))
+
+        for name in sorted(set(tibco.attrib) | set(python.attrib)):
+            old, new = tibco.attrib.get(name), python.attrib.get(name)
+            if old == new:
+                continue
+            change = 'added' if old is None else 'removed' if new is None else 'changed'
+            self._record(change, f"{path}/@{name}", tibco=old, python=new)
+
+        for tibco_child, python_child, label in self._pair_children(tibco, python):
+            child_path = f"{path}/{label}"
+            if python_child is None:
+                self._record('removed', child_path, tibco=_serialize(tibco_child))
+            elif tibco_child is None:
+                self._record('added', child_path, python=_serialize(python_child))
+            else:
+                self._compare(tibco_child, python_child, child_path)
+
+    def _key_of(self, elem: ET.Element) -> Optional[Tuple[str, str]]:
+        for name in self.key_attributes:
+            if name in elem.attrib:
+                return name, elem.attrib[name]
+        return None
+
+    def _pair_children(self, tibco: ET.Element, python: ET.Element):
+        """Yield (tibco_child, python_child, xpath_label) with None for unmatched sides"""
+        tibco_groups: Dict[str, List[ET.Element]] = defaultdict(list)
+        python_groups: Dict[str, List[ET.Element]] = defaultdict(list)
+        for child in tibco:
+            tibco_groups[child.tag].append(child)
+        for child in python:
+            python_groups[child.tag].append(child)
+
+        for tag in list(dict.fromkeys([*tibco_groups, *python_groups])):
+            left, right = tibco_groups.get(tag, []), python_groups.get(tag, [])
+            name = _local_name(tag)
+            if len(left) <= 1 and len(right) <= 1:
+                yield (left[0] if left else None), (right[0] if right else None), name
+                continue
+
+            # Keyed siblings: pair on the first key attribute present, duplicates in order
+            left_keyed, left_unkeyed = self._split_keyed(left)
+            right_keyed, right_unkeyed = self._split_keyed(right)
+            for key in dict.fromkeys([*left_keyed, *right_keyed]):
+                olds, news = left_keyed.get(key, []), right_keyed.get(key, [])
+                label = f'{name}[@{key[0]}="{key[1]}"]'
+                count = max(len(olds), len(news))
+                for n in range(count):
+                    yield (olds[n] if n < len(olds) else None), (news[n] if n < len(news) else None), \
+                        label if count == 1 else f"{label}[{n + 1}]"
+
+            # Unkeyed siblings: identical subtrees first (handles reordering), then by position
+            by_hash: Dict[bytes, List[int]] = defaultdict(list)
+            for idx, (_, elem) in enumerate(right_unkeyed):
+                by_hash[self.python_hashes[id(elem)]].append(idx)
+            matched = set()
+            remaining_left = []
+            for position, elem in left_unkeyed:
+                candidates = by_hash.get(self.tibco_hashes[id(elem)])
+                if candidates:
+                    matched.add(candidates.pop(0))
+                else:
+                    remaining_left.append((position, elem))
+            remaining_right = [entry for i, entry in enumerate(right_unkeyed) if i not in matched]
+
+            for n in range(max(len(remaining_left), len(remaining_right))):
+                old = remaining_left[n] if n < len(remaining_left) else None
+                new = remaining_right[n] if n < len(remaining_right) else None
+                # Label with the sibling index in the document that has the element
+                position = old[0] if old is not None else new[0]
+                yield (old[1] if old else None), (new[1] if new else None), f"{name}[{position}]"
+
+    def _split_keyed(self, elems: List[ET.Element]):
+        """Split same-tag siblings into {key: [elems]} and [(xpath_position, elem)] for unkeyed ones"""
+        keyed: Dict[Tuple[str, str], List[ET.Element]] = defaultdict(list)
+        unkeyed: List[Tuple[int, ET.Element]] = []
+        for position, elem in enumerate(elems, 1):
+            key = self._key_of(elem)
+            if key is not None:
+                keyed[key].append(elem)
+            else:
+                unkeyed.append((position, elem))
+        return keyed, unkeyed
+
+
+def _json_metrics(report) -> dict:
+    """Metrics for a DeepDiff-style JSON report (keyed mode or DeepDiff itself)"""
+    return {
+        "changes": len(report.get('values_changed', {})),
+        "type_changes": len(report.get('type_changes', {})),
+        "added": len(report.get('dictionary_item_added', [])) + len(report.get('iterable_item_added', {})),
+        "removed": len(report.get('dictionary_item_removed', [])) + len(report.get('iterable_item_removed', {})),
+    }
+
+
+class _JsonKeyedDiff:
+    """Structural diff of two decoded JSON documents, reported in DeepDiff's layout.
+
+    Objects are compared key by key. List elements are paired on the first
+    key field they carry, otherwise by identical content first and then by
+    position, so element order is ignored as with ``ignore_order=True``.
+    Subtrees with equal hashes are skipped without being walked.
+    """
+
+    def __init__(self, key_fields: Sequence[str]):
+        self.key_fields = tuple(key_fields)
+        self.hashes: Dict[int, bytes] = {}
+        self.values_changed: Dict[str, dict] = {}
+        self.type_changes: Dict[str, dict] = {}
+        self.dictionary_item_added: List[str] = []
+        self.dictionary_item_removed: List[str] = []
+        self.iterable_item_added: Dict[str, object] = {}
+        self.iterable_item_removed: Dict[str, object] = {}
+
+    def run(self, tibco, python) -> Tuple[dict, dict]:
+        self._compare(tibco, python, 'root')
+        report = {
+            name: entries for name, entries in (
+                ('type_changes', self.type_changes),
+                ('dictionary_item_added', self.dictionary_item_added),
+                ('dictionary_item_removed', self.dictionary_item_removed),
+                ('values_changed', self.values_changed),
+                ('iterable_item_added', self.iterable_item_added),
+                ('iterable_item_removed', self.iterable_item_removed),
+            ) if entries
+        }
+        return report, _json_metrics(report)
+
+    def _hash(self, value) -> bytes:
+        """Order-insensitive content token: scalars encode themselves, containers
+        get a digest memoized by id()"""
+        if not isinstance(value, (dict, list)):
+            return f"{type(value).__name__}:{value!r}\x00".encode()
+        digest = self.hashes.get(id(value))
+        if digest is None:
+            if isinstance(value, dict):
+                parts = [b'{']
+                for key in sorted(value, key=str):
+                    parts.append(repr(key).encode())
+                    parts.append(self._hash(value[key]))
+            else:
+                parts = [b'[', *sorted(self._hash(item) for item in value)]
+            digest = self.hashes[id(value)] = b'\x01' + hashlib.blake2b(b''.join(parts), digest_size=16).digest()
+        return digest
+
+    def _compare(self, tibco, python, path: str):
+        if type(tibco) is not type(python):
+            self.type_changes[path] = {
+                "old_type": type(tibco).__name__, "new_type": type(python).__name__,
+                "old_value": tibco, "new_value": python,
+            }
+        elif isinstance(tibco, (dict, list)):
+            if self._hash(tibco) == self._hash(python):
+                return
+            if isinstance(tibco, dict):
+                self._compare_dicts(tibco, python, path)
+            else:
+                self._compare_lists(tibco, python, path)
+        elif tibco != python:
+            self.values_changed[path] = {"new_value": python, "old_value": tibco}
+
+    def _compare_dicts(self, tibco: dict, python: dict, path: str):
+        for key, value in tibco.items():
+            child_path = f"{path}[{key!r}]"
+            if key in python:
+                self._compare(value, python[key], child_path)
+            else:
+                self.dictionary_item_removed.append(child_path)
+        for key in python:
+            if key not in tibco:
+                self.dictionary_item_added.append(f"{path}[{key!r}]")
+
+    def _key_of(self, item) -> Optional[Tuple[str, str]]:
+        if isinstance(item, dict):
+            for field in self.key_fields:
+                value = item.get(field)
+                if value is not None and not isinstance(value, (dict, list)):
+                    return field, repr(value)
+        return None
+
+    def _compare_lists(self, tibco: list, python: list, path: str):
+        # Keyed elements: pair on the first key field present (duplicates pair in order)
+        python_keyed: Dict[Tuple[str, str], Deque[int]] = defaultdict(deque)
+        python_unkeyed = []
+        for j, item in enumerate(python):
+            key = self._key_of(item)
+            if key is None:
+                python_unkeyed.append(j)
+            else:
+                python_keyed[key].append(j)
+
+        tibco_unkeyed = []
+        for i, item in enumerate(tibco):
+            key = self._key_of(item)
+            if key is None:
+                tibco_unkeyed.append(i)
+            elif python_keyed.get(key):
+                self._compare(item, python[python_keyed[key].popleft()], f"{path}[{i}]")
+            else:
+                self.iterable_item_removed[f"{path}[{i}]"] = item
+        for indexes in python_keyed.values():
+            for j in indexes:
+                self.iterable_item_added[f"{path}[{j}]"] = python[j]
+
+        # Unkeyed elements: identical content first (handles reordering), then by position
+        by_hash: Dict[bytes, Deque[int]] = defaultdict(deque)
+        for j in python_unkeyed:
+            by_hash[self._hash(python[j])].append(j)
+        remaining_tibco = []
+        for i in tibco_unkeyed:
+            candidates = by_hash.get(self._hash(tibco[i]))
+            if candidates:
+                candidates.popleft()
+            else:
+                remaining_tibco.append(i)
+        remaining_python = sorted(j for indexes in by_hash.values() for j in indexes)
+
+        for i, j in zip(remaining_tibco, remaining_python):
+            self._compare(tibco[i], python[j], f"{path}[{i}]")
+        for i in remaining_tibco[len(remaining_python):]:
+            self.iterable_item_removed[f"{path}[{i}]"] = tibco[i]
+        for j in remaining_python[len(remaining_tibco):]:
+            self.iterable_item_added[f"{path}[{j}]"] = python[j]
+
+
+
+def _line_metrics(tibco_lines: int, python_lines: int, added: int, removed: int,
+                  modified: int, equal: int, hunks: int, bytes_compared: int) -> dict:
+    """Metrics record shared by every line-diff mode.
+
+    ``added``/``removed`` count pure insertions/deletions and ``modified``
+    counts replaced line pairs; ``changed_lines`` is the number of +/- lines
+    in the unified diff.
+    """
+    total = tibco_lines + python_lines
+    return {
+        "tibco_lines": tibco_lines,
+        "python_lines": python_lines,
+        "changed_lines": added + removed + 2 * modified,
+        "added_lines": added,
+        "removed_lines": removed,
+        "modified_lines": modified,
+        "hunks": hunks,
+        "similarity": round(2.0 * equal / total, 4) if total else 1.0,
+        "bytes_compared": bytes_compared,
+    }
+
+
+def _field_name(line: str) -> str:
+    """Leading field of a diff line: ``"qty": 2`` -> ``qty``; whole line when there is no colon.
+
+    Bracket-only lines (``{``, ``},``, ``]``) are structure, not fields, and give ''.
+    """
+    field = line.split(':')[0].strip(' "\'')
+    return field if field.strip('{}[],') else ''
+
+
+def _field_changes(lines: Iterator[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """Added/removed/changed field summary from (tag, text) diff lines"""
+    added, removed = [], []
+    for tag, text in lines:
+        field = _field_name(text) if tag in '+-' else ''
+        if field:
+            (added if tag == '+' else removed).append(field)
+    both = set(added) & set(removed)
+    return {
+        'added': [f for f in added if f not in both],
+        'removed': [f for f in removed if f not in both],
+        'changed': list(dict.fromkeys(f for f in added if f in both)),
+    }
+
+
+def _split_rows(old: List[str], new: List[str], i1: int, j1: int, kind: str) -> Iterator[list]:
+    """Side-by-side rows ``[old_no, old_text, new_no, new_text, kind]`` for one opcode"""
+    for offset in range(max(len(old), len(new))):
+        left = offset < len(old)
+        right = offset < len(new)
+        row_kind = kind if kind != 'change' or (left and right) else ('remove' if left else 'add')
+        yield [i1 + offset + 1 if left else None, old[offset] if left else None,
+               j1 + offset + 1 if right else None, new[offset] if right else None, row_kind]
+
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+
+
+_ELEMENT_BREAK = re.compile(rb'>(?=<)')
+
+
+def _bounded_lines(fileobj: BinaryIO, max_line_bytes: int) -> Iterator[bytes]:
+    """Lines of ``fileobj``, none longer than ``max_line_bytes``.
+
+    Longer lines (minified or single-line exports) are broken after every
+    '>' that is directly followed by '<', so they are diffed element by
+    element; a stretch without such a break is cut at ``max_line_bytes``.
+    """
+    pending = b''
+    while True:
+        chunk = fileobj.readline(max_line_bytes)
+        if not chunk:
+            if pending:
+                yield pending
+            return
+        pending += chunk
+        if pending.endswith(b'\n') and len(pending) <= max_line_bytes:
+            yield pending
+            pending = b''
+            continue
+
+        start = 0
+        for match in _ELEMENT_BREAK.finditer(pending):
+            yield pending[start:match.end()]
+            start = match.end()
+        pending = pending[start:]
+        if pending.endswith(b'\n'):
+            yield pending
+            pending = b''
+        elif len(pending) >= max_line_bytes:
+            yield pending[:max_line_bytes]
+            pending = pending[max_line_bytes:]
+
+
+def _windowed_line_diff(tibco_lines: Iterator[bytes], python_lines: Iterator[bytes],
+                        window: int) -> Iterator[Tuple[str, bytes]]:
+    """Yield (' ' | '-' | '+', line) for two line streams using bounded memory.
+
+    Identical lines are consumed in lockstep. When the streams diverge, up to
+    ``window`` lines of each side are buffered and aligned with
+    SequenceMatcher; everything up to the last matching run is emitted and
+    the unaligned tail is kept for the next round. A change longer than the
+    window is reported as a replacement, which is still a correct diff.
+    """
+    tibco_buf: Deque[bytes] = deque()
+    python_buf: Deque[bytes] = deque()
+    tibco_done = python_done = False
+
+    def fill(buf, lines, n):
+        while len(buf) < n:
+            line = next(lines, None)
+            if line is None:
+                return True
+            buf.append(line)
+        return False
+
+    while True:
+        tibco_done = tibco_done or fill(tibco_buf, tibco_lines, 1)
+        python_done = python_done or fill(python_buf, python_lines, 1)
+        if not tibco_buf and not python_buf:
+            return
+        if tibco_buf and python_buf and tibco_buf[0] == python_buf[0]:
+            python_buf.popleft()
+            yield ' ', tibco_buf.popleft()
+            continue
+
+        tibco_done = tibco_done or fill(tibco_buf, tibco_lines, window)
+        python_done = python_done or fill(python_buf, python_lines, window)
+        tibco_win, python_win = list(tibco_buf), list(python_buf)
+        opcodes = SequenceMatcher(None, tibco_win, python_win, autojunk=False).get_opcodes()
+
+        if not (tibco_done and python_done):
+            last_equal = max((i for i, op in enumerate(opcodes) if op[0] == 'equal'), default=None)
+            if last_equal is not None:
+                opcodes = opcodes[:last_equal + 1]
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                for line in tibco_win[i1:i2]:
+                    yield ' ', line
+            else:
+                for line in tibco_win[i1:i2]:
+                    yield '-', line
+                for line in python_win[j1:j2]:
+                    yield '+', line
+        consumed_tibco, consumed_python = opcodes[-1][2], opcodes[-1][4]
+        for _ in range(consumed_tibco):
+            tibco_buf.popleft()
+        for _ in range(consumed_python):
+            python_buf.popleft()
+
+
+class _UnifiedHunkWriter:
+    """Turn a tagged line stream into unified-diff hunks written through ``write``.
+
+    Only the current hunk and ``context`` lines of leading context are kept in
+    memory; hunks longer than ``max_hunk_lines`` are split. When ``views`` is
+    a list, each hunk is also appended to it in build_view's layout.
+    """
+
+    def __init__(self, write: Callable[[str], None], context: int = 3, max_hunk_lines: int = 10000,
+                 views: Optional[list] = None):
+        self.write = write
+        self.views = views
+        self.context = context
+        self.max_hunk_lines = max_hunk_lines
+        self.leading: Deque[Tuple[int, int, bytes]] = deque(maxlen=context)
+        self.hunk: List[Tuple[str, bytes]] = []
+        self.hunk_start = (0, 0)
+        self.trailing = 0  # equal lines seen since the last change in the open hunk
+        self.tibco_line = self.python_line = 0
+        self.added = self.removed = self.modified = self.equal = self.hunks = 0
+        self._run_removed = self._run_added = 0  # current change run, paired up into modifications
+        self.header_written = False
+
+    def _end_run(self):
+        paired = min(self._run_removed, self._run_added)
+        self.modified += paired
+        self.removed += self._run_removed - paired
+        self.added += self._run_added - paired
+        self._run_removed = self._run_added = 0
+
+    def feed(self, tag: str, line: bytes):
+        if tag == ' ':
+            self._end_run()
+            self.equal += 1
+            self.tibco_line += 1
+            self.python_line += 1
+            if self.hunk:
+                self.hunk.append((' ', line))
+                self.trailing += 1
+                if self.trailing >= 2 * self.context:
+                    self._flush(keep_trailing=self.context)
+            else:
+                self.leading.append((self.tibco_line, self.python_line, line))
+            return
+
+        if not self.hunk:
+            if self.leading:
+                self.hunk_start = (self.leading[0][0], self.leading[0][1])
+            else:
+                self.hunk_start = (self.tibco_line + 1, self.python_line + 1)
+            self.hunk = [(' ', text) for _, _, text in self.leading]
+            self.leading.clear()
+        if tag == '-':
+            if self._run_added:
+                self._end_run()  # a '-' after '+' starts a new change run
+            self.tibco_line += 1
+            self._run_removed += 1
+        else:
+            self.python_line += 1
+            self._run_added += 1
+        self.hunk.append((tag, line))
+        self.trailing = 0
+        if len(self.hunk) >= self.max_hunk_lines:
+            self._flush(keep_trailing=0)
+
+    def close(self):
+        self._end_run()
+        if self.hunk:
+            self._flush(keep_trailing=self.context)
+
+    def metrics(self, bytes_compared: int) -> dict:
+        return _line_metrics(self.tibco_line, self.python_line, self.added, self.removed,
+                             self.modified, self.equal, self.hunks, bytes_compared)
+
+    def _flush(self, keep_trailing: int):
+        # Drop equal lines beyond the trailing context; they become the next hunk's lead-in
+        excess = max(self.trailing - keep_trailing, 0)
+        body = self.hunk[:len(self.hunk) - excess] if excess else self.hunk
+        tail = self.hunk[len(self.hunk) - excess:] if excess else []
+
+        tibco_count = sum(1 for tag, _ in body if tag != '+')
+        python_count = sum(1 for tag, _ in body if tag != '-')
+        if not self.header_written:
+            self.write("--- tibco\n+++ python\n")
+            self.header_written = True
+        header = f"@@ -{self.hunk_start[0]},{tibco_count} +{self.hunk_start[1]},{python_count} @@"
+        self.write(header + "\n")
+        for tag, text in body:
+            decoded = text.decode('utf-8', errors='replace')
+            self.write(tag + decoded if decoded.endswith('\n') else tag + decoded + '\n')
+        self.hunks += 1
+        if self.views is not None:
+            self.views.append({"header": header, "lines": _hunk_view_lines(self.hunk_start, body)})
+
+        next_tibco = self.hunk_start[0] + tibco_count
+        next_python = self.hunk_start[1] + python_count
+        self.hunk, self.trailing = [], 0
+        self.leading.clear()
+        for offset, (_, text) in enumerate(tail[-self.context:] if self.context else []):
+            skipped = len(tail) - min(len(tail), self.context)
+            self.leading.append((next_tibco + skipped + offset, next_python + skipped + offset, text))
+        if not tail and keep_trailing == 0:
+            # Split inside a change run: the next hunk continues right here
+            self.hunk_start = (next_tibco, next_python)
+
+
+def _hunk_view_lines(start: Tuple[int, int], body: List[Tuple[str, bytes]]) -> List[list]:
+    """build_view hunk lines ``[tag, old_no, new_no, text]`` for one hunk"""
+    old_no, new_no = start
+    lines = []
+    for tag, line in body:
+        text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+        lines.append([tag, old_no if tag != '+' else None, new_no if tag != '-' else None, text])
+        old_no += tag != '+'
+        new_no += tag != '-'
+    return lines
+
+
+class _SplitRows:
+    """Full side-by-side rows of a tagged line stream; -/+ runs are paired as _UnifiedHunkWriter counts them"""
+
+    def __init__(self):
+        self.rows: List[list] = []
+        self.tibco_line = self.python_line = 0
+        self._removed: List[str] = []
+        self._added: List[str] = []
+
+    def feed(self, tag: str, line: bytes):
+        text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+        if tag == ' ':
+            self._end_run()
+            self.tibco_line += 1
+            self.python_line += 1
+            self.rows.append([self.tibco_line, text, self.python_line, text, 'context'])
+        elif tag == '-':
+            if self._added:
+                self._end_run()
+            self._removed.append(text)
+        else:
+            self._added.append(text)
+
+    def _end_run(self):
+        kind = 'change' if self._removed and self._added else 'remove' if self._removed else 'add'
+        self.rows.extend(_split_rows(self._removed, self._added, self.tibco_line, self.python_line, kind))
+        self.tibco_line += len(self._removed)
+        self.python_line += len(self._added)
+        self._removed, self._added = [], []
+
+    def close(self) -> List[list]:
+        self._end_run()
+        return self.rows
+
+
+def _diff_line_streams(tibco_lines: Iterator[bytes], python_lines: Iterator[bytes],
+                       write: Callable[[str], None], window: int, max_hunk_lines: int,
+                       context: int = 3, with_view: bool = False) -> Tuple[_UnifiedHunkWriter, Optional[dict]]:
+    """The line diff behind every text-mode comparison, in memory or streamed.
+
+    Writes the unified diff through ``write`` and returns the hunk writer
+    (which holds the counts) and, with ``with_view``, the build_view dict
+    taken from the same tagged lines.
+    """
+    hunk_views = [] if with_view else None
+    hunks = _UnifiedHunkWriter(write, context=context, max_hunk_lines=max_hunk_lines, views=hunk_views)
+    split = _SplitRows() if with_view else None
+    for tag, line in _windowed_line_diff(tibco_lines, python_lines, window):
+        hunks.feed(tag, line)
+        if split is not None:
+            split.feed(tag, line)
+    hunks.close()
+    if not with_view:
+        return hunks, None
+    return hunks, {
+        "changes": _field_changes((line[0], line[3]) for hunk in hunk_views for line in hunk["lines"]),
+        "hunks": hunk_views,
+        "split": split.close(),
+        "split_context": "full",
+    }
+
+
+class ResponseComparator:
+    @staticmethod
+    def has_differences(diff: str) -> bool:
+        """True when a diff produced by any compare_* mode reports changes"""
+        return bool(diff) and diff.strip() not in ('{}', '[]')
+
+    @staticmethod
+    def compare_xml(tibco_xml: str, python_xml: str, mode: str = 'text',
+                    key_attributes: Sequence[str] = DEFAULT_XML_KEY_ATTRIBUTES,
+                    window: int = 2000, max_line_bytes: int = 64 * 1024, max_hunk_lines: int = 10000) -> tuple:
+        """Tree mode: see compare_xml_tree. Text mode: the unified line diff compare_xml_stream
+        would produce for the same bodies, with the same metrics."""
+        if mode == 'tree':
+            return ResponseComparator.compare_xml_tree(tibco_xml, python_xml, key_attributes)
+        diff, metrics, _ = ResponseComparator._compare_lines(
+            tibco_xml, python_xml, False, window, max_line_bytes, max_hunk_lines)
+        return diff, metrics
+
+    @staticmethod
+    def compare_xml_with_view(tibco_xml: str, python_xml: str, window: int = 2000,
+                              max_line_bytes: int = 64 * 1024, max_hunk_lines: int = 10000) -> tuple:
+        """Text-mode compare_xml plus build_view of the same bodies, from one pass"""
+        return ResponseComparator._compare_lines(
+            tibco_xml, python_xml, True, window, max_line_bytes, max_hunk_lines)
+
+    @staticmethod
+    def _compare_lines(tibco_xml: str, python_xml: str, with_view: bool, window: int,
+                       max_line_bytes: int, max_hunk_lines: int, context: int = 3) -> tuple:
+        try:
+            tibco_bytes, python_bytes = tibco_xml.encode('utf-8'), python_xml.encode('utf-8')
+            out = []
+            hunks, view = _diff_line_streams(
+                _bounded_lines(io.BytesIO(tibco_bytes), max_line_bytes),
+                _bounded_lines(io.BytesIO(python_bytes), max_line_bytes),
+                out.append, window, max_hunk_lines, context, with_view
+            )
+            return ''.join(out), hunks.metrics(len(tibco_bytes) + len(python_bytes)), view
+        except Exception as e:
+            print(f"Error comparing XML: {e}")
+            raise ComparisonError("An error occurred while comparing XML.") from e
+
+    @staticmethod
+    def compare_xml_tree(tibco_xml: str, python_xml: str,
+                         key_attributes: Sequence[str] = DEFAULT_XML_KEY_ATTRIBUTES) -> tuple:
+        """Compare XML element trees and return field-level change records as JSON"""
+        try:
+            tibco_root = ET.fromstring(tibco_xml)
+            python_root = ET.fromstring(python_xml)
+        except ET.ParseError as e:
+            print(f"Error parsing XML: {e}")
+            raise ComparisonError("Invalid XML in one of the responses.") from e
+
+        try:
+            records, metrics = _XmlTreeDiff(key_attributes).run(tibco_root, python_root)
+            return json.dumps(records), metrics
+        except Exception as e:
+            print(f"Error comparing XML trees: {e}")
+            raise ComparisonError("An error occurred while comparing XML.") from e
+
+    @staticmethod
+    def compare_xml_stream(tibco_file: BinaryIO, python_file: BinaryIO, write: Callable[[str], None],
+                           window: int = 2000, max_hunk_lines: int = 10000,
+                           max_line_bytes: int = 64 * 1024) -> dict:
+        """Unified line diff of two large bodies read from files, without loading either.
+
+        Lines longer than ``max_line_bytes`` are split (see _bounded_lines) so a
+        single-line document never has to be held whole. Hunks are passed to
+        ``write`` as they are produced; returns the metrics.
+        """
+        try:
+            tibco_file.seek(0)
+            python_file.seek(0)
+            hunks, _ = _diff_line_streams(_bounded_lines(tibco_file, max_line_bytes),
+                                          _bounded_lines(python_file, max_line_bytes),
+                                          write, window, max_hunk_lines)
+            return hunks.metrics(tibco_file.tell() + python_file.tell())
+        except Exception as e:
+            print(f"Error comparing XML streams: {e}")
+            raise ComparisonError("An error occurred while comparing XML.") from e
+
+    @staticmethod
+    def build_view(tibco_text: str, python_text: str, context: int = 3, window: int = 2000,
+                   max_line_bytes: int = 64 * 1024, max_hunk_lines: int = 10000) -> dict:
+        """Render-ready view of a comparison, computed once and stored with it.
+
+        ``changes`` is the added/removed/changed field summary, ``hunks`` the
+        unified diff (lines as ``[tag, old_no, new_no, text]``) and ``split``
+        the full side-by-side alignment (rows as
+        ``[old_no, old_text, new_no, new_text, kind]``, kind one of context,
+        change, remove, add). Lines are aligned as in text-mode compare_xml.
+        """
+        return ResponseComparator._compare_lines(
+            tibco_text, python_text, True, window, max_line_bytes, max_hunk_lines, context)[2]
+
+    @staticmethod
+    def build_view_from_unified(diff_text: str) -> dict:
+        """Same view built from a stored unified diff (used when the bodies are too large to realign).
+
+        The side-by-side rows then only cover the hunks (``split_context`` is
+        ``"hunks"``).
+        """
+        hunks = []
+        old_no = new_no = 0
+        for line in diff_text.splitlines():
+            header = _HUNK_HEADER.match(line)
+            if header:
+                old_no, new_no = int(header.group(1)), int(header.group(2))
+                hunks.append({"header": line, "lines": []})
+            elif hunks and line[:1] in (' ', '-', '+'):
+                tag, text = line[0], line[1:]
+                hunks[-1]["lines"].append([tag, old_no if tag != '+' else None,
+                                           new_no if tag != '-' else None, text])
+                old_no += tag != '+'
+                new_no += tag != '-'
+
+        split = []
+        for hunk in hunks:
+            lines = hunk["lines"]
+            position = 0
+            while position < len(lines):
+                tag = lines[position][0]
+                if tag == ' ':
+                    _, old_line, new_line, text = lines[position]
+                    split.append([old_line, text, new_line, text, 'context'])
+                    position += 1
+                    continue
+                removed = []
+                while position < len(lines) and lines[position][0] == '-':
+                    removed.append(lines[position])
+                    position += 1
+                added = []
+                while position < len(lines) and lines[position][0] == '+':
+                    added.append(lines[position])
+                    position += 1
+                for offset in range(max(len(removed), len(added))):
+                    old = removed[offset] if offset < len(removed) else None
+                    new = added[offset] if offset < len(added) else None
+                    kind = 'change' if old and new else ('remove' if old else 'add')
+                    split.append([old[1] if old else None, old[3] if old else None,
+                                  new[2] if new else None, new[3] if new else None, kind])
+
+        return {
+            "changes": _field_changes((line[0], line[3]) for hunk in hunks for line in hunk["lines"]),
+            "hunks": hunks,
+            "split": split,
+            "split_context": "hunks",
+        }
+
+    @staticmethod
+    def view_index(view: dict) -> dict:
+        """Everything but the lines of a view: field changes, totals and one entry per hunk.
+
+        Each hunk records where it starts in the flattened unified lines
+        (``offset``/``count``, header row included) and which side-by-side rows
+        cover it (``split_offset``/``split_count``), so a client can fold hunks
+        and page lines in with ``view_lines`` instead of loading the whole diff.
+        """
+        old_rows, new_rows = {}, {}
+        for position, (old_no, _, new_no, _, _) in enumerate(view["split"]):
+            if old_no is not None:
+                old_rows[old_no] = position
+            if new_no is not None:
+                new_rows[new_no] = position
+
+        index, offset = [], 0
+        for hunk in view["hunks"]:
+            lines = hunk["lines"]
+            rows = [old_rows[old_no] for _, old_no, _, _ in lines if old_no in old_rows]
+            rows += [new_rows[new_no] for _, _, new_no, _ in lines if new_no in new_rows]
+            index.append({
+                "header": hunk["header"],
+                "offset": offset,
+                "count": len(lines) + 1,
+                "split_offset": min(rows) if rows else 0,
+                "split_count": max(rows) - min(rows) + 1 if rows else 0,
+                "added": sum(1 for line in lines if line[0] == '+'),
+                "removed": sum(1 for line in lines if line[0] == '-'),
+            })
+            offset += len(lines) + 1
+
+        return {
+            "changes": view["changes"],
+            "hunks": index,
+            "unified_lines": offset,
+            "split_rows": len(view["split"]),
+            "split_context": view.get("split_context", "full"),
+        }
+
+    @staticmethod
+    def view_rows(view: dict, kind: str) -> list:
+        """All rows ``view_lines`` pages over for ``kind`` (unified rows include the hunk headers)"""
+        if kind == "split":
+            return view["split"]
+        return [row for hunk in view["hunks"] for row in [["@", None, None, hunk["header"]]] + hunk["lines"]]
+
+    @staticmethod
+    def view_from_rows(index: dict, unified: list, split: list) -> dict:
+        """Rebuild a view from its ``view_index`` and the rows returned by ``view_rows``"""
+        return {
+            "changes": index["changes"],
+            "hunks": [{"header": hunk["header"], "lines": unified[hunk["offset"] + 1:hunk["offset"] + hunk["count"]]}
+                      for hunk in index["hunks"]],
+            "split": split,
+            "split_context": index["split_context"],
+        }
+
+    @staticmethod
+    def view_lines(view: dict, kind: str, offset: int, limit: int) -> dict:
+        """One page of a view's lines.
+
+        ``kind="unified"`` pages the hunks flattened into ``[tag, old_no,
+        new_no, text]`` rows, each hunk preceded by a ``["@", None, None,
+        header]`` row; ``kind="split"`` pages the side-by-side rows.
+        """
+        if kind == "split":
+            rows = view["split"]
+            total = len(rows)
+            page = rows[offset:offset + limit]
+        else:
+            page, total = [], 0
+            for hunk in view["hunks"]:
+                size = len(hunk["lines"]) + 1
+                if total + size > offset and len(page) < limit:
+                    flat = [["@", None, None, hunk["header"]]] + hunk["lines"]
+                    start = max(offset - total, 0)
+                    page.extend(flat[start:start + limit - len(page)])
+                total += size
+        return {"kind": kind, "offset": offset, "limit": limit, "total": total, "lines": page}
+
+    @staticmethod
+    def compare_json(tibco_json: dict, python_json: dict, mode: str = 'keyed',
+                     key_fields: Sequence[str] = DEFAULT_JSON_KEY_FIELDS) -> tuple:
+        """Diff decoded JSON documents into a DeepDiff-style report.
+
+        ``keyed`` pairs list elements on ``key_fields`` and skips identical
+        subtrees by hash; ``deepdiff`` runs ``DeepDiff(ignore_order=True)``,
+        which is roughly quadratic on large arrays.
+        """
+        try:
+            if mode == 'deepdiff':
+                diff = DeepDiff(tibco_json, python_json, ignore_order=True)
+                return diff.to_json(), _json_metrics(diff)
+            report, metrics = _JsonKeyedDiff(key_fields).run(tibco_json, python_json)
+            return json.dumps(report), metrics
+        except Exception as e:
+            print(f"Error comparing JSON: {e}")
+            raise ComparisonError("An error occurred while comparing JSON.") from e
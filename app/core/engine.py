@@ -1,89 +1,497 @@
 import asyncio
+import copy
+import hashlib
 import json
-import sqlite3
+import os
+import tempfile
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Any
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, TypeVar
 from uuid import uuid4
 from datetime import datetime
-from app.services.fetcher import fetch_data
+from app.services.fetcher import fetch_conditional, fetch_data, fetch_to_file
 from app.core.comparator import ResponseComparator
+from app.core.workers import DiffWorkerPool, run_large_diff, run_pipeline
+from app.data.cache import DiffCache
 from app.data.db import DBHandler
-from app.config import settings
+from app.data.writer import ComparisonWriter
+from app.config import line_diff_options, settings
 from app.models import ComparisonResult
 import logging
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 class ComparisonError(Exception):
     """Custom exception for comparison failures"""
     pass
 
 
+def _sha256(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _record(result: ComparisonResult) -> Dict[str, Any]:
+    """Row to persist for a result, including its (API-hidden) precomputed view and diff-cache key"""
+    return {**result.dict(), "view": result.view, "diff_key": result.diff_key}
+
+
+def _batch_concurrency(requested: Optional[int]) -> int:
+    """Per-batch fetch concurrency; callers may lower BATCH_MAX_CONCURRENCY but not exceed it"""
+    return min(requested or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+
+
 class ComparisonEngine:
     def __init__(self):
         self.thread_pool = ThreadPoolExecutor(max_workers=4)
         self.db = DBHandler()
         self.comparator = ResponseComparator()
+        self.diff_cache = DiffCache(self.db, max_size=settings.CACHE_SIZE)
+        self.writer = ComparisonWriter(self.db)
+        self._worker_pool: Optional[DiffWorkerPool] = None
+        self._validators: OrderedDict = OrderedDict()  # url -> etag/last_modified/body_hash ({} = none), LRU-bounded
+        self._inflight: Dict[Tuple[str, str, str], Tuple[asyncio.Future, float]] = {}
 
-    async def _fetch_data(self, url: str) -> str:
+    async def _fetch_data(self, url: str) -> Tuple[str, str, bool]:
+        """Fetch one upstream body; returns (body, sha256, not_modified)"""
         try:
             logger.info(f"Fetching data from {url}")
-            return await fetch_data(url)
+            if not settings.CONDITIONAL_FETCH_ENABLED:
+                body = await fetch_data(url)
+                return body, _sha256(body), False
+            return await self._fetch_conditional(url)
         except Exception as e:
             print(f"Error fetching from {url}: {e}")
             raise
 
-    async def run_comparison(self, compare_type: str = 'xml') -> ComparisonResult:
-        try:
-            tibco_resp, python_resp = await asyncio.gather(
-                self._fetch_data(settings.TIBCO_URL),
-                self._fetch_data(settings.PYTHON_URL)
+    async def _fetch_conditional(self, url: str) -> Tuple[str, str, bool]:
+        """Revalidate with the last ETag/Last-Modified and reuse the stored body on a 304.
+
+        URLs known to have no validator are cached as an empty dict, so
+        upstreams that send neither header cost no DB read per fetch.
+        """
+        loop = asyncio.get_event_loop()
+        validator = self._validators.get(url)
+        if validator is None:
+            validator = await loop.run_in_executor(self.thread_pool, self.db.get_validator, url) or {}
+            self._remember_validator(url, validator)
+        else:
+            self._validators.move_to_end(url)
+
+        if validator and (validator.get("etag") or validator.get("last_modified")):
+            body, etag, last_modified = await fetch_conditional(
+                url, validator.get("etag"), validator.get("last_modified")
             )
+            if body is None:
+                stored = await loop.run_in_executor(self.thread_pool, self.db.get_blob, validator["body_hash"])
+                if stored is not None:
+                    logger.info(f"{url} not modified, reusing stored body")
+                    return stored, validator["body_hash"], True
+                # The stored body was pruned; fall through to a full fetch
+                body, etag, last_modified = await fetch_conditional(url)
+        else:
+            body, etag, last_modified = await fetch_conditional(url)
 
-            if not tibco_resp or not python_resp:
-                raise ValueError("One or both responses are empty.")
+        body_hash = _sha256(body)
+        if etag or last_modified:
+            validator = {"etag": etag, "last_modified": last_modified, "body_hash": body_hash}
+            self._remember_validator(url, validator)
+            await loop.run_in_executor(
+                self.thread_pool, self.db.save_validator, url, etag, last_modified, body_hash
+            )
+        elif validator:
+            self._remember_validator(url, {})
+        return body, body_hash, False
 
-            if compare_type == 'json':
-                try:
-                    tibco_json = json.loads(tibco_resp)
-                    python_json = json.loads(python_resp)
-                except json.JSONDecodeError as e:
-                    print("JSON decoding failed:", e)
-                    raise ComparisonError("Invalid JSON in one of the responses.") from e
+    def _remember_validator(self, url: str, validator: Dict[str, Any]):
+        self._validators[url] = validator
+        self._validators.move_to_end(url)
+        while len(self._validators) > settings.CONDITIONAL_VALIDATORS_CACHE_SIZE:
+            self._validators.popitem(last=False)
 
-                diff, metrics = self.comparator.compare_json(tibco_json, python_json)
-            else:
-                diff, metrics = self.comparator.compare_xml(tibco_resp, python_resp)
+    async def _fetch_both(self, tibco_url: str, python_url: str) -> Tuple[Tuple[str, str, bool], Tuple[str, str, bool]]:
+        """Fetch both upstreams concurrently; the first failure cancels the other fetch"""
+        tasks = [
+            asyncio.ensure_future(self._fetch_data(tibco_url)),
+            asyncio.ensure_future(self._fetch_data(python_url))
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+            return tasks[0].result(), tasks[1].result()
+        finally:
+            for task in tasks:
+                task.cancel()
 
-            def save_to_db():
-                try:
-                    with sqlite3.connect(settings.DB_PATH) as conn:
-                        cursor = conn.execute(
-                            """INSERT INTO comparisons 
-                            (tibco_response, python_response, differences, metrics) 
-                            VALUES (?, ?, ?, ?)""",
-                            (tibco_resp, python_resp, diff, json.dumps(metrics)))
-                        conn.commit()
-                        return cursor.rowcount > 0
-                except Exception as e:
-                    print(f"Failed to save to database: {e}")
-                    return False
+    async def _compare(self, tibco_url: str, python_url: str, compare_type: str) -> ComparisonResult:
+        """Fetch both upstreams and diff them within COMPARISON_DEADLINE, without persisting.
 
-            saved = await asyncio.get_event_loop().run_in_executor(
-                self.thread_pool, save_to_db
+        On the deadline wait_for cancels the in-flight step; a diff running in
+        a worker process has that worker killed by the pool.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._fetch_and_diff(tibco_url, python_url, compare_type),
+                timeout=settings.COMPARISON_DEADLINE
             )
+        except asyncio.TimeoutError:
+            raise ComparisonError(f"Comparison exceeded its {settings.COMPARISON_DEADLINE}s deadline")
+
+    async def _fetch_and_diff(self, tibco_url: str, python_url: str, compare_type: str) -> ComparisonResult:
+        (tibco_resp, tibco_hash, tibco_304), (python_resp, python_hash, python_304) = \
+            await self._fetch_both(tibco_url, python_url)
+
+        if not tibco_resp or not python_resp:
+            raise ValueError("One or both responses are empty.")
+
+        if tibco_304 and python_304:
+            logger.info(f"Neither {tibco_url} nor {python_url} changed, looking up the previous diff")
+        diff_key = None
+        if settings.DIFF_CACHE_ENABLED:
+            diff_key = DiffCache.make_key(tibco_hash, python_hash, self._diff_mode(compare_type))
+        diff, metrics, view, cache_hit = await self._diff(tibco_resp, python_resp, compare_type, diff_key)
 
-            if not saved:
-                raise ComparisonError("Failed to save comparison to the database.")
+        return ComparisonResult(
+            tibco_response=tibco_resp,
+            python_response=python_resp,
+            differences=diff,
+            metrics=metrics,
+            tibco_url=tibco_url,
+            python_url=python_url,
+            cache_hit=cache_hit,
+            view=view,
+            diff_key=diff_key
+        )
 
-            return ComparisonResult(
-                tibco_response=tibco_resp,
-                python_response=python_resp,
-                differences=diff,
-                metrics=metrics
+    def _get_worker_pool(self) -> DiffWorkerPool:
+        if self._worker_pool is None:
+            self._worker_pool = DiffWorkerPool(settings.DIFF_MAX_WORKERS)
+        return self._worker_pool
+
+    async def _run_offloaded(self, func: Callable[..., T], *args, size: Optional[int]) -> T:
+        """Run CPU-bound comparator work off the event loop within DIFF_TIMEOUT, inline when ``size`` is small.
+
+        ``size=None`` (file-backed work of unknown size) is never run inline;
+        it goes to the thread pool unless DIFF_EXECUTOR is "process".
+        With the process executor a diff that times out, or whose caller is
+        cancelled (e.g. by the COMPARISON_DEADLINE), has its own worker
+        killed; diffs of other requests are unaffected. Threads cannot be
+        killed, so with the thread executor a timed-out diff runs to the end.
+        """
+        if size is not None and (settings.DIFF_EXECUTOR not in ("process", "thread")
+                                 or size <= settings.DIFF_INLINE_MAX_BYTES):
+            return func(*args)
+
+        try:
+            if settings.DIFF_EXECUTOR == "process":
+                return await self._get_worker_pool().run(func, *args, timeout=settings.DIFF_TIMEOUT)
+            return await asyncio.wait_for(
+                asyncio.get_event_loop().run_in_executor(self.thread_pool, func, *args),
+                timeout=settings.DIFF_TIMEOUT
             )
+        except asyncio.TimeoutError:
+            logger.warning(f"Diff exceeded {settings.DIFF_TIMEOUT}s and was stopped")
+            raise ComparisonError(f"Diff did not finish within {settings.DIFF_TIMEOUT}s")
+        except BrokenProcessPool as e:
+            # The worker died (e.g. OOM-killed); its slot gets a fresh worker on the next diff
+            raise ComparisonError("Diff worker process terminated unexpectedly") from e
+
+    def close(self):
+        """Kill the diff worker processes (called from the app shutdown hook)"""
+        if self._worker_pool is not None:
+            self._worker_pool.shutdown()
+            self._worker_pool = None
+
+    @staticmethod
+    def _diff_mode(compare_type: str) -> str:
+        """Diff cache mode: the diff settings plus a fingerprint of the normalization rules"""
+        if compare_type == 'json':
+            mode = f"json:{settings.JSON_DIFF_MODE}:{','.join(settings.JSON_KEY_FIELDS)}"
+        else:
+            mode = f"xml:{settings.XML_DIFF_MODE}:{','.join(settings.XML_KEY_ATTRIBUTES)}"
+            if settings.XML_DIFF_MODE == 'text':
+                mode += ":lines:" + ":".join(str(v) for v in line_diff_options().values())
+        if settings.NORMALIZE_ENABLED:
+            rules = json.dumps([settings.NORMALIZE_IGNORE_PATHS, settings.NORMALIZE_DECIMALS,
+                                settings.NORMALIZE_TIMESTAMP_RESOLUTION])
+            mode += ":norm:" + _sha256(rules)[:16]
+        return mode
+
+    async def _diff(self, tibco_resp: str, python_resp: str, compare_type: str,
+                    key: Optional[str]) -> Tuple[str, dict, Optional[dict], bool]:
+        """Normalize and diff two bodies and build their view, serving repeats from the diff cache.
+
+        Returns (diff, metrics, view, cache_hit). The view is None on a cache
+        hit, where the DB reuses the view stored with the diff-cache entry
+        ``key``, and when it could not be built here (bodies above
+        VIEW_MAX_BODY_BYTES, or a failure); the view is then built on first
+        request instead.
+        """
+        loop = asyncio.get_event_loop()
+        if key is not None:
+            cached = await loop.run_in_executor(self.thread_pool, self.diff_cache.get, key)
+            if cached is not None:
+                return cached[0], cached[1], None, True
+
+        normalize_args = None
+        if settings.NORMALIZE_ENABLED:
+            normalize_args = (settings.NORMALIZE_IGNORE_PATHS, settings.NORMALIZE_DECIMALS,
+                              settings.NORMALIZE_TIMESTAMP_RESOLUTION)
+        diff_args = (settings.XML_DIFF_MODE, settings.XML_KEY_ATTRIBUTES,
+                     settings.JSON_DIFF_MODE, settings.JSON_KEY_FIELDS)
+        # One task per comparison, so DIFF_TIMEOUT bounds normalize, diff and view together
+        diff, metrics, view = await self._run_offloaded(
+            run_pipeline, tibco_resp, python_resp, compare_type, diff_args, normalize_args,
+            settings.VIEW_MAX_BODY_BYTES, line_diff_options(),
+            size=len(tibco_resp) + len(python_resp)
+        )
+        if key is not None:
+            await loop.run_in_executor(self.thread_pool, self.diff_cache.set, key, diff, metrics)
+        return diff, metrics, view, False
+
+    async def run_comparison(self, compare_type: str = 'xml',
+                             tibco_url: Optional[str] = None,
+                             python_url: Optional[str] = None) -> ComparisonResult:
+        """Compare and persist one URL pair.
+
+        Concurrent calls for the same pair share one in-flight fetch, diff
+        and save (single-flight). A call arriving within COALESCE_WINDOW
+        seconds of the shared run's start reuses its result even if it has
+        already finished.
+        """
+        tibco_url = tibco_url or settings.TIBCO_URL
+        python_url = python_url or settings.PYTHON_URL
+        return await self._single_flight(
+            (tibco_url, python_url, compare_type),
+            lambda: self._run_comparison(compare_type, tibco_url, python_url),
+            lambda result: result.model_copy(deep=True)
+        )
+
+    async def _single_flight(self, key: tuple, run: Callable[[], Awaitable[T]], clone: Callable[[T], T]) -> T:
+        """Await ``run()``, sharing one in-flight run per ``key`` while COALESCE_ENABLED.
+
+        Each caller gets ``clone`` of the shared result, so callers that
+        mutate theirs do not affect each other.
+        """
+        if not settings.COALESCE_ENABLED:
+            return await run()
+
+        loop = asyncio.get_event_loop()
+        entry = self._inflight.get(key)
+        if entry is not None:
+            future, started_at = entry
+            if not future.done() or loop.time() - started_at <= settings.COALESCE_WINDOW:
+                logger.info(f"Coalescing comparison {key}")
+                return clone(await asyncio.shield(future))
+
+        future = asyncio.ensure_future(run())
+        started_at = loop.time()
+        self._inflight[key] = (future, started_at)
+
+        def forget(_):
+            remaining = max(settings.COALESCE_WINDOW - (loop.time() - started_at), 0)
+            loop.call_later(remaining, self._forget_inflight, key, future)
+
+        future.add_done_callback(forget)
+        # shield: a caller that disconnects must not cancel the run others are waiting on
+        return clone(await asyncio.shield(future))
+
+    def _forget_inflight(self, key: tuple, future: asyncio.Future):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is future:
+            del self._inflight[key]
+
+    async def _run_comparison(self, compare_type: str, tibco_url: str, python_url: str) -> ComparisonResult:
+        try:
+            result = await self._compare(tibco_url, python_url, compare_type)
+
+            try:
+                result.id = await self.writer.submit(_record(result))
+            except Exception as e:
+                print(f"Failed to save to database: {e}")
+                raise ComparisonError("Failed to save comparison to the database.") from e
+
+            return result
 
         except Exception as e:
             print(f"Comparison failed: {e}")
             logger.error(f"Comparison failed: {str(e)}", exc_info=True)
             raise ComparisonError(f"Comparison failed: {str(e)}")
+
+    async def run_large_comparison(self, tibco_url: Optional[str] = None,
+                                   python_url: Optional[str] = None) -> Dict[str, Any]:
+        """Compare very large XML bodies without holding either in memory.
+
+        Both bodies are streamed into files under STREAM_TEMP_DIR, normalized
+        and diffed file to file by a diff worker with the same line diff as
+        run_comparison (so both report the same metrics for the same bodies),
+        and stored in the blob store. Fetch and diff share the
+        COMPARISON_DEADLINE, and concurrent calls for the same pair share one
+        run as in run_comparison. Returns the row id and metrics, not the bodies.
+        """
+        tibco_url = tibco_url or settings.TIBCO_URL
+        python_url = python_url or settings.PYTHON_URL
+        return await self._single_flight(
+            ("large", tibco_url, python_url),
+            lambda: self._run_large_comparison(tibco_url, python_url),
+            copy.deepcopy
+        )
+
+    async def _run_large_comparison(self, tibco_url: str, python_url: str) -> Dict[str, Any]:
+        try:
+            with tempfile.TemporaryDirectory(dir=settings.STREAM_TEMP_DIR) as temp_dir:
+                tibco_path = os.path.join(temp_dir, "tibco")
+                python_path = os.path.join(temp_dir, "python")
+                diff_path = os.path.join(temp_dir, "diff")
+                try:
+                    metrics = await asyncio.wait_for(
+                        self._fetch_and_diff_files(tibco_url, python_url, tibco_path, python_path, diff_path),
+                        timeout=settings.COMPARISON_DEADLINE
+                    )
+                except asyncio.TimeoutError:
+                    raise ComparisonError(
+                        f"Comparison did not finish within the {settings.COMPARISON_DEADLINE}s deadline"
+                    )
+
+                def save():
+                    with open(tibco_path, "rb") as tibco_file, open(python_path, "rb") as python_file, \
+                            open(diff_path, "rb") as diff_file:
+                        return self.db.save_streamed_comparison(
+                            tibco_file, python_file, diff_file, metrics, tibco_url, python_url
+                        )
+
+                row_id = await asyncio.get_event_loop().run_in_executor(self.thread_pool, save)
+            return {"id": row_id, "has_differences": metrics["changed_lines"] > 0, "metrics": metrics}
+
+        except Exception as e:
+            logger.error(f"Large comparison failed: {str(e)}", exc_info=True)
+            raise ComparisonError(f"Comparison failed: {str(e)}")
+
+    async def _fetch_and_diff_files(self, tibco_url: str, python_url: str,
+                                    tibco_path: str, python_path: str, diff_path: str) -> dict:
+        """Stream both bodies to their files, then diff them into ``diff_path``; returns the metrics"""
+        logger.info(f"Streaming {tibco_url} and {python_url} to temp files")
+        tasks = [
+            asyncio.ensure_future(fetch_to_file(tibco_url, tibco_path)),
+            asyncio.ensure_future(fetch_to_file(python_url, python_path))
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        normalize_args = None
+        if settings.NORMALIZE_ENABLED:
+            normalize_args = (settings.NORMALIZE_IGNORE_PATHS, settings.NORMALIZE_DECIMALS,
+                              settings.NORMALIZE_TIMESTAMP_RESOLUTION)
+        return await self._run_offloaded(
+            run_large_diff, tibco_path, python_path, diff_path, normalize_args, line_diff_options(),
+            size=None
+        )
+
+    def _batch_item(self, index: int, pair: Tuple[str, str], outcome,
+                    comparison_id: Optional[int] = None) -> Dict[str, Any]:
+        tibco_url, python_url = pair
+        item = {"index": index, "tibco_url": tibco_url, "python_url": python_url}
+        if isinstance(outcome, ComparisonResult):
+            item.update(
+                status="ok",
+                id=comparison_id,
+                has_differences=self.comparator.has_differences(outcome.differences),
+                cache_hit=outcome.cache_hit,
+                metrics=outcome.metrics
+            )
+        else:
+            logger.warning(f"Batch item {index} failed: {outcome}")
+            item.update(status="error", error=str(outcome))
+        return item
+
+    @staticmethod
+    def _batch_summary(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        succeeded = sum(1 for i in items if i["status"] == "ok")
+        return {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "with_differences": sum(1 for i in items if i.get("has_differences"))
+        }
+
+    async def run_batch(self, pairs: List[Tuple[str, str]], compare_type: str = 'xml',
+                        concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Compare many URL pairs concurrently and persist them with one bulk insert.
+
+        Fetches are bounded by a semaphore so a large batch cannot exhaust the
+        upstream connection pool. Failed items are reported, not raised.
+        """
+        semaphore = asyncio.Semaphore(_batch_concurrency(concurrency))
+
+        async def compare_one(tibco_url: str, python_url: str) -> ComparisonResult:
+            async with semaphore:
+                return await self._compare(tibco_url, python_url, compare_type)
+
+        outcomes = await asyncio.gather(
+            *(compare_one(tibco_url, python_url) for tibco_url, python_url in pairs),
+            return_exceptions=True
+        )
+
+        succeeded = [o for o in outcomes if isinstance(o, ComparisonResult)]
+        try:
+            ids = await asyncio.get_event_loop().run_in_executor(
+                self.thread_pool, self.db.save_comparisons, [_record(r) for r in succeeded]
+            )
+        except Exception as e:
+            logger.error(f"Batch save failed: {str(e)}", exc_info=True)
+            raise ComparisonError(f"Failed to save batch to the database: {str(e)}")
+        id_iter = iter(ids)
+
+        items = [
+            self._batch_item(index, pair, outcome,
+                             next(id_iter) if isinstance(outcome, ComparisonResult) else None)
+            for index, (pair, outcome) in enumerate(zip(pairs, outcomes))
+        ]
+        return {**self._batch_summary(items), "items": items}
+
+    async def iter_batch(self, pairs: List[Tuple[str, str]], compare_type: str = 'xml',
+                         concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of run_batch: yields each item as soon as it is diffed and saved.
+
+        Results go to the batched writer as they finish and are dropped once yielded, so
+        memory stays flat regardless of batch size. A final summary record
+        (``{"summary": {...}}``) is yielded last.
+        """
+        semaphore = asyncio.Semaphore(_batch_concurrency(concurrency))
+
+        async def compare_one(index: int, pair: Tuple[str, str]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    outcome = await self._compare(pair[0], pair[1], compare_type)
+                except Exception as e:
+                    return self._batch_item(index, pair, e)
+            try:
+                row_id = await self.writer.submit(_record(outcome))
+            except Exception as e:
+                return self._batch_item(index, pair, ComparisonError(f"Failed to save: {str(e)}"))
+            return self._batch_item(index, pair, outcome, row_id)
+
+        tasks = [asyncio.ensure_future(compare_one(index, pair)) for index, pair in enumerate(pairs)]
+        totals = {"total": 0, "succeeded": 0, "failed": 0, "with_differences": 0}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                totals["total"] += 1
+                totals["succeeded" if item["status"] == "ok" else "failed"] += 1
+                totals["with_differences"] += 1 if item.get("has_differences") else 0
+                yield item
+            yield {"summary": totals}
+        finally:
+            # Client went away mid-stream: stop outstanding fetches
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,278 @@
+import json
+import logging
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_TIMESTAMP_RE = re.compile(
+    r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?$'
+)
+_DECIMAL_RE = re.compile(r'^-?\d+\.\d+$')
+
+_XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+_LEADING_BLANKS = b'\xef\xbb\xbf \t\r\n'  # UTF-8 BOM and whitespace before the root
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else str(tag)
+
+
+def _escape_text(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _escape_attrib(value: str) -> str:
+    return (_escape_text(value).replace('"', '&quot;')
+            .replace('\r', '&#13;').replace('\n', '&#10;').replace('\t', '&#09;'))
+
+
+def _segment_regex(segment: str) -> str:
+    return re.escape(segment).replace(r'\*', '[^.]*')
+
+
+@lru_cache(maxsize=32)
+def compile_path_matcher(patterns: Tuple[str, ...]) -> Optional[Pattern]:
+    """Compile ignore-path patterns into one regex matched against dotted paths.
+
+    A JSON value's path is its keys joined with '.' (list indexes are not
+    part of it), an XML node's path is the element names from the root, with
+    attributes as a final ``@name`` segment. In a pattern ``*`` matches within
+    one segment and a ``**`` segment matches any number of segments; a pattern
+    without a '.' matches that name at any depth.
+    """
+    alternatives = []
+    for pattern in patterns:
+        segments = pattern.strip().split('.')
+        if segments == ['']:
+            continue
+        if len(segments) == 1:
+            # Bare name: that key, element or attribute at any depth
+            regex = r'(?:\.[^.]+)*\.@?' + _segment_regex(segments[0].lstrip('@'))
+        else:
+            regex = ''.join(r'(?:\.[^.]+)*' if segment == '**' else r'\.' + _segment_regex(segment)
+                            for segment in segments)
+        alternatives.append(f'(?:{regex})')
+    return re.compile('|'.join(alternatives)) if alternatives else None
+
+
+class ResponseNormalizer:
+    """Rewrites a response body into a canonical form before it is diffed.
+
+    JSON is re-serialized with sorted keys and fixed indentation; XML is
+    re-serialized with sorted attributes, stripped whitespace and one element
+    per line. Comments, tails and the declaration are dropped; namespace
+    prefixes are renamed in order of appearance (``ns0``, ``ns1``...) and
+    declared on the element that first uses them. XML is rewritten while it
+    is parsed, so large bodies can be normalized file to file with the same
+    result (normalize_xml_file).
+    Fields whose path matches ``ignore_paths`` are removed, decimals are
+    rounded to ``decimals`` places and ISO-8601 timestamps are converted to
+    UTC and truncated to ``timestamp_resolution`` seconds. Bodies that do not
+    parse are returned unchanged.
+    """
+
+    def __init__(self, ignore_paths: Sequence[str] = (), decimals: Optional[int] = None,
+                 timestamp_resolution: int = 0):
+        self.matcher = compile_path_matcher(tuple(ignore_paths))
+        self.decimals = decimals
+        self.timestamp_resolution = timestamp_resolution
+
+    def normalize(self, body: str) -> str:
+        """Canonicalize ``body``; XML or JSON is detected from its first non-blank character"""
+        text = body.lstrip('\ufeff \t\r\n')
+        try:
+            if text.startswith('<'):
+                return self.normalize_xml(text)
+            if text.startswith(('{', '[')):
+                return self.normalize_json(text)
+        except (ValueError, ET.ParseError) as e:
+            logger.warning(f"Not normalizing unparseable body: {e}")
+            return body
+        logger.info("Not normalizing body that is neither XML nor JSON")
+        return body
+
+    def _ignored(self, path: str) -> bool:
+        return self.matcher is not None and self.matcher.fullmatch(path) is not None
+
+    def _timestamp(self, text: str) -> str:
+        if not self.timestamp_resolution or not _TIMESTAMP_RE.match(text):
+            return text
+        try:
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00').replace(' ', 'T'))
+        except ValueError:
+            return text
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc)
+        seconds = parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+        seconds -= seconds % self.timestamp_resolution
+        parsed = parsed.replace(hour=seconds // 3600, minute=seconds % 3600 // 60,
+                                second=seconds % 60, microsecond=0)
+        return parsed.isoformat()
+
+    def _text(self, text: str) -> str:
+        if self.decimals is not None and _DECIMAL_RE.match(text):
+            return f"{round(float(text), self.decimals):.{self.decimals}f}"
+        return self._timestamp(text)
+
+    def normalize_json(self, body: str) -> str:
+        return json.dumps(self._json(json.loads(body), ''), sort_keys=True, indent=2, ensure_ascii=False)
+
+    def _json(self, value: Any, path: str) -> Any:
+        if isinstance(value, dict):
+            normalized = {}
+            for key, child in value.items():
+                child_path = f"{path}.{key}"
+                if not self._ignored(child_path):
+                    normalized[key] = self._json(child, child_path)
+            return normalized
+        if isinstance(value, list):
+            return [self._json(item, path) for item in value]
+        if isinstance(value, float) and self.decimals is not None:
+            return round(value, self.decimals)
+        if isinstance(value, str):
+            return self._timestamp(value)
+        return value
+
+    def normalize_xml(self, body: str) -> str:
+        out: List[str] = []
+        self.normalize_xml_stream([body], out.append)
+        return ''.join(out)
+
+    def normalize_xml_file(self, source: BinaryIO, target: BinaryIO, chunk_bytes: int = 64 * 1024) -> bool:
+        """normalize_xml from file to file, holding only the open elements in memory.
+
+        Returns False, with ``target`` incomplete, when the source is not
+        well-formed XML.
+        """
+        def chunks():
+            head = b''
+            while not head:
+                chunk = source.read(chunk_bytes)
+                if not chunk:
+                    return
+                head = chunk.lstrip(_LEADING_BLANKS)
+            yield head
+            yield from iter(lambda: source.read(chunk_bytes), b'')
+
+        try:
+            self.normalize_xml_stream(chunks(), lambda text: target.write(text.encode('utf-8')))
+            return True
+        except ET.ParseError as e:
+            logger.warning(f"Not normalizing unparseable body: {e}")
+            return False
+
+    def normalize_xml_stream(self, chunks: Iterable[Union[str, bytes]], write: Callable[[str], None]):
+        """Canonicalize an XML document fed in ``chunks``, passing the output to ``write`` as it goes.
+
+        Raises ET.ParseError on malformed input, possibly after some output
+        was written.
+        """
+        parser = ET.XMLPullParser(events=("start", "end"))
+        lines = _XmlLineWriter(self, write)
+        for chunk in chunks:
+            parser.feed(chunk)
+            lines.handle(parser.read_events())
+        parser.close()
+        lines.handle(parser.read_events())
+
+
+class _XmlLineWriter:
+    """Writes normalized elements one per line as the pull parser reports them.
+
+    An element's start tag is written once its first child starts (its text
+    is known by then) or, for a leaf, together with its end. Finished
+    elements are cleared and detached so memory stays bounded by depth.
+    """
+
+    def __init__(self, normalizer: ResponseNormalizer, write: Callable[[str], None]):
+        self.normalizer = normalizer
+        self.write = write
+        self.stack: List[list] = []  # [elem, path, opened, declared namespace URIs] per open element
+        self.prefixes: Dict[str, str] = {}  # namespace URI -> nsN, in order of first use
+        self.skipping = 0  # depth inside an ignored subtree
+        self.first = True
+
+    def handle(self, events: Iterable[Tuple[str, ET.Element]]):
+        for event, elem in events:
+            if event == "start":
+                self.start(elem)
+            else:
+                self.end(elem)
+
+    def _line(self, level: int, text: str):
+        self.write(('' if self.first else '\n') + '  ' * level + text)
+        self.first = False
+
+    def start(self, elem: ET.Element):
+        if self.skipping:
+            self.skipping += 1
+            return
+        if self.stack:
+            parent = self.stack[-1]
+            path = f"{parent[1]}.{_local_name(elem.tag)}"
+            if self.normalizer._ignored(path):
+                self.skipping = 1
+                return
+            if not parent[2]:
+                self._open(len(self.stack) - 1)
+        else:
+            path = '.' + _local_name(elem.tag)
+        self.stack.append([elem, path, False, []])
+
+    def end(self, elem: ET.Element):
+        if self.skipping:
+            self.skipping -= 1
+            if not self.skipping:
+                self.stack[-1][0].remove(elem)
+            return
+        level = len(self.stack) - 1
+        _, _, opened, _ = self.stack[-1]
+        if opened:
+            self._line(level, f"</{self._tag_of(level)}>")
+        else:
+            text = self._element_text(elem)
+            start = self._start_tag(level)
+            self._line(level, f"{start}>{_escape_text(text)}</{self._tag_of(level)}>" if text else f"{start} />")
+        self.stack.pop()
+        elem.clear()
+        if self.stack:
+            self.stack[-1][0].remove(elem)
+
+    def _open(self, level: int):
+        entry = self.stack[level]
+        entry[2] = True
+        text = self._element_text(entry[0])
+        self._line(level, f"{self._start_tag(level)}>{_escape_text(text) if text else ''}")
+
+    def _element_text(self, elem: ET.Element) -> Optional[str]:
+        text = (elem.text or '').strip()
+        return self.normalizer._text(text) if text else None
+
+    def _qname(self, name: str, level: int) -> str:
+        if name[:1] != '{':
+            return name
+        uri, local = name[1:].split('}', 1)
+        if uri == _XML_NAMESPACE:
+            return 'xml:' + local
+        prefix = self.prefixes.setdefault(uri, f"ns{len(self.prefixes)}")
+        if not any(uri in entry[3] for entry in self.stack[:level + 1]):
+            self.stack[level][3].append(uri)
+        return f"{prefix}:{local}"
+
+    def _tag_of(self, level: int) -> str:
+        return self._qname(self.stack[level][0].tag, level)
+
+    def _start_tag(self, level: int) -> str:
+        elem, path, _, declared = self.stack[level]
+        tag = self._qname(elem.tag, level)
+        attrs = []
+        for name in sorted(elem.attrib):
+            if not self.normalizer._ignored(f"{path}.@{_local_name(name)}"):
+                value = self.normalizer._text(elem.attrib[name].strip())
+                attrs.append(f' {self._qname(name, level)}="{_escape_attrib(value)}"')
+        declarations = ''.join(f' xmlns:{self.prefixes[uri]}="{_escape_attrib(uri)}"' for uri in declared)
+        return f"<{tag}{declarations}{''.join(attrs)}"
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.data.async_db import AsyncDBHandler
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionJob:
+    """Applies the retention policy every RETENTION_INTERVAL seconds.
+
+    Each run prunes comparisons older than RETENTION_MAX_AGE_DAYS or beyond
+    the newest RETENTION_MAX_ROWS (archiving them to RETENTION_ARCHIVE_DIR when
+    set), trims diff_cache rows and upstream validators under the same limits
+    (plus RETENTION_DIFF_CACHE_MAX_BYTES), sweeps orphaned blobs and runs an
+    incremental VACUUM. See DBHandler.prune_comparisons. Runs go through the
+    DB executor of ``db``, like every other query.
+    """
+
+    def __init__(self, db: Optional[AsyncDBHandler] = None):
+        self.db = db or AsyncDBHandler()
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.runs = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Retention job started (every {settings.RETENTION_INTERVAL}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            logger.info("Retention job stopped")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.RETENTION_ENABLED,
+            "running": self.running,
+            "interval": settings.RETENTION_INTERVAL,
+            "max_age_days": settings.RETENTION_MAX_AGE_DAYS,
+            "max_rows": settings.RETENTION_MAX_ROWS,
+            "diff_cache_max_bytes": settings.RETENTION_DIFF_CACHE_MAX_BYTES,
+            "archive_dir": settings.RETENTION_ARCHIVE_DIR,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+    def _archive_path(self) -> Optional[Path]:
+        if settings.RETENTION_ARCHIVE_DIR is None:
+            return None
+        archive_dir = Path(settings.RETENTION_ARCHIVE_DIR)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        return archive_dir / f"comparisons-{datetime.now():%Y%m%d}.ndjson.gz"
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Run the retention policy now; concurrent calls share one run at a time"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self.last_run_at = datetime.now()
+            self.runs += 1
+            try:
+                self.last_result = await self.db.prune_comparisons(
+                    settings.RETENTION_MAX_AGE_DAYS or None,
+                    settings.RETENTION_MAX_ROWS or None,
+                    self._archive_path(),
+                    settings.RETENTION_DIFF_CACHE_MAX_BYTES or None
+                )
+                self.last_error = None
+                return self.last_result
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+
+    async def convert_auto_vacuum(self) -> Dict[str, Any]:
+        """Run DBHandler.convert_auto_vacuum, never concurrently with a retention run"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await self.db.convert_auto_vacuum()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(settings.RETENTION_INTERVAL)
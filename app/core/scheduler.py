@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.core.engine import ComparisonEngine
+
+logger = logging.getLogger(__name__)
+
+
+class _Target:
+    """Runtime state of one scheduled URL pair"""
+
+    def __init__(self, name: str, tibco_url: str, python_url: str, max_concurrency: int):
+        self.name = name
+        self.tibco_url = tibco_url
+        self.python_url = python_url
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.consecutive_failures = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_result_id: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[datetime] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "tibco_url": self.tibco_url,
+            "python_url": self.python_url,
+            "in_flight": self.in_flight,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "consecutive_failures": self.consecutive_failures,
+            "last_run_at": self.last_run_at,
+            "last_result_id": self.last_result_id,
+            "last_error": self.last_error,
+            "next_run_at": self.next_run_at,
+        }
+
+
+class ComparisonScheduler:
+    """Runs the configured URL pairs on an interval, reusing the app's ComparisonEngine.
+
+    Every target ticks every SCHEDULER_INTERVAL seconds (+/- SCHEDULER_JITTER
+    as a fraction). A tick is skipped while the target already has
+    SCHEDULER_MAX_CONCURRENCY_PER_TARGET runs in flight, and consecutive
+    upstream errors back the interval off exponentially up to
+    SCHEDULER_BACKOFF_MAX.
+    """
+
+    def __init__(self, engine: ComparisonEngine):
+        self.engine = engine
+        self.targets: List[_Target] = []
+        self._tasks: List[asyncio.Task] = []
+        self._runs: set = set()
+        self._resumed: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def paused(self) -> bool:
+        return self._resumed is not None and not self._resumed.is_set()
+
+    def _configured_targets(self) -> List[_Target]:
+        configured = settings.SCHEDULER_TARGETS or [
+            {"name": "default", "tibco_url": settings.TIBCO_URL, "python_url": settings.PYTHON_URL}
+        ]
+        return [
+            _Target(
+                name=target.get("name") or f"target-{index}",
+                tibco_url=target["tibco_url"],
+                python_url=target["python_url"],
+                max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY_PER_TARGET
+            )
+            for index, target in enumerate(configured)
+        ]
+
+    def start(self):
+        if self.running:
+            return
+        self.targets = self._configured_targets()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._tasks = [asyncio.create_task(self._loop(target)) for target in self.targets]
+        logger.info(f"Scheduler started with {len(self.targets)} target(s)")
+
+    async def stop(self):
+        tasks = self._tasks + list(self._runs)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._runs.clear()
+        logger.info("Scheduler stopped")
+
+    def pause(self):
+        if self._resumed is not None:
+            self._resumed.clear()
+            logger.info("Scheduler paused")
+
+    def resume(self):
+        if self._resumed is not None:
+            self._resumed.set()
+            logger.info("Scheduler resumed")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.SCHEDULER_ENABLED,
+            "running": self.running,
+            "paused": self.paused,
+            "interval": settings.SCHEDULER_INTERVAL,
+            "targets": [target.status() for target in self.targets],
+        }
+
+    def _delay(self, target: _Target) -> float:
+        interval = settings.SCHEDULER_INTERVAL
+        if target.consecutive_failures:
+            interval = min(interval * 2 ** target.consecutive_failures, settings.SCHEDULER_BACKOFF_MAX)
+        return interval * random.uniform(1 - settings.SCHEDULER_JITTER, 1 + settings.SCHEDULER_JITTER)
+
+    async def _loop(self, target: _Target):
+        # Spread the first runs so targets do not all fire at startup
+        await asyncio.sleep(random.uniform(0, settings.SCHEDULER_INTERVAL * settings.SCHEDULER_JITTER))
+        while True:
+            await self._resumed.wait()
+            if target.semaphore.locked():
+                target.skipped += 1
+                logger.warning(f"Scheduler: skipping {target.name}, {target.in_flight} run(s) still in flight")
+            else:
+                run = asyncio.create_task(self._run(target))
+                self._runs.add(run)
+                run.add_done_callback(self._runs.discard)
+                # Wait for the run to finish (or the interval to pass) so backoff sees its outcome
+                await asyncio.wait({run}, timeout=settings.SCHEDULER_INTERVAL)
+
+            delay = self._delay(target)
+            target.next_run_at = datetime.fromtimestamp(datetime.now().timestamp() + delay)
+            await asyncio.sleep(delay)
+
+    async def _run(self, target: _Target):
+        async with target.semaphore:
+            target.in_flight += 1
+            target.last_run_at = datetime.now()
+            try:
+                result = await self.engine.run_comparison(
+                    tibco_url=target.tibco_url,
+                    python_url=target.python_url
+                )
+                target.runs += 1
+                target.consecutive_failures = 0
+                target.last_result_id = result.id
+                target.last_error = None
+            except Exception as e:
+                target.runs += 1
+                target.failures += 1
+                target.consecutive_failures += 1
+                target.last_error = str(e)
+                logger.error(f"Scheduled comparison {target.name} failed "
+                             f"({target.consecutive_failures} in a row): {e}")
+            finally:
+                target.in_flight -= 1
@@ -0,0 +1,229 @@
+"""Diff work that runs in spawned worker processes.
+
+Spawned workers import this module (and the comparator and normalizer it
+needs) to unpickle their tasks, so it must stay free of the app, DB and
+HTTP client imports.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from app.core.comparator import DEFAULT_JSON_KEY_FIELDS, ComparisonError, ResponseComparator
+from app.core.normalizer import ResponseNormalizer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def run_diff(tibco_resp: str, python_resp: str, compare_type: str,
+             xml_mode: str, key_attributes: List[str],
+             json_mode: str = 'keyed',
+             json_key_fields: Sequence[str] = DEFAULT_JSON_KEY_FIELDS,
+             line_options: Optional[Dict[str, int]] = None) -> Tuple[str, dict]:
+    """Diff two response bodies; ``line_options`` tunes the text-mode line diff"""
+    if compare_type == 'json':
+        try:
+            tibco_json = json.loads(tibco_resp)
+            python_json = json.loads(python_resp)
+        except json.JSONDecodeError as e:
+            raise ComparisonError("Invalid JSON in one of the responses.") from e
+
+        return ResponseComparator.compare_json(
+            tibco_json, python_json,
+            mode=json_mode,
+            key_fields=json_key_fields
+        )
+    return ResponseComparator.compare_xml(
+        tibco_resp, python_resp,
+        mode=xml_mode,
+        key_attributes=key_attributes,
+        **(line_options or {})
+    )
+
+
+def run_normalize(tibco_resp: str, python_resp: str, ignore_paths: List[str],
+                  decimals: Optional[int], timestamp_resolution: int) -> Tuple[str, str]:
+    """Canonicalize both bodies before diffing"""
+    normalizer = ResponseNormalizer(ignore_paths, decimals, timestamp_resolution)
+    return normalizer.normalize(tibco_resp), normalizer.normalize(python_resp)
+
+
+def run_view(tibco_resp: str, python_resp: str, line_options: Optional[Dict[str, int]] = None) -> dict:
+    """Build the stored diff view"""
+    return ResponseComparator.build_view(tibco_resp, python_resp, **(line_options or {}))
+
+
+def run_pipeline(tibco_resp: str, python_resp: str, compare_type: str, diff_args: tuple,
+                 normalize_args: Optional[tuple], view_max_bytes: int,
+                 line_options: Optional[Dict[str, int]] = None) -> Tuple[str, dict, Optional[dict]]:
+    """Normalize, diff and build the view of one comparison in a single task.
+
+    ``normalize_args`` is None when normalization is off. The view always
+    shows the raw bodies, as a view built later from the stored bodies
+    does; when normalization left them unchanged it comes from the same
+    pass as the text diff. The view is None when the bodies exceed ``view_max_bytes`` or
+    it could not be built; it is then built on first request instead.
+    """
+    tibco_body, python_body = tibco_resp, python_resp
+    if normalize_args is not None:
+        tibco_body, python_body = run_normalize(tibco_resp, python_resp, *normalize_args)
+    with_view = len(tibco_resp) + len(python_resp) <= view_max_bytes
+    if (with_view and compare_type != 'json' and diff_args[0] == 'text'
+            and tibco_body == tibco_resp and python_body == python_resp):
+        return ResponseComparator.compare_xml_with_view(tibco_body, python_body, **(line_options or {}))
+
+    diff, metrics = run_diff(tibco_body, python_body, compare_type, *diff_args, line_options=line_options)
+    view = None
+    if with_view:
+        try:
+            view = run_view(tibco_resp, python_resp, line_options)
+        except Exception as e:
+            logger.warning(f"Diff view not precomputed, it will be built on first request: {e}")
+    return diff, metrics, view
+
+
+def run_large_diff(tibco_path: str, python_path: str, diff_path: str, normalize_args: Optional[tuple],
+                   line_options: Dict[str, int]) -> dict:
+    """Normalize and diff two large XML bodies file to file; returns the metrics.
+
+    Normalized copies are written next to the inputs (``<path>.normalized``);
+    a body that is not well-formed XML is diffed as is, as run_pipeline does.
+    The unified diff goes to ``diff_path``. Output and metrics equal those of
+    run_pipeline on the same bodies.
+    """
+    if normalize_args is not None:
+        normalizer = ResponseNormalizer(*normalize_args)
+        tibco_path = _normalized_file(normalizer, tibco_path, line_options["max_line_bytes"])
+        python_path = _normalized_file(normalizer, python_path, line_options["max_line_bytes"])
+    with open(tibco_path, "rb") as tibco_file, open(python_path, "rb") as python_file, \
+            open(diff_path, "w", encoding="utf-8", newline="") as diff_file:
+        return ResponseComparator.compare_xml_stream(tibco_file, python_file, diff_file.write, **line_options)
+
+
+def _normalized_file(normalizer: ResponseNormalizer, path: str, chunk_bytes: int) -> str:
+    target_path = path + ".normalized"
+    with open(path, "rb") as source, open(target_path, "wb") as target:
+        normalized = normalizer.normalize_xml_file(source, target, chunk_bytes)
+    return target_path if normalized else path
+
+
+def _worker_main(conn):
+    """Worker loop: run each (func, args) received and send back (ok, result or exception)"""
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = (True, func(*args))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send((False, RuntimeError(f"Diff worker could not return its result: {e}")))
+
+
+class _Worker:
+    """One worker process and the parent end of its pipe"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def call(self, func: Callable, args: tuple) -> Tuple[bool, Any]:
+        """Send one task and block until its reply (runs on a waiter thread)"""
+        self.conn.send((func, args))
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise BrokenProcessPool("Diff worker process terminated unexpectedly") from e
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+
+    def close(self):
+        self.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class DiffWorkerPool:
+    """Up to ``max_workers`` spawned processes, each running one task at a time.
+
+    Unlike ProcessPoolExecutor, a task that times out or whose caller is
+    cancelled has only its own worker killed; other in-flight tasks keep
+    running and the slot is refilled with a fresh worker on demand.
+    """
+
+    def __init__(self, max_workers: int, context=None):
+        self.max_workers = max_workers
+        self._context = context or multiprocessing.get_context("spawn")  # never fork a threaded server
+        self._idle: List[_Worker] = []
+        self._busy: Set[_Worker] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        # Waiting on a worker's pipe blocks, so each busy worker gets a waiter thread
+        self._waiters = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="diff-worker-wait")
+        self._closed = False
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_workers)
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, func: Callable[..., T], *args, timeout: Optional[float] = None) -> T:
+        """Run ``func(*args)`` in a worker; its worker is killed on timeout or cancellation"""
+        if self._closed:
+            raise RuntimeError("DiffWorkerPool is shut down")
+        async with self._get_slots():
+            worker = self._idle.pop() if self._idle else _Worker(self._context)
+            self._busy.add(worker)
+            reply = asyncio.get_running_loop().run_in_executor(self._waiters, worker.call, func, args)
+            try:
+                # shield: wait_for must not cancel the waiter thread's future, only stop waiting on it
+                ok, value = await asyncio.wait_for(asyncio.shield(reply), timeout)
+            except BaseException:
+                self._busy.discard(worker)
+                self._discard(worker, reply)
+                raise
+            self._busy.discard(worker)
+            if self._closed:
+                worker.close()
+            else:
+                self._idle.append(worker)
+        if not ok:
+            raise value
+        return value
+
+    @staticmethod
+    def _discard(worker: _Worker, reply: asyncio.Future):
+        """Kill ``worker``; it is reaped once its waiter thread sees the pipe close"""
+        worker.kill()
+
+        def reap(future: asyncio.Future):
+            if not future.cancelled():
+                future.exception()  # BrokenProcessPool from the kill; retrieved so it is not logged
+            worker.close()
+
+        reply.add_done_callback(reap)
+
+    def shutdown(self):
+        """Kill every worker, including those still running a task"""
+        self._closed = True
+        for worker in self._idle:
+            worker.close()
+        self._idle.clear()
+        for worker in list(self._busy):
+            worker.kill()
+        self._waiters.shutdown(wait=False)
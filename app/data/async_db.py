@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TypeVar
+
+from app.config import settings
+from app.data.db import DBHandler
+from app.models import ComparisonResult
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class QueryStats:
+    """Per-query call counts and timings (milliseconds)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, elapsed_ms: float, failed: bool = False):
+        with self._lock:
+            entry = self._stats.setdefault(
+                name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+            )
+            entry["calls"] += 1
+            entry["errors"] += int(failed)
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["last_ms"] = elapsed_ms
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {**entry, "avg_ms": entry["total_ms"] / entry["calls"] if entry["calls"] else 0.0}
+                for name, entry in self._stats.items()
+            }
+
+
+class AsyncDBHandler:
+    """Awaitable facade over DBHandler.
+
+    Every query runs on a dedicated DB executor (sized to the connection pool)
+    so SQLite work and row decoding never block the event loop, and each call
+    is timed into ``stats``.
+    """
+
+    def __init__(self, db: Optional[DBHandler] = None):
+        self.db = db or DBHandler()
+        self.cache = self.db.cache
+        self.stats = QueryStats()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily so the handler can be reused after close() (e.g. an app restart in tests)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=settings.DB_POOL_SIZE, thread_name_prefix="db")
+        return self._executor
+
+    def _timed(self, name: str, fn: Callable[..., T], *args) -> Callable[[], T]:
+        def call() -> T:
+            start = time.perf_counter()
+            failed = False
+            try:
+                return fn(*args)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self.stats.record(name, elapsed_ms, failed)
+                if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+                    logger.warning(f"Slow query {name}{args}: {elapsed_ms:.1f} ms")
+        return call
+
+    async def _run(self, name: str, fn: Callable[..., T], *args) -> T:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._get_executor(), self._timed(name, fn, *args))
+
+    async def get_comparisons(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return await self._run("get_comparisons", self.db.get_comparisons, limit)
+
+    async def get_comparison(self, comparison_id: int) -> Optional[ComparisonResult]:
+        return await self._run("get_comparison", self.db.get_comparison, comparison_id)
+
+    async def get_view(self, comparison_id: int) -> Optional[Dict[str, Any]]:
+        return await self._run("get_view", self.db.get_view, comparison_id)
+
+    async def get_view_index(self, comparison_id: int) -> Optional[Dict[str, Any]]:
+        return await self._run("get_view_index", self.db.get_view_index, comparison_id)
+
+    async def get_view_lines(self, comparison_id: int, kind: str, offset: int,
+                             limit: int) -> Optional[Dict[str, Any]]:
+        return await self._run("get_view_lines", self.db.get_view_lines, comparison_id, kind, offset, limit)
+
+    async def get_comparison_summaries(self, limit: int = 20, before_id: Optional[int] = None,
+                                       has_differences: Optional[bool] = None, url: Optional[str] = None,
+                                       since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        return await self._run("get_comparison_summaries", self.db.get_comparison_summaries,
+                               limit, before_id, has_differences, url, since)
+
+    async def prune_comparisons(self, max_age_days: Optional[float] = None, max_rows: Optional[int] = None,
+                                archive_path: Optional[Path] = None,
+                                diff_cache_max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        return await self._run("prune_comparisons", self.db.prune_comparisons,
+                               max_age_days, max_rows, archive_path, diff_cache_max_bytes)
+
+    async def convert_auto_vacuum(self) -> Dict[str, Any]:
+        return await self._run("convert_auto_vacuum", self.db.convert_auto_vacuum)
+
+    async def iter_comparisons(self, limit: int = 10) -> AsyncIterator[Dict[str, Any]]:
+        """Stream rows from DBHandler.iter_comparisons, stepping the generator on the DB executor"""
+        rows = self.db.iter_comparisons(limit=limit)
+        step = self._timed("iter_comparisons.next", next, rows, _END)
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                row = await loop.run_in_executor(self._get_executor(), step)
+                if row is _END:
+                    break
+                yield row
+        finally:
+            # Stop paging even if the client disconnects mid-stream
+            await loop.run_in_executor(self._get_executor(), rows.close)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -1,13 +1,146 @@
-from functools import lru_cache
-from app.models import ComparisonResult
-
-
-class ComparisonCache:
-    def __init__(self, max_size=100):
-        self.cache = lru_cache(maxsize=max_size)
-
-    def get(self, comparison_id: int) -> ComparisonResult:
-        return self.cache.get(comparison_id)
-
-    def set(self, result: ComparisonResult):
-        self.cache[result.id] = result
\ No newline at end of file
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+import hashlib
+import threading
+import time
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough in-memory footprint of a cached value, dominated by its strings"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(v) for v in value)
+    if hasattr(value, "model_dump"):
+        return _estimate_size(value.model_dump())
+    return 16
+
+
+class ComparisonCache:
+    """Bounded TTL cache for comparison reads (single rows, latest and history pages).
+
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    evicted once either ``max_entries`` or ``max_bytes`` is exceeded. Keys are
+    tuples whose first element is the entry kind, so writers can drop a whole
+    kind at once (e.g. every history page after an insert).
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return  # never cache something that would flush everything else
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *kinds: str):
+        """Drop every entry of the given kinds, or everything when no kind is given"""
+        with self._lock:
+            for key in [k for k in self._entries if not kinds or k[0] in kinds]:
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+
+class DiffCache:
+    """Two-tier cache of diff results keyed by both bodies' SHA-256 and the compare mode.
+
+    Recent entries live in an in-memory LRU of ``max_size`` entries; everything
+    is also persisted in the ``diff_cache`` table through ``store`` (a
+    DBHandler) so repeats survive restarts.
+    """
+
+    def __init__(self, store, max_size: int = 100):
+        self.store = store
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tibco_hash: str, python_hash: str, mode: str) -> str:
+        """Key from the bodies' SHA-256 digests (the same hashes the blob store uses)"""
+        h = hashlib.sha256()
+        for part in (mode, tibco_hash, python_hash):
+            encoded = part.encode("utf-8")
+            h.update(len(encoded).to_bytes(8, "big"))
+            h.update(encoded)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        cached = self.store.get_cached_diff(key)
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, cached)
+        return cached
+
+    def set(self, key: str, diff: str, metrics: dict):
+        with self._lock:
+            self._remember(key, (diff, metrics))
+        self.store.save_cached_diff(key, diff, metrics)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remember(self, key: str, value: Tuple[str, dict]):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
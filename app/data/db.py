@@ -1,34 +1,248 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from functools import lru_cache
+from typing import BinaryIO, List, Dict, Any, Iterator, Optional, Tuple
+import gzip
+import hashlib
 import json
 import logging
+import queue
+import threading
+import zlib
 from pathlib import Path
-from app.config import settings
+from app.config import line_diff_options, settings
+from app.core.comparator import ResponseComparator
+from app.data.cache import ComparisonCache
 from app.models import ComparisonResult
 
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
 # Setting up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Comparison rows reference response bodies stored once in response_blobs;
+# the blob hashes are only joined on, never returned to API clients
+_SELECT_COMPARISONS = """
+    SELECT c.id, c.tibco_response, c.python_response, c.differences, c.metrics, c.created_at,
+           c.tibco_url, c.python_url, c.has_differences,
+           tb.encoding AS tibco_encoding, tb.data AS tibco_blob,
+           pb.encoding AS python_encoding, pb.data AS python_blob,
+           db.encoding AS diff_encoding, db.data AS diff_blob
+    FROM comparisons c
+    LEFT JOIN response_blobs tb ON tb.hash = c.tibco_hash
+    LEFT JOIN response_blobs pb ON pb.hash = c.python_hash
+    LEFT JOIN response_blobs db ON db.hash = c.diff_hash
+"""
+
+_MIGRATION_BATCH_SIZE = 100
+
+# Recorded in PRAGMA user_version once migrate() has brought a file up to date;
+# bump it whenever _init_db gains a table, column, index or data migration
+SCHEMA_VERSION = 1
+
+# Indexes for the listing/filter/retention queries and for the orphan-blob sweep
+_INDEXES = {
+    "idx_comparisons_created_at": "comparisons(created_at)",
+    "idx_comparisons_tibco_url": "comparisons(tibco_url, id)",
+    "idx_comparisons_python_url": "comparisons(python_url, id)",
+    "idx_comparisons_has_differences": "comparisons(has_differences, id)",
+    "idx_comparisons_tibco_hash": "comparisons(tibco_hash)",
+    "idx_comparisons_python_hash": "comparisons(python_hash)",
+    "idx_comparisons_diff_hash": "comparisons(diff_hash)",
+    "idx_comparisons_view_hash": "comparisons(view_hash)",
+    "idx_diff_cache_diff_hash": "diff_cache(diff_hash)",
+    "idx_diff_cache_view_hash": "diff_cache(view_hash)",
+    "idx_diff_cache_created_at": "diff_cache(created_at)",
+}
+_FILE_CHUNK_BYTES = 1024 * 1024
+
+# Shared by every DBHandler so an insert through any handler invalidates cached reads
+comparison_cache = ComparisonCache(
+    max_entries=settings.READ_CACHE_MAX_ENTRIES,
+    max_bytes=settings.READ_CACHE_MAX_BYTES,
+    ttl=settings.READ_CACHE_TTL
+)
+
 
 class DatabaseError(Exception):
     """Raised when a database operation fails"""
     pass
 
 
+def _codec() -> str:
+    codec = settings.BLOB_COMPRESSION
+    if codec == "zstd" and zstandard is None:
+        logger.warning("BLOB_COMPRESSION=zstd but 'zstandard' is not installed, using zlib")
+        return "zlib"
+    return codec if codec in ("zstd", "zlib") else "none"
+
+
+def _compressobj(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=settings.BLOB_COMPRESSION_LEVEL).compressobj()
+    return zlib.compressobj(min(settings.BLOB_COMPRESSION_LEVEL, 9))
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    """Compress with the configured codec, returning (encoding, payload)"""
+    codec = _codec()
+    if codec == "none":
+        return "none", data
+    compressor = _compressobj(codec)
+    return codec, compressor.compress(data) + compressor.flush()
+
+
+def _compress_file(fileobj: BinaryIO) -> Tuple[str, bytes]:
+    """Compress a file chunk by chunk; only the compressed output is held in memory"""
+    fileobj.seek(0)
+    codec = _codec()
+    if codec == "none":
+        return "none", fileobj.read()
+    compressor = _compressobj(codec)
+    parts = [compressor.compress(chunk) for chunk in iter(lambda: fileobj.read(_FILE_CHUNK_BYTES), b"")]
+    parts.append(compressor.flush())
+    return codec, b"".join(parts)
+
+
+def _decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "zlib":
+        return zlib.decompress(data)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise DatabaseError("Blob is zstd-compressed but 'zstandard' is not installed")
+        # decompressobj also handles streamed frames that carry no content size
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return bytes(data)
+
+
+class ConnectionPool:
+    """Fixed-size pool of long-lived SQLite connections for one database file.
+
+    Connections are opened lazily up to ``size``, configured once with the
+    pragmas from Settings (WAL, synchronous, cache_size, mmap_size,
+    busy_timeout), and handed out to one thread at a time.
+    """
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # each connection is only used by the thread holding it
+            timeout=settings.DB_BUSY_TIMEOUT_MS / 1000
+        )
+        conn.row_factory = sqlite3.Row
+        # Must precede journal_mode, which writes the header of a new file. Only
+        # takes effect on a new database; existing files are converted by
+        # convert_auto_vacuum
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute(f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size={-int(settings.DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=settings.DB_POOL_TIMEOUT)
+        except queue.Empty:
+            raise DatabaseError(f"No database connection available after {settings.DB_POOL_TIMEOUT}s")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commits on success, rolls back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.row_factory = sqlite3.Row
+            self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._opened = 0
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path, settings.DB_POOL_SIZE)
+        return _pools[db_path]
+
+
+def close_pools():
+    """Close every pooled connection (called from the app shutdown hook)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
 class DBHandler:
     def __init__(self):
         try:
             self.db_path = str(Path(settings.DB_PATH).absolute())
+            self.cache = comparison_cache
+            self.pool = get_pool(self.db_path)
             Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-            self._init_db()
             logger.info(f"Database handler initialized at {self.db_path}")
         except Exception as e:
             logger.error(f"Failed to initialize DBHandler: {e}")
             raise DatabaseError("Database initialization failed.") from e
 
+    def migrate(self):
+        """Create or upgrade the schema; run once at app startup, not per handler.
+
+        A no-op when the file's PRAGMA user_version already is SCHEMA_VERSION.
+        """
+        try:
+            with self._get_connection() as conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Database error while reading the schema version: %s", e)
+            raise DatabaseError("Error while setting up the database.") from e
+        if version >= SCHEMA_VERSION:
+            logger.info(f"Database schema is up to date (version {version})")
+            return
+        self._init_db()
+
     def _init_db(self):
         try:
             with self._get_connection() as conn:
@@ -42,29 +256,357 @@ class DBHandler:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
                 """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_blobs (
+                    hash TEXT PRIMARY KEY,
+                    encoding TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL
+                )
+                """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS diff_cache (
+                    key TEXT PRIMARY KEY,
+                    differences TEXT NOT NULL DEFAULT '',
+                    diff_hash TEXT,
+                    metrics TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS view_chunks (
+                    view_hash TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    chunk INTEGER NOT NULL,
+                    encoding TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (view_hash, kind, chunk)
+                )
+                """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS upstream_validators (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body_hash TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """)
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(comparisons)")}
+                for column in ("tibco_hash", "python_hash", "diff_hash", "view_hash", "tibco_url", "python_url"):
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE comparisons ADD COLUMN {column} TEXT")
+                if "has_differences" not in columns:
+                    conn.execute("ALTER TABLE comparisons ADD COLUMN has_differences INTEGER")
+                diff_cache_columns = {row[1] for row in conn.execute("PRAGMA table_info(diff_cache)")}
+                for column in ("diff_hash", "view_hash"):
+                    if column not in diff_cache_columns:
+                        conn.execute(f"ALTER TABLE diff_cache ADD COLUMN {column} TEXT")
+                self._migrate_inline_responses(conn)
+                self._migrate_inline_diffs(conn)
+                self._backfill_has_differences(conn)
+                for name, target in _INDEXES.items():
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
                 conn.commit()
-                logger.info("Database tables initialized")
+                logger.info(f"Database tables initialized (schema version {SCHEMA_VERSION})")
         except sqlite3.Error as e:
-            logger.error("Database error during initialization:", e)
+            logger.error("Database error during initialization: %s", e)
             raise DatabaseError("Error while setting up the database.") from e
 
-    def _get_connection(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+    def _migrate_inline_responses(self, conn: sqlite3.Connection):
+        """Move response bodies of pre-blob-store rows into response_blobs"""
+        migrated = 0
+        while True:
+            rows = conn.execute(
+                """SELECT id, tibco_response, python_response FROM comparisons
+                WHERE tibco_hash IS NULL OR python_hash IS NULL LIMIT ?""",
+                (_MIGRATION_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+            for row_id, tibco_resp, python_resp in rows:
+                conn.execute(
+                    """UPDATE comparisons
+                    SET tibco_hash = ?, python_hash = ?, tibco_response = '', python_response = ''
+                    WHERE id = ?""",
+                    (self._store_blob(conn, tibco_resp or ""), self._store_blob(conn, python_resp or ""), row_id)
+                )
+            conn.commit()
+            migrated += len(rows)
+        if migrated:
+            logger.info(f"Moved response bodies of {migrated} comparisons into the blob store")
+
+    def _migrate_inline_diffs(self, conn: sqlite3.Connection):
+        """Move plain-text diffs of older comparisons and diff_cache rows into the compressed blob store"""
+        migrated = 0
+        for table, pk in (("comparisons", "id"), ("diff_cache", "key")):
+            while True:
+                rows = conn.execute(
+                    f"SELECT {pk}, differences FROM {table} WHERE diff_hash IS NULL LIMIT ?",
+                    (_MIGRATION_BATCH_SIZE,)
+                ).fetchall()
+                if not rows:
+                    break
+                for row_key, diff in rows:
+                    conn.execute(
+                        f"UPDATE {table} SET diff_hash = ?, differences = '' WHERE {pk} = ?",
+                        (self._store_blob(conn, diff or ""), row_key)
+                    )
+                conn.commit()
+                migrated += len(rows)
+        if migrated:
+            logger.info(f"Compressed {migrated} stored diffs into the blob store")
+
+    def _backfill_has_differences(self, conn: sqlite3.Connection):
+        """Derive has_differences for rows saved before the column existed"""
+        filled = 0
+        while True:
+            rows = conn.execute(
+                """SELECT c.id, c.metrics, b.encoding, b.data FROM comparisons c
+                LEFT JOIN response_blobs b ON b.hash = c.diff_hash
+                WHERE c.has_differences IS NULL LIMIT ?""",
+                (_MIGRATION_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+            for row_id, metrics, encoding, data in rows:
+                if data is not None:
+                    flag = ResponseComparator.has_differences(_decompress(encoding, data).decode("utf-8", "replace"))
+                else:
+                    flag = bool(json.loads(metrics or "{}").get("changed_lines"))
+                conn.execute("UPDATE comparisons SET has_differences = ? WHERE id = ?", (int(flag), row_id))
+            conn.commit()
+            filled += len(rows)
+        if filled:
+            logger.info(f"Backfilled has_differences for {filled} comparisons")
+
+    @staticmethod
+    def _store_blob(conn: sqlite3.Connection, body: str) -> str:
+        """Store a response body once, keyed by its SHA-256, and return the hash"""
+        raw = body.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        # A no-op UPDATE rather than a SELECT: it opens the write transaction, so the
+        # orphan-blob sweep in prune_comparisons cannot remove the blob before the
+        # row referencing it is inserted
+        exists = conn.execute("UPDATE response_blobs SET size = size WHERE hash = ?", (digest,)).rowcount
+        if not exists:
+            encoding, data = _compress(raw)
+            conn.execute(
+                "INSERT OR IGNORE INTO response_blobs (hash, encoding, size, data) VALUES (?, ?, ?, ?)",
+                (digest, encoding, len(raw), data)
+            )
+        return digest
+
+    @staticmethod
+    def _store_blob_file(conn: sqlite3.Connection, fileobj: BinaryIO) -> str:
+        """Streaming variant of _store_blob for bodies too large to hold in memory"""
+        fileobj.seek(0)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in iter(lambda: fileobj.read(_FILE_CHUNK_BYTES), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        key = digest.hexdigest()
+        exists = conn.execute("UPDATE response_blobs SET size = size WHERE hash = ?", (key,)).rowcount
+        if not exists:
+            encoding, data = _compress_file(fileobj)
+            conn.execute(
+                "INSERT OR IGNORE INTO response_blobs (hash, encoding, size, data) VALUES (?, ?, ?, ?)",
+                (key, encoding, size, data)
+            )
+        return key
+
+    def _insert_comparison(self, conn: sqlite3.Connection, tibco_resp: str, python_resp: str,
+                           diff: str, metrics: Dict[str, Any],
+                           tibco_url: Optional[str] = None, python_url: Optional[str] = None,
+                           view: Optional[Dict[str, Any]] = None, diff_key: Optional[str] = None) -> int:
+        tibco_hash = self._store_blob(conn, tibco_resp)
+        python_hash = self._store_blob(conn, python_resp)
+        view_hash = None
+        if view is not None:
+            view_hash, _ = self._store_view(conn, view)
+            if diff_key is not None:
+                conn.execute("UPDATE diff_cache SET view_hash = ? WHERE key = ?", (view_hash, diff_key))
+        elif diff_key is not None:
+            # Diff-cache hit: share the view built with the cached diff (same bodies, mode and rules)
+            cached = conn.execute("SELECT view_hash FROM diff_cache WHERE key = ?", (diff_key,)).fetchone()
+            view_hash = cached[0] if cached else None
+        cursor = conn.execute(
+            """INSERT INTO comparisons 
+            (tibco_response, python_response, tibco_hash, python_hash, diff_hash, view_hash, differences, metrics,
+             tibco_url, python_url, has_differences) 
+            VALUES ('', '', ?, ?, ?, ?, '', ?, ?, ?, ?)""",
+            (tibco_hash, python_hash, self._store_blob(conn, diff), view_hash, json.dumps(metrics),
+             tibco_url, python_url, int(ResponseComparator.has_differences(diff)))
+        )
+        return cursor.lastrowid
+
+    def _get_connection(self):
+        """Borrow a pooled connection; use as ``with self._get_connection() as conn:``"""
+        return self.pool.connection()
+
+    @staticmethod
+    def _store_view(conn: sqlite3.Connection, view: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Store a view as a small index blob plus compressed line chunks; returns (hash, stored index).
+
+        Unified and side-by-side rows go to view_chunks in chunks of
+        VIEW_CHUNK_LINES rows, so a page is served by decompressing only the
+        chunks it covers. The stored index carries a digest of the rows, so
+        two views are only shared when their lines are identical.
+        """
+        chunk_lines = max(1, settings.VIEW_CHUNK_LINES)
+        digest = hashlib.sha256()
+        chunks = []
+        for kind in ("unified", "split"):
+            rows = ResponseComparator.view_rows(view, kind)
+            for number, start in enumerate(range(0, len(rows), chunk_lines)):
+                raw = json.dumps(rows[start:start + chunk_lines]).encode("utf-8")
+                digest.update(f"{kind}:{len(raw)}:".encode("utf-8"))
+                digest.update(raw)
+                chunks.append((kind, number, raw))
+        stored = {"index": ResponseComparator.view_index(view), "chunk_lines": chunk_lines,
+                  "rows_digest": digest.hexdigest()}
+        view_hash = DBHandler._store_blob(conn, json.dumps(stored))
+        if conn.execute("SELECT 1 FROM view_chunks WHERE view_hash = ? LIMIT 1", (view_hash,)).fetchone() is None:
+            for kind, number, raw in chunks:
+                encoding, data = _compress(raw)
+                conn.execute(
+                    "INSERT OR IGNORE INTO view_chunks (view_hash, kind, chunk, encoding, data) VALUES (?, ?, ?, ?, ?)",
+                    (view_hash, kind, number, encoding, data)
+                )
+        return view_hash, stored
+
+    def _view_meta(self, comparison_id: int) -> Optional[Dict[str, Any]]:
+        """Stored view index of a comparison and the hash its line chunks are filed under.
+
+        Rows saved without a view (older rows, streamed large comparisons) get
+        it built on first request and stored; bodies above VIEW_MAX_BODY_BYTES
+        are not realigned and the view is built from the stored unified diff.
+        Views stored whole by earlier versions are re-stored in chunks.
+        Returns None when the comparison does not exist.
+        """
+        cached = self.cache.get(("view", comparison_id, "meta"))
+        if cached is not None:
+            return cached
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    """SELECT c.tibco_hash, c.python_hash, c.diff_hash, c.view_hash, vb.encoding, vb.data,
+                           COALESCE(tb.size, 0) + COALESCE(pb.size, 0) AS body_bytes
+                    FROM comparisons c
+                    LEFT JOIN response_blobs vb ON vb.hash = c.view_hash
+                    LEFT JOIN response_blobs tb ON tb.hash = c.tibco_hash
+                    LEFT JOIN response_blobs pb ON pb.hash = c.python_hash
+                    WHERE c.id = ?""",
+                    (comparison_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                view_hash = row["view_hash"]
+                stored = json.loads(_decompress(row["encoding"], row["data"])) if row["data"] is not None else None
+                if stored is None:
+                    view_hash, stored = self._store_view(conn, self._build_view(conn, row))
+                    conn.execute("UPDATE comparisons SET view_hash = ? WHERE id = ?", (view_hash, comparison_id))
+                    logger.info(f"Built diff view for comparison {comparison_id}")
+                elif "chunk_lines" not in stored:
+                    legacy_hash = view_hash
+                    view_hash, stored = self._store_view(conn, stored)
+                    for table in ("comparisons", "diff_cache"):
+                        conn.execute(f"UPDATE {table} SET view_hash = ? WHERE view_hash = ?", (view_hash, legacy_hash))
+                    logger.info(f"Re-stored diff view of comparison {comparison_id} in chunks")
+                meta = {**stored, "hash": view_hash}
+                self.cache.set(("view", comparison_id, "meta"), meta)
+                return meta
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.error(f"Database error while fetching view of comparison {comparison_id}: {e}")
+            raise DatabaseError(f"Failed to fetch comparison view: {str(e)}")
+
+    def _view_rows(self, meta: Dict[str, Any], kind: str, offset: int, limit: int) -> List[list]:
+        """Rows ``offset`` to ``offset + limit`` of a stored view, read from the chunks that cover them"""
+        total = meta["index"]["split_rows" if kind == "split" else "unified_lines"]
+        end = min(offset + limit, total)
+        if offset >= end:
+            return []
+        chunk_lines = meta["chunk_lines"]
+        first = offset // chunk_lines
+        try:
+            with self._get_connection() as conn:
+                chunks = conn.execute(
+                    """SELECT encoding, data FROM view_chunks
+                    WHERE view_hash = ? AND kind = ? AND chunk BETWEEN ? AND ? ORDER BY chunk""",
+                    (meta["hash"], kind, first, (end - 1) // chunk_lines)
+                ).fetchall()
+            rows = [row for chunk in chunks for row in json.loads(_decompress(chunk[0], chunk[1]))]
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.error(f"Database error while reading view lines: {e}")
+            raise DatabaseError(f"Failed to read view lines: {str(e)}")
+        start = offset - first * chunk_lines
+        return rows[start:start + end - offset]
+
+    def get_view(self, comparison_id: int) -> Optional[Dict[str, Any]]:
+        """Precomputed diff view of a comparison (see ResponseComparator.build_view); None if it does not exist"""
+        cached = self.cache.get(("view", comparison_id))
+        if cached is not None:
+            return cached
+        meta = self._view_meta(comparison_id)
+        if meta is None:
+            return None
+        index = meta["index"]
+        view = ResponseComparator.view_from_rows(
+            index,
+            self._view_rows(meta, "unified", 0, index["unified_lines"]),
+            self._view_rows(meta, "split", 0, index["split_rows"])
+        )
+        self.cache.set(("view", comparison_id), view)
+        return view
+
+    def get_view_index(self, comparison_id: int) -> Optional[Dict[str, Any]]:
+        """View without its lines (see ResponseComparator.view_index); None if the comparison does not exist"""
+        meta = self._view_meta(comparison_id)
+        return meta["index"] if meta is not None else None
+
+    def get_view_lines(self, comparison_id: int, kind: str, offset: int, limit: int) -> Optional[Dict[str, Any]]:
+        """One page of unified or side-by-side view lines; None if the comparison does not exist.
+
+        Only the stored chunks covering the page are decompressed, so the cost
+        does not grow with the size of the whole diff.
+        """
+        meta = self._view_meta(comparison_id)
+        if meta is None:
+            return None
+        kind = "split" if kind == "split" else "unified"
+        return {"kind": kind, "offset": offset, "limit": limit,
+                "total": meta["index"]["split_rows" if kind == "split" else "unified_lines"],
+                "lines": self._view_rows(meta, kind, offset, limit)}
+
+    def _build_view(self, conn: sqlite3.Connection, row: sqlite3.Row) -> Dict[str, Any]:
+        def blob(blob_hash: Optional[str]) -> str:
+            found = conn.execute(
+                "SELECT encoding, data FROM response_blobs WHERE hash = ?", (blob_hash,)
+            ).fetchone()
+            return _decompress(found[0], found[1]).decode("utf-8", errors="replace") if found else ""
+
+        if row["body_bytes"] > settings.VIEW_MAX_BODY_BYTES:
+            return ResponseComparator.build_view_from_unified(blob(row["diff_hash"]))
+        return ResponseComparator.build_view(blob(row["tibco_hash"]), blob(row["python_hash"]), **line_diff_options())
 
-    @lru_cache(maxsize=128)
     def get_comparison(self, comparison_id: int) -> Optional[ComparisonResult]:
+        cached = self.cache.get(("comparison", comparison_id))
+        if cached is not None:
+            return cached
         try:
             with self._get_connection() as conn:
-                conn.row_factory = sqlite3.Row
                 cursor = conn.execute(
-                    "SELECT * FROM comparisons WHERE id = ?",
+                    _SELECT_COMPARISONS + " WHERE c.id = ?",
                     (comparison_id,)
                 )
                 result = cursor.fetchone()
                 if result:
-                    result_dict = dict(zip(result.keys(), result))
-                    result_dict['metrics'] = json.loads(result_dict['metrics'])
-                    return ComparisonResult(**result_dict)
+                    result_dict = self._row_to_dict(result)
+                    comparison = ComparisonResult(**result_dict)
+                    self.cache.set(("comparison", comparison_id), comparison)
+                    return comparison
                 return None
         except sqlite3.Error as e:
             logger.error(f"Database error while fetching comparison {comparison_id}: {e}")
@@ -73,13 +615,89 @@ class DBHandler:
             logger.error(f"Error decoding metrics JSON: {e}")
             return None
 
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        row_dict = dict(zip(row.keys(), row))
+
+        # Rehydrate response bodies and diffs from the blob store
+        for prefix, column in (('tibco', 'tibco_response'), ('python', 'python_response'), ('diff', 'differences')):
+            encoding = row_dict.pop(f'{prefix}_encoding', None)
+            blob = row_dict.pop(f'{prefix}_blob', None)
+            if blob is not None:
+                row_dict[column] = _decompress(encoding, blob).decode('utf-8', errors='replace')
+        row_dict.pop('diff_hash', None)
+        if row_dict.get('has_differences') is not None:
+            row_dict['has_differences'] = bool(row_dict['has_differences'])
+
+        # Handle metrics JSON
+        try:
+            row_dict['metrics'] = json.loads(row_dict['metrics'])
+        except (json.JSONDecodeError, TypeError):
+            logger.warning("Invalid metrics JSON, using empty dict")
+            row_dict['metrics'] = {}
+
+        # Handle datetime conversion
+        if 'created_at' in row_dict and isinstance(row_dict['created_at'], str):
+            try:
+                row_dict['created_at'] = datetime.fromisoformat(row_dict['created_at'])
+            except ValueError:
+                pass
+
+        return row_dict
+
+    def _invalidate_listings(self):
+        """New rows change every listing; rows fetched by id stay valid"""
+        self.cache.invalidate("history", "summaries")
+
+    def get_comparison_summaries(self, limit: int = 20, before_id: Optional[int] = None,
+                                 has_differences: Optional[bool] = None, url: Optional[str] = None,
+                                 since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Lightweight history page (id, created_at, metrics) using keyset pagination on id.
+
+        Optionally filtered by has_differences, by target URL (either side) and
+        by creation time; each filter is backed by an index.
+        """
+        cache_key = ("summaries", limit, before_id, has_differences, url, since)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        conditions, params = [], []
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        if has_differences is not None:
+            conditions.append("has_differences = ?")
+            params.append(int(has_differences))
+        if url is not None:
+            conditions.append("(tibco_url = ? OR python_url = ?)")
+            params.extend([url, url])
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since.strftime("%Y-%m-%d %H:%M:%S"))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    f"""SELECT id, created_at, metrics, tibco_url, python_url, has_differences
+                    FROM comparisons {where} ORDER BY id DESC LIMIT ?""",
+                    (*params, limit)
+                )
+                results = [self._row_to_dict(row) for row in cursor]
+                self.cache.set(cache_key, results)
+                return list(results)
+        except sqlite3.Error as e:
+            logger.error(f"Database error fetching comparison summaries: {str(e)}")
+            raise DatabaseError(f"Failed to fetch comparison summaries: {str(e)}")
+
     def get_comparisons(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Retrieve comparison history with robust row conversion"""
+        cached = self.cache.get(("history", limit))
+        if cached is not None:
+            return list(cached)
         try:
             with self._get_connection() as conn:
-                conn.row_factory = sqlite3.Row
                 cursor = conn.execute(
-                    "SELECT * FROM comparisons ORDER BY id DESC LIMIT ?",
+                    _SELECT_COMPARISONS + " ORDER BY c.id DESC LIMIT ?",
                     (limit,)
                 )
                 rows = cursor.fetchall()
@@ -87,83 +705,303 @@ class DBHandler:
                 results = []
                 for row in rows:
                     try:
-                        row_dict = dict(zip(row.keys(), row))
-
-                        # Handle metrics JSON
-                        try:
-                            row_dict['metrics'] = json.loads(row_dict['metrics'])
-                        except (json.JSONDecodeError, TypeError):
-                            logger.warning("Invalid metrics JSON, using empty dict")
-                            row_dict['metrics'] = {}
-
-                        # Handle datetime conversion
-                        if 'created_at' in row_dict and isinstance(row_dict['created_at'], str):
-                            try:
-                                row_dict['created_at'] = datetime.fromisoformat(row_dict['created_at'])
-                            except ValueError:
-                                pass
-
-                        results.append(row_dict)
-
+                        results.append(self._row_to_dict(row))
                     except Exception as row_error:
                         logger.warning(f"Skipping malformed row: {str(row_error)}")
                         continue
 
                 logger.info(f"Retrieved {len(results)} comparisons from DB")
-                return results
+                self.cache.set(("history", limit), results)
+                return list(results)
 
         except sqlite3.Error as e:
             logger.error(f"Database error fetching comparisons: {str(e)}")
             raise DatabaseError(f"Failed to fetch comparisons: {str(e)}")
 
-    def save_comparison(
-            self,
-            tibco_resp: str,
-            python_resp: str,
-            diff: str,
-            metrics: Dict[str, Any]
-    ) -> bool:
+    def iter_comparisons(self, limit: int = 10) -> Iterator[Dict[str, Any]]:
+        """Yield comparison history newest first, one row at a time.
+
+        Used for streaming responses. Rows are read in keyset-paged batches of
+        DB_STREAM_PAGE_SIZE and the pooled connection is returned after each
+        page, so a slow client holds neither a connection nor more than one
+        page of rows.
+        """
+        page_size = max(1, settings.DB_STREAM_PAGE_SIZE)
+        before_id = None
+        remaining = limit
+        while remaining > 0:
+            size = min(page_size, remaining)
+            try:
+                with self._get_connection() as conn:
+                    if before_id is None:
+                        rows = conn.execute(
+                            _SELECT_COMPARISONS + " ORDER BY c.id DESC LIMIT ?", (size,)
+                        ).fetchall()
+                    else:
+                        rows = conn.execute(
+                            _SELECT_COMPARISONS + " WHERE c.id < ? ORDER BY c.id DESC LIMIT ?",
+                            (before_id, size)
+                        ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Database error streaming comparisons: {str(e)}")
+                raise DatabaseError(f"Failed to stream comparisons: {str(e)}")
+
+            for row in rows:
+                try:
+                    yield self._row_to_dict(row)
+                except Exception as row_error:
+                    logger.warning(f"Skipping malformed row: {str(row_error)}")
+            if len(rows) < size:
+                return
+            before_id = rows[-1]["id"]
+            remaining -= size
+
+    def save_comparisons(self, results: List[Dict[str, Any]]) -> List[int]:
+        """Insert many comparison results in a single transaction, returning their row IDs"""
+        if not results:
+            return []
+        try:
+            with self._get_connection() as conn:
+                ids = []
+                for result in results:
+                    ids.append(self._insert_comparison(
+                        conn,
+                        result.get("tibco_response", ""),
+                        result.get("python_response", ""),
+                        result.get("differences", ""),
+                        result.get("metrics", {}),
+                        result.get("tibco_url"),
+                        result.get("python_url"),
+                        result.get("view"),
+                        result.get("diff_key")
+                    ))
+                conn.commit()
+                self._invalidate_listings()
+                logger.info(f"Saved {len(ids)} comparisons in one batch")
+                return ids
+        except sqlite3.Error as e:
+            logger.error(f"Database error during batch save: {e}")
+            raise DatabaseError(f"Failed to save comparisons: {str(e)}")
+
+    def save_streamed_comparison(self, tibco_file: BinaryIO, python_file: BinaryIO,
+                                 diff_file: BinaryIO, metrics: Dict[str, Any],
+                                 tibco_url: Optional[str] = None, python_url: Optional[str] = None) -> int:
+        """Save a large comparison whose bodies and diff live in files; returns the row id"""
         try:
-            changed_lines = self._extract_changed_lines(diff)
             with self._get_connection() as conn:
                 cursor = conn.execute(
                     """INSERT INTO comparisons 
-                    (tibco_response, python_response, differences, metrics) 
-                    VALUES (?, ?, ?, ?)""",
-                    (tibco_resp, python_resp, changed_lines, json.dumps(metrics))
+                    (tibco_response, python_response, tibco_hash, python_hash, diff_hash, differences, metrics,
+                     tibco_url, python_url, has_differences) 
+                    VALUES ('', '', ?, ?, ?, '', ?, ?, ?, ?)""",
+                    (self._store_blob_file(conn, tibco_file), self._store_blob_file(conn, python_file),
+                     self._store_blob_file(conn, diff_file), json.dumps(metrics),
+                     tibco_url, python_url, int(metrics.get("changed_lines", 0) > 0))
                 )
                 conn.commit()
-                if cursor.rowcount == 1:
-                    logger.info(f"Saved comparison with ID: {cursor.lastrowid}")
-                    return True
-                logger.warning("No rows affected while saving.")
-                return False
+                self._invalidate_listings()
+                logger.info(f"Saved streamed comparison with ID: {cursor.lastrowid}")
+                return cursor.lastrowid
         except sqlite3.Error as e:
-            logger.error(f"Database error during save: {e}")
-            return False
-        except (TypeError, ValueError, json.JSONDecodeError) as e:
-            logger.error(f"Error with metrics JSON encoding: {e}")
-            return False
-
-    def insert(self, result: dict) -> bool:
-        """Wrapper for insert, used by endpoint"""
-        try:
-            return self.save_comparison(
-                tibco_resp=result.get("tibco_response", ""),
-                python_resp=result.get("python_response", ""),
-                diff=result.get("differences", ""),
-                metrics=result.get("metrics", {})
-            )
-        except Exception as e:
-            logger.error(f"Insert failed: {e}")
-            return False
+            logger.error(f"Database error during streamed save: {e}")
+            raise DatabaseError(f"Failed to save comparison: {str(e)}")
+
+    def get_blob(self, blob_hash: str) -> Optional[str]:
+        """Response body stored under the given hash, or None if it is not (or no longer) stored"""
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT encoding, data FROM response_blobs WHERE hash = ?", (blob_hash,)
+                ).fetchone()
+                return _decompress(row[0], row[1]).decode("utf-8") if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Database error reading blob {blob_hash}: {e}")
+            return None
+
+    def get_validator(self, url: str) -> Optional[Dict[str, Any]]:
+        """Last ETag / Last-Modified / body hash seen for an upstream URL"""
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT etag, last_modified, body_hash FROM upstream_validators WHERE url = ?", (url,)
+                ).fetchone()
+                return dict(zip(row.keys(), row)) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Database error reading validators for {url}: {e}")
+            return None
+
+    def save_validator(self, url: str, etag: Optional[str], last_modified: Optional[str], body_hash: str):
+        try:
+            with self._get_connection() as conn:
+                conn.execute(
+                    """INSERT OR REPLACE INTO upstream_validators (url, etag, last_modified, body_hash, updated_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)""",
+                    (url, etag, last_modified, body_hash)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Database error saving validators for {url}: {e}")
+
+    def get_cached_diff(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Look up a previously computed diff by cache key"""
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    """SELECT d.differences, d.metrics, b.encoding, b.data FROM diff_cache d
+                    LEFT JOIN response_blobs b ON b.hash = d.diff_hash WHERE d.key = ?""",
+                    (key,)
+                ).fetchone()
+                if row:
+                    diff = row[0] if row[3] is None else _decompress(row[2], row[3]).decode("utf-8")
+                    return diff, json.loads(row[1])
+                return None
+        except (sqlite3.Error, json.JSONDecodeError, DatabaseError) as e:
+            logger.error(f"Database error reading diff cache: {e}")
+            return None
+
+    def save_cached_diff(self, key: str, diff: str, metrics: Dict[str, Any]) -> None:
+        try:
+            with self._get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO diff_cache (key, diff_hash, metrics) VALUES (?, ?, ?)",
+                    (key, self._store_blob(conn, diff), json.dumps(metrics))
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Database error writing diff cache: {e}")
+
+    def prune_comparisons(self, max_age_days: Optional[float] = None, max_rows: Optional[int] = None,
+                          archive_path: Optional[Path] = None,
+                          diff_cache_max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """Apply the retention policy and compact the database file.
+
+        Deletes comparisons older than ``max_age_days`` or beyond the newest
+        ``max_rows`` in batches, appending them to ``archive_path`` (gzipped
+        NDJSON) first when given. diff_cache rows are pruned by the same age
+        and row limits and beyond ``diff_cache_max_bytes`` of stored diffs and
+        views, and upstream validators by age. Then drops blobs nothing
+        references any more and returns the freed pages to the filesystem with
+        an incremental VACUUM.
+        """
+        summary = {"pruned": 0, "archived": 0, "diff_cache_removed": 0, "validators_removed": 0,
+                   "blobs_removed": 0, "view_chunks_removed": 0, "pages_freed": 0}
+        age = f"-{max_age_days} days" if max_age_days else None
+        try:
+            with self._get_connection() as conn:
+                conditions, params = [], []
+                if age:
+                    conditions.append("created_at < datetime('now', ?)")
+                    params.append(age)
+                if max_rows:
+                    boundary = conn.execute(
+                        "SELECT id FROM comparisons ORDER BY id DESC LIMIT 1 OFFSET ?", (max_rows - 1,)
+                    ).fetchone()
+                    if boundary:
+                        conditions.append("id < ?")
+                        params.append(boundary[0])
+
+                while conditions:
+                    ids = [row[0] for row in conn.execute(
+                        f"SELECT id FROM comparisons WHERE {' OR '.join(conditions)} ORDER BY id LIMIT ?",
+                        (*params, settings.RETENTION_BATCH_SIZE)
+                    )]
+                    if not ids:
+                        break
+                    marks = ",".join("?" * len(ids))
+                    if archive_path is not None:
+                        rows = conn.execute(_SELECT_COMPARISONS + f" WHERE c.id IN ({marks})", ids).fetchall()
+                        with gzip.open(archive_path, "at", encoding="utf-8") as archive:
+                            for row in rows:
+                                archive.write(json.dumps(self._row_to_dict(row), default=str) + "\n")
+                        summary["archived"] += len(rows)
+                    conn.execute(f"DELETE FROM comparisons WHERE id IN ({marks})", ids)
+                    conn.commit()
+                    summary["pruned"] += len(ids)
+
+                if age:
+                    summary["diff_cache_removed"] += conn.execute(
+                        "DELETE FROM diff_cache WHERE created_at < datetime('now', ?)", (age,)
+                    ).rowcount
+                    summary["validators_removed"] = conn.execute(
+                        "DELETE FROM upstream_validators WHERE updated_at < datetime('now', ?)", (age,)
+                    ).rowcount
+                if max_rows:
+                    summary["diff_cache_removed"] += conn.execute("""
+                        DELETE FROM diff_cache WHERE rowid NOT IN
+                            (SELECT rowid FROM diff_cache ORDER BY created_at DESC, rowid DESC LIMIT ?)
+                    """, (max_rows,)).rowcount
+                if diff_cache_max_bytes:
+                    # Keep the newest entries whose diffs and views fit in the byte budget
+                    summary["diff_cache_removed"] += conn.execute("""
+                        DELETE FROM diff_cache WHERE rowid IN (
+                            SELECT rowid FROM (
+                                SELECT d.rowid AS rowid, SUM(
+                                    LENGTH(d.differences) + COALESCE(LENGTH(db.data), 0)
+                                    + COALESCE(LENGTH(vb.data), 0)
+                                ) OVER (ORDER BY d.created_at DESC, d.rowid DESC) AS total
+                                FROM diff_cache d
+                                LEFT JOIN response_blobs db ON db.hash = d.diff_hash
+                                LEFT JOIN response_blobs vb ON vb.hash = d.view_hash
+                            ) WHERE total > ?
+                        )
+                    """, (diff_cache_max_bytes,)).rowcount
+                summary["blobs_removed"] = conn.execute("""
+                    DELETE FROM response_blobs WHERE
+                        NOT EXISTS (SELECT 1 FROM comparisons WHERE tibco_hash = response_blobs.hash)
+                        AND NOT EXISTS (SELECT 1 FROM comparisons WHERE python_hash = response_blobs.hash)
+                        AND NOT EXISTS (SELECT 1 FROM comparisons WHERE diff_hash = response_blobs.hash)
+                        AND NOT EXISTS (SELECT 1 FROM comparisons WHERE view_hash = response_blobs.hash)
+                        AND NOT EXISTS (SELECT 1 FROM diff_cache WHERE diff_hash = response_blobs.hash)
+                        AND NOT EXISTS (SELECT 1 FROM diff_cache WHERE view_hash = response_blobs.hash)
+                        AND NOT EXISTS (SELECT 1 FROM upstream_validators WHERE body_hash = response_blobs.hash)
+                """).rowcount
+                summary["view_chunks_removed"] = conn.execute("""
+                    DELETE FROM view_chunks
+                    WHERE NOT EXISTS (SELECT 1 FROM response_blobs WHERE hash = view_chunks.view_hash)
+                """).rowcount
+                conn.commit()
+                summary["pages_freed"] = self._incremental_vacuum(conn)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Retention run failed: {e}")
+            raise DatabaseError(f"Failed to prune comparisons: {str(e)}")
+        finally:
+            if summary["pruned"]:
+                self.cache.invalidate("history", "summaries", "comparison", "view")
+
+        logger.info(f"Retention: {summary}")
+        return summary
 
     @staticmethod
-    def _extract_changed_lines(diff: str) -> str:
-        return "\n".join(
-            line for line in diff.splitlines()
-            if line.startswith(('+', '-'))
-        )
+    def _incremental_vacuum(conn: sqlite3.Connection) -> int:
+        """Release free pages; returns how many were given back to the filesystem.
+
+        Releases nothing on files without auto_vacuum=INCREMENTAL until
+        convert_auto_vacuum has run.
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+            return 0
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(settings.RETENTION_VACUUM_PAGES)})").fetchall()
+        return free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def convert_auto_vacuum(self) -> Dict[str, Any]:
+        """Switch a file created without it to auto_vacuum=INCREMENTAL.
+
+        auto_vacuum can only be changed on an existing file by a full VACUUM,
+        which rewrites the whole file under the write lock, so this is an
+        explicit maintenance step rather than part of the retention runs.
+        """
+        try:
+            with self._get_connection() as conn:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                    return {"converted": False, "pages_freed": 0}
+                free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                logger.warning("Converting the database to auto_vacuum=INCREMENTAL with a full VACUUM")
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                return {"converted": True, "pages_freed": free_before}
+        except sqlite3.Error as e:
+            logger.error(f"auto_vacuum conversion failed: {e}")
+            raise DatabaseError(f"Failed to convert the database: {str(e)}")
 
     def get_recent_comparisons(self, limit: int = 5) -> List[Dict[str, Any]]:
         return self.get_comparisons(limit)
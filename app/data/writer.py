@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.data.db import DBHandler
+
+logger = logging.getLogger(__name__)
+
+
+class ComparisonWriter:
+    """Single background writer that persists comparisons in batched transactions.
+
+    Callers ``await submit(result)`` and get back the DB-assigned row id. The
+    writer task drains the queue, waiting up to ``flush_interval`` for more
+    results, and commits up to ``max_batch`` rows per transaction on its own
+    thread, so concurrent comparisons share one commit (and one fsync). When
+    a batch fails it is retried row by row, so only the offending rows fail.
+    """
+
+    def __init__(self, db: DBHandler, max_batch: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        self.db = db
+        self.max_batch = max_batch or settings.DB_WRITER_MAX_BATCH
+        self.flush_interval = settings.DB_WRITER_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+        logger.info("Comparison writer started")
+
+    async def stop(self):
+        """Flush everything queued, then stop the writer task"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Comparison writer stopped")
+
+    async def submit(self, result: Dict[str, Any]) -> int:
+        """Queue a comparison result for saving and wait for its row id"""
+        self.start()
+        future = self._loop.create_future()
+        await self._queue.put((result, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                try:
+                    if timeout <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        try:
+            try:
+                ids = await self._save(batch)
+                logger.info(f"Writer committed {len(ids)} comparisons")
+            except Exception as e:
+                if len(batch) == 1:
+                    raise
+                # One bad row rolls back the whole transaction; retry row by row so only it fails
+                logger.warning(f"Writer failed to save {len(batch)} comparisons, retrying one by one: {e}")
+                for entry in batch:
+                    try:
+                        await self._save([entry])
+                    except Exception as row_error:
+                        self._fail([entry], row_error)
+        except Exception as e:
+            self._fail(batch, e)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _save(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> List[int]:
+        ids = await self._loop.run_in_executor(
+            self._executor, self.db.save_comparisons, [result for result, _ in batch]
+        )
+        for (_, future), row_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(row_id)
+        return ids
+
+    @staticmethod
+    def _fail(batch: List[Tuple[Dict[str, Any], asyncio.Future]], error: Exception):
+        logger.error(f"Writer failed to save {len(batch)} comparisons: {error}")
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
@@ -1,13 +1,57 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 from uuid import UUID, uuid4
 
 
 class ComparisonResult(BaseModel):
-    id: UUID = Field(default_factory=uuid4)  # Auto-generate UUID if not provided
+    id: Union[int, UUID] = Field(default_factory=uuid4)  # DB row id once stored, else a generated UUID
     tibco_response: str
     python_response: str
     differences: str
     metrics: dict
+    tibco_url: Optional[str] = None
+    python_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)  # Auto-set current time
+    cache_hit: bool = False  # True when the diff was served from the diff cache
+    view: Optional[dict] = Field(None, exclude=True)  # precomputed diff view; stored, served by /view only
+    diff_key: Optional[str] = Field(None, exclude=True)  # diff-cache entry the diff (and its view) belongs to
+
+
+class UrlPair(BaseModel):
+    tibco_url: str
+    python_url: str
+
+
+class BatchComparisonRequest(BaseModel):
+    """Either explicit URL pairs, or URL templates expanded with each order number"""
+    pairs: List[UrlPair] = Field(default_factory=list)
+    tibco_url_template: Optional[str] = None  # e.g. "http://host/orderInquiry/v6?orderNo={order_no}"
+    python_url_template: Optional[str] = None
+    order_numbers: List[str] = Field(default_factory=list)
+    compare_type: Literal["xml", "json"] = "xml"
+    concurrency: Optional[int] = Field(None, gt=0)  # capped at BATCH_MAX_CONCURRENCY
+
+    @model_validator(mode="after")
+    def check_source(self):
+        templated = self.tibco_url_template or self.python_url_template or self.order_numbers
+        if self.pairs and templated:
+            raise ValueError("Provide either 'pairs' or URL templates with 'order_numbers', not both")
+        if not self.pairs:
+            if not (self.tibco_url_template and self.python_url_template and self.order_numbers):
+                raise ValueError(
+                    "Provide 'pairs', or both URL templates together with 'order_numbers'"
+                )
+            for template in (self.tibco_url_template, self.python_url_template):
+                if "{order_no}" not in template:
+                    raise ValueError("URL templates must contain an '{order_no}' placeholder")
+        return self
+
+    def url_pairs(self) -> List[tuple]:
+        if self.pairs:
+            return [(p.tibco_url, p.python_url) for p in self.pairs]
+        return [
+            (self.tibco_url_template.replace("{order_no}", order_no),
+             self.python_url_template.replace("{order_no}", order_no))
+            for order_no in self.order_numbers
+        ]
@@ -1,17 +1,250 @@
-import httpx
-from app.config import settings
-
-
-async def fetch_data(url: str) -> str:
-    timeout = httpx.Timeout(10.0, connect=30.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.text
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP status error while fetching {url}: {e}")
-            raise ValueError(f"Failed to fetch {url}: {str(e)}")
-        except httpx.RequestError as e:
-            print(f"Request error while fetching {url}: {e}")
-            raise ValueError(f"Connection error for {url}: {str(e)}")
+import asyncio
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar, Union
+
+import httpx
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Long-lived client shared by every fetch so connections (and TLS sessions)
+# are reused across comparisons instead of being re-established per call.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _accept_encoding() -> str:
+    """HTTP_ACCEPT_ENCODING minus codings httpx cannot decode here (br needs brotli/brotlicffi)"""
+    codings = [c.strip() for c in settings.HTTP_ACCEPT_ENCODING.split(",") if c.strip()]
+    if "br" in codings:
+        try:
+            import brotli  # noqa: F401
+        except ImportError:
+            try:
+                import brotlicffi  # noqa: F401
+            except ImportError:
+                codings.remove("br")
+    return ", ".join(codings) or "identity"
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.HTTP_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=http2,
+        headers={"Accept-Encoding": _accept_encoding()},
+    )
+
+
+async def start_client() -> httpx.AsyncClient:
+    """Open the shared upstream client (called from the app startup hook)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+        logger.info("Shared HTTP client started")
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared upstream client (called from the app shutdown hook)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Shared HTTP client closed")
+    _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily when used outside the app lifecycle"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+class CircuitOpenError(ValueError):
+    """Raised without contacting the upstream while its circuit breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """Per-host breaker: opens after BREAKER_FAILURE_THRESHOLD consecutive failures.
+
+    While open, requests fail immediately. After BREAKER_RESET_TIMEOUT one
+    trial request is let through (half-open); its outcome closes or re-opens
+    the breaker.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= settings.BREAKER_RESET_TIMEOUT:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"Circuit for {self.host} closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= settings.BREAKER_FAILURE_THRESHOLD:
+            if self.state != "open":
+                logger.warning(f"Circuit for {self.host} opened after {self.consecutive_failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def status(self) -> dict:
+        retry_in = None
+        if self.state == "open":
+            retry_in = max(settings.BREAKER_RESET_TIMEOUT - (time.monotonic() - self.opened_at), 0.0)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in": retry_in,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    host = httpx.URL(url).netloc.decode("ascii")
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(host)
+    return _breakers[host]
+
+
+def breaker_states() -> Dict[str, dict]:
+    return {host: breaker.status() for host, breaker in _breakers.items()}
+
+
+async def _request_with_retries(url: str, send: Callable[[], Awaitable[T]]) -> T:
+    """Run ``send`` (one GET attempt) with retries, exponential backoff and the host's breaker.
+
+    Connection errors, 5xx and 429 are retried and count against the breaker;
+    other 4xx responses fail immediately.
+    """
+    breaker = get_breaker(url)
+    attempts = settings.HTTP_RETRIES + 1
+    for attempt in range(attempts):
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {breaker.host}, not fetching {url}")
+        try:
+            result = await send()
+        except httpx.HTTPStatusError as e:
+            code = e.response.status_code
+            if code < 500 and code != 429:
+                breaker.record_success()  # the host answered; the request itself is bad
+                print(f"HTTP status error while fetching {url}: {e}")
+                raise ValueError(f"Failed to fetch {url}: {str(e)}")
+            breaker.record_failure()
+            error = ValueError(f"Failed to fetch {url}: {str(e)}")
+        except httpx.RequestError as e:
+            breaker.record_failure()
+            error = ValueError(f"Connection error for {url}: {str(e)}")
+        except BaseException:
+            breaker.trial_in_flight = False
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        if attempt + 1 < attempts:
+            delay = min(settings.HTTP_RETRY_BACKOFF * 2 ** attempt, settings.HTTP_RETRY_BACKOFF_MAX)
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning(f"Attempt {attempt + 1}/{attempts} for {url} failed ({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    logger.error(f"Giving up on {url} after {attempts} attempt(s): {error}")
+    raise error
+
+
+def _log_transfer(url: str, response: httpx.Response):
+    encoding = response.headers.get("Content-Encoding", "identity")
+    logger.debug(f"{url}: {response.num_bytes_downloaded} bytes on the wire ({encoding}), "
+                 f"{len(response.content)} decoded")
+
+
+async def fetch_data(url: str) -> str:
+    client = get_client()
+
+    async def send() -> str:
+        response = await client.get(url)
+        response.raise_for_status()
+        _log_transfer(url, response)
+        return response.text
+
+    return await _request_with_retries(url, send)
+
+
+async def fetch_conditional(url: str, etag: Optional[str] = None,
+                            last_modified: Optional[str] = None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """GET with If-None-Match / If-Modified-Since.
+
+    Returns ``(body, etag, last_modified)``; body is None when the upstream
+    answered 304 Not Modified.
+    """
+    client = get_client()
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    async def send() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        response = await client.get(url, headers=headers)
+        if response.status_code == 304 and headers:
+            return None, response.headers.get("ETag", etag), response.headers.get("Last-Modified", last_modified)
+        response.raise_for_status()
+        _log_transfer(url, response)
+        return response.text, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+    return await _request_with_retries(url, send)
+
+
+async def fetch_to_file(url: str, path: Union[str, Path]):
+    """Stream a (possibly very large) response body into the file at ``path``.
+
+    Each retry rewrites the file from the start; the caller removes it.
+    """
+    client = get_client()
+
+    async def send():
+        with open(path, "wb") as target:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(settings.STREAM_CHUNK_BYTES):
+                    target.write(chunk)
+
+    await _request_with_retries(url, send)
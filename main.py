@@ -1,15 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api.endpoints import router  # Import the unified router
-from app.data.db import DBHandler
+from app.api.compression import StreamingGZipMiddleware
+from app.api.endpoints import router, engine, scheduler, db_handler, retention  # Import the unified router
+from app.config import settings
+from app.data.db import close_pools
+from app.services.fetcher import start_client, close_client
 
-app = FastAPI()
 
-@app.on_event("startup")
-async def startup_event():
-    DBHandler()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_handler.db.migrate()
+    if settings.RETENTION_CONVERT_AUTO_VACUUM:
+        db_handler.db.convert_auto_vacuum()
+    await start_client()
+    if settings.SCHEDULER_ENABLED:
+        scheduler.start()
+    if settings.RETENTION_ENABLED:
+        retention.start()
+    yield
+    await retention.stop()
+    await scheduler.stop()
+    await engine.writer.stop()
+    engine.close()
+    db_handler.close()
+    await close_client()
+    close_pools()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(StreamingGZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE,
+                   compresslevel=settings.GZIP_COMPRESS_LEVEL)
 
 app.include_router(router)  # This now includes /api/v1/compare, /api/v1/history, etc.
 
 @app.get("/")
 def read_root():
-    return {"message": "API Comparison Service"}
\ No newline at end of file
+    return {"message": "API Comparison Service"}
@@ -1,6 +1,7 @@
-import uvicorn
-from main import app
-from app.config import settings
-
-if __name__ == "__main__":
-    uvicorn.run(app, host=settings.APP_HOST, port=settings.APP_PORT, reload=settings.APP_RELOAD)
+import uvicorn
+from app.config import settings
+
+if __name__ == "__main__":
+    # Import string, not the app object: spawned diff workers re-import this
+    # module and must not build the app (reload also requires it)
+    uvicorn.run("main:app", host=settings.APP_HOST, port=settings.APP_PORT, reload=settings.APP_RELOAD)
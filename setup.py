@@ -7,6 +7,7 @@ setup(
     package_dir={"": "."},              # Root package directory
     install_requires=[
         'fastapi',
+        'starlette>=0.46.0,<0.49.0',
         'uvicorn',
         'streamlit',
         'httpx',
@@ -0,0 +1,109 @@
+import pytest
+
+from app.data import cache as cache_module
+from app.data.cache import ComparisonCache, DiffCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+class _DictStore:
+    """Stand-in for the diff_cache table"""
+
+    def __init__(self):
+        self.rows = {}
+        self.reads = 0
+
+    def get_cached_diff(self, key):
+        self.reads += 1
+        return self.rows.get(key)
+
+    def save_cached_diff(self, key, diff, metrics):
+        self.rows[key] = (diff, metrics)
+
+
+def test_diff_cache_key_depends_on_mode_and_both_hashes():
+    key = DiffCache.make_key("a", "b", "xml:text")
+    assert key == DiffCache.make_key("a", "b", "xml:text")
+    assert key != DiffCache.make_key("b", "a", "xml:text")
+    assert key != DiffCache.make_key("a", "b", "xml:tree")
+    assert DiffCache.make_key("ab", "c", "m") != DiffCache.make_key("a", "bc", "m")
+
+
+def test_diff_cache_evicts_least_recently_used_and_falls_back_to_the_store():
+    store = _DictStore()
+    cache = DiffCache(store, max_size=2)
+    cache.set("k1", "d1", {"n": 1})
+    cache.set("k2", "d2", {"n": 2})
+    assert cache.get("k1") == ("d1", {"n": 1})  # k2 is now the least recently used
+    cache.set("k3", "d3", {"n": 3})
+
+    assert list(cache._entries) == ["k1", "k3"]
+    assert store.reads == 0
+    assert cache.get("k2") == ("d2", {"n": 2})  # evicted from memory, still persisted
+    assert store.reads == 1
+    assert list(cache._entries) == ["k3", "k2"]
+
+    assert cache.get("missing") is None
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1}
+
+
+def test_comparison_cache_evicts_by_entry_count(clock):
+    cache = ComparisonCache(max_entries=2, ttl=60)
+    cache.set(("row", 1), "a")
+    cache.set(("row", 2), "b")
+    cache.get(("row", 1))
+    cache.set(("row", 3), "c")
+
+    assert cache.get(("row", 2)) is None
+    assert cache.get(("row", 1)) == "a" and cache.get(("row", 3)) == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_comparison_cache_entries_expire_after_ttl(clock):
+    cache = ComparisonCache(ttl=30)
+    cache.set(("latest",), "a")
+    clock.now += 30
+    assert cache.get(("latest",)) == "a"
+    clock.now += 0.1
+    assert cache.get(("latest",)) is None
+    assert cache.stats() == {"entries": 0, "bytes": 0, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_comparison_cache_evicts_by_bytes_and_skips_oversized_values(clock):
+    cache = ComparisonCache(max_bytes=10, ttl=60)
+    cache.set(("row", 1), "x" * 4)
+    cache.set(("row", 2), "x" * 4)
+    cache.set(("row", 1), "y" * 5)  # replacing an entry releases its old size
+    assert cache.stats()["bytes"] == 9
+
+    cache.set(("row", 3), "x" * 3)
+    assert cache.get(("row", 2)) is None
+    assert cache.stats()["bytes"] == 8
+
+    cache.set(("row", 4), "x" * 11)
+    assert cache.get(("row", 4)) is None
+    assert cache.get(("row", 1)) == "yyyyy"
+
+
+def test_comparison_cache_invalidates_by_kind(clock):
+    cache = ComparisonCache()
+    cache.set(("history", 10, 0), [1])
+    cache.set(("history", 20, 0), [2])
+    cache.set(("row", 1), "a")
+    cache.invalidate("history")
+    assert cache.stats()["entries"] == 1 and cache.get(("row", 1)) == "a"
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,212 @@
+import copy
+import io
+import json
+import random
+import re
+
+import pytest
+
+from app.core.comparator import ResponseComparator, _bounded_lines
+from tests.test_services import SAMPLE_JSON
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+),(\d+) \+(\d+),(\d+) @@$')
+
+
+def _apply_patch(source, patch):
+    """Apply a unified diff from compare_xml_stream to a list of source lines"""
+    out, pos = [], 0
+    for line in patch.splitlines():
+        if line.startswith(('---', '+++')):
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header:
+            start = int(header.group(1)) - 1
+            assert start >= pos
+            out.extend(source[pos:start])
+            pos = start
+        elif line.startswith(' '):
+            assert source[pos] == line[1:]
+            out.append(source[pos])
+            pos += 1
+        elif line.startswith('-'):
+            assert source[pos] == line[1:]
+            pos += 1
+        else:
+            assert line.startswith('+')
+            out.append(line[1:])
+    return out + source[pos:]
+
+
+def _stream_diff(tibco: bytes, python: bytes, **kwargs):
+    out = []
+    metrics = ResponseComparator.compare_xml_stream(io.BytesIO(tibco), io.BytesIO(python), out.append, **kwargs)
+    return ''.join(out), metrics
+
+
+def _pieces(body: bytes, max_line_bytes: int):
+    return [line.decode().rstrip('\n') for line in _bounded_lines(io.BytesIO(body), max_line_bytes)]
+
+
+def _document(lines):
+    return ('\n'.join(lines) + '\n').encode()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_streamed_patch_reproduces_target(seed):
+    rng = random.Random(seed)
+    tibco = [f"<f{i}>{rng.randint(0, 5)}</f{i}>" for i in range(rng.randint(0, 400))]
+    python = list(tibco)
+    for _ in range(rng.randint(0, 20)):
+        op = rng.random()
+        position = rng.randint(0, len(python))
+        if op < 0.4 and python:
+            python[min(position, len(python) - 1)] = f"<x>{rng.random()}</x>"
+        elif op < 0.7:
+            python.insert(position, f"<new>{rng.random()}</new>")
+        elif python:
+            del python[min(position, len(python) - 1)]
+
+    patch, metrics = _stream_diff(_document(tibco), _document(python), window=16, max_hunk_lines=25)
+    assert _apply_patch(tibco, patch) == python
+    assert metrics["tibco_lines"] == len(tibco)
+    assert metrics["python_lines"] == len(python)
+    assert (patch == '') == (tibco == python)
+
+
+def test_single_line_document_is_split_into_elements():
+    items = ''.join(f'<item id="{i}"><qty>{i % 7}</qty></item>' for i in range(20000))
+    tibco = f'<?xml version="1.0"?><order>{items}</order>'.encode()
+    python = tibco.replace(b'<item id="500"><qty>3</qty>', b'<item id="500"><qty>4</qty>') \
+                  .replace(b'<item id="15000">', b'<extra/><item id="15000">')
+    assert len(tibco) > 500_000
+
+    patch, metrics = _stream_diff(tibco, python, window=64, max_line_bytes=4096)
+    assert max(len(line) for line in patch.splitlines()) <= 4096 + 1
+    assert metrics["changed_lines"] == 3
+    assert _apply_patch(_pieces(tibco, 4096), patch) == _pieces(python, 4096)
+    assert ''.join(_pieces(python, 4096)).encode() == python
+
+
+def test_bounded_lines_cuts_text_without_element_breaks():
+    body = b'<a>' + b'x' * 10000 + b'</a>\n<b/>\n'
+    pieces = list(_bounded_lines(io.BytesIO(body), 1024))
+    assert b''.join(pieces) == body
+    assert max(len(piece) for piece in pieces) <= 1024
+    assert pieces[-1] == b'<b/>\n'
+
+
+def test_bounded_lines_keeps_short_lines_intact():
+    body = b'<a>\n  <b>1</b>\n</a>'
+    assert list(_bounded_lines(io.BytesIO(body), 1024)) == [b'<a>\n', b'  <b>1</b>\n', b'</a>']
+
+
+def _order(lines: int):
+    """SAMPLE_JSON with ``lines`` order lines, each with its own skuId"""
+    order = copy.deepcopy(SAMPLE_JSON)
+    node = order["shipments"][0]["notShipped"][0]["nodes"][0]
+    template = node["items"][0]
+    node["items"] = [{**copy.deepcopy(template), "id": str(i), "skuId": str(79901450 + i), "quantity": i % 3 + 1}
+                     for i in range(lines)]
+    return order, node
+
+
+def _sorted_report(report: str):
+    return {kind: sorted(entries) if isinstance(entries, list) else entries
+            for kind, entries in json.loads(report).items()}
+
+
+def _assert_matches_deepdiff(tibco, python):
+    keyed, keyed_metrics = ResponseComparator.compare_json(tibco, python)
+    reference, reference_metrics = ResponseComparator.compare_json(tibco, python, mode='deepdiff')
+    assert _sorted_report(keyed) == _sorted_report(reference)
+    assert keyed_metrics == reference_metrics
+
+
+def test_keyed_diff_matches_deepdiff_on_scalar_changes():
+    tibco, _ = _order(40)
+    python, node = _order(40)
+    node["items"].reverse()
+    node["items"][3]["quantity"] = 9
+    node["items"][10]["linePrice"] = 150.5
+    node["items"][20]["lineTax"] = 0.0
+    node["items"][25]["catalogInfo"]["product"]["displayName"] = "Renamed"
+    python["status"] = "Shipped"
+    python["orderDate"] = str(python["orderDate"])
+    del python["messageNo"]
+    python["carrier"] = "UPS"
+    _assert_matches_deepdiff(tibco, python)
+
+
+def test_keyed_diff_matches_deepdiff_on_added_and_removed_lines():
+    tibco, _ = _order(30)
+    python, node = _order(30)
+    del node["items"][7]
+    del node["items"][12]
+    _assert_matches_deepdiff(tibco, python)
+    _assert_matches_deepdiff(python, tibco)
+
+
+@pytest.mark.parametrize("tibco, python", [
+    ({"a": [1, 2, 3]}, {"a": [3, 1, 2]}),
+    ({"a": [1, 2]}, {"a": [1, 3]}),
+    ({"a": [{"x": 1}, {"x": 2}]}, {"a": [{"x": 2}, {"x": 1}]}),
+    ({"a": {"b": [1, {"c": True}]}}, {"a": {"b": [{"c": False}, 1]}}),
+    ({"a": None}, {"a": 0}),
+    ({}, {"a": [1]}),
+])
+def test_keyed_diff_matches_deepdiff_on_small_documents(tibco, python):
+    _assert_matches_deepdiff(tibco, python)
+
+
+def _tree_records(tibco: str, python: str, key_attributes=("id",)):
+    records, _ = ResponseComparator.compare_xml_tree(tibco, python, key_attributes)
+    return {(r["change"], r["path"]): (r["tibco"], r["python"]) for r in json.loads(records)}
+
+
+def test_tree_diff_labels_positions_with_the_original_sibling_index():
+    tibco = "<r><i>a</i><i>b</i><i>c</i></r>"
+    python = "<r><i>a</i><i>x</i><i>c</i></r>"
+    assert _tree_records(tibco, python) == {("changed", "/r/i[2]"): ("b", "x")}
+
+    removed = _tree_records("<r><i>a</i><i>b</i><i>c</i></r>", "<r><i>a</i><i>c</i></r>")
+    assert list(removed) == [("removed", "/r/i[2]")]
+
+
+def test_tree_diff_reports_mixed_content_tail_changes():
+    tibco = "<p>Hello <b>world</b> and all</p>"
+    python = "<p>Hello <b>world</b> and nobody</p>"
+    assert _tree_records(tibco, python) == {
+        ("changed", "/p/b/following-sibling::text()[1]"): ("and all", "and nobody")
+    }
+
+
+def test_tree_diff_reports_namespace_changes():
+    tibco = '<r xmlns:a="urn:one"><a:item>1</a:item></r>'
+    python = '<r xmlns:a="urn:two"><a:item>1</a:item></r>'
+    records = _tree_records(tibco, python)
+    assert set(records) == {("removed", "/r/item"), ("added", "/r/item")}
+    assert "urn:one" in records[("removed", "/r/item")][0]
+    assert "urn:two" in records[("added", "/r/item")][1]
+
+
+def test_tree_diff_pairs_duplicate_keys_in_order():
+    tibco = '<r><i id="1">a</i><i id="1">b</i><i id="2">c</i></r>'
+    python = '<r><i id="2">c</i><i id="1">a</i><i id="1">x</i></r>'
+    assert _tree_records(tibco, python) == {("changed", '/r/i[@id="1"][2]'): ("b", "x")}
+
+
+def test_tree_diff_skips_identical_documents():
+    body = '<r><i id="1">a</i><i>b</i> tail</r>'
+    records, metrics = ResponseComparator.compare_xml_tree(body, body)
+    assert json.loads(records) == []
+    assert metrics["changed_nodes"] == 0
+
+
+def test_compare_xml_with_view_matches_separate_passes():
+    tibco = "<r>\n  <a>1</a>\n  <b>2</b>\n  <c>3</c>\n</r>\n"
+    python = "<r>\n  <a>1</a>\n  <b>5</b>\n  <d>4</d>\n  <c>3</c>\n</r>\n"
+    diff, metrics, view = ResponseComparator.compare_xml_with_view(tibco, python)
+
+    assert (diff, metrics) == ResponseComparator.compare_xml(tibco, python)
+    assert view == ResponseComparator.build_view(tibco, python)
+    assert view["changes"]
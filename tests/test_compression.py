@@ -0,0 +1,56 @@
+import asyncio
+import zlib
+
+from starlette.responses import PlainTextResponse, StreamingResponse
+
+from app.api.compression import StreamingGZipMiddleware
+
+CHUNKS = [b'{"index": %d, "status": "ok"}\n' % i for i in range(5)]
+
+
+async def _stream():
+    for chunk in CHUNKS:
+        yield chunk
+        await asyncio.sleep(0)
+
+
+def _call(app, accept_encoding="gzip"):
+    scope = {"type": "http", "method": "GET", "path": "/", "raw_path": b"/", "query_string": b"",
+             "headers": [(b"accept-encoding", accept_encoding.encode())], "http_version": "1.1"}
+    messages = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(StreamingGZipMiddleware(app, minimum_size=10)(scope, receive, send))
+    headers = dict(messages[0]["headers"])
+    return headers, [m["body"] for m in messages[1:]]
+
+
+def test_streamed_response_is_gzipped_and_flushed_per_chunk():
+    headers, bodies = _call(StreamingResponse(_stream(), media_type="application/x-ndjson"))
+    assert headers[b"content-encoding"] == b"gzip"
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Each chunk is decodable as soon as its message arrives, not only at the end of the stream
+    for chunk, body in zip(CHUNKS, bodies):
+        assert decompressor.decompress(body) == chunk
+    assert decompressor.decompress(b"".join(bodies[len(CHUNKS):])) + decompressor.flush() == b""
+    assert decompressor.eof
+
+
+def test_plain_responses_are_compressed_whole_or_passed_through():
+    body = b"x" * 100
+    headers, bodies = _call(PlainTextResponse(body))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert zlib.decompress(b"".join(bodies), 16 + zlib.MAX_WBITS) == body
+
+    headers, bodies = _call(PlainTextResponse(body), accept_encoding="identity")
+    assert b"content-encoding" not in headers
+    assert b"".join(bodies) == body
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from app.config import settings
+from app.core.comparator import ResponseComparator
+from app.core.retention import RetentionJob
+from app.data import db as db_module
+from app.data.async_db import AsyncDBHandler
+from app.data.db import SCHEMA_VERSION, DatabaseError, DBHandler, close_pools
+from app.data.writer import ComparisonWriter
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_PATH", str(tmp_path / "comparisons.db"))
+    db_module.comparison_cache.invalidate()
+    handler = DBHandler()
+    handler.migrate()
+    yield handler
+    close_pools()
+    db_module.comparison_cache.invalidate()
+
+
+def _result(i: int):
+    return {
+        "tibco_response": f"<a>{i}</a>",
+        "python_response": f"<a>{i + i % 2}</a>",
+        "differences": f"diff {i}" if i % 2 else "",
+        "metrics": {"changes": i % 2},
+        "tibco_url": f"http://tibco/{i}",
+        "python_url": f"http://python/{i}",
+    }
+
+
+def test_migrate_records_the_schema_version_and_runs_once(db, monkeypatch):
+    with db.pool.connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+    def fail():
+        raise AssertionError("migrations ran again")
+
+    monkeypatch.setattr(DBHandler, "_init_db", fail)
+    db.migrate()
+    DBHandler()  # constructing a handler never migrates
+
+
+def test_iter_comparisons_pages_newest_first(db, monkeypatch):
+    monkeypatch.setattr(settings, "DB_STREAM_PAGE_SIZE", 3)
+    ids = db.save_comparisons([_result(i) for i in range(10)])
+
+    assert [row["id"] for row in db.iter_comparisons(limit=7)] == ids[::-1][:7]
+    assert [row["id"] for row in db.iter_comparisons(limit=50)] == ids[::-1]
+    assert list(db.iter_comparisons(limit=0)) == []
+
+
+def test_history_rows_hide_internal_columns(db):
+    db.save_comparisons([_result(1)])
+    public = {"id", "tibco_response", "python_response", "differences", "metrics", "created_at",
+              "tibco_url", "python_url", "has_differences"}
+
+    row = db.get_comparisons(limit=1)[0]
+    assert set(row) == public
+    assert (row["tibco_response"], row["python_response"]) == ("<a>1</a>", "<a>2</a>")
+    assert set(next(db.iter_comparisons(limit=1))) == public
+
+
+def test_iter_comparisons_returns_connection_between_pages(db, monkeypatch):
+    monkeypatch.setattr(settings, "DB_STREAM_PAGE_SIZE", 2)
+    db.save_comparisons([_result(i) for i in range(5)])
+
+    rows = db.iter_comparisons(limit=5)
+    next(rows)
+    assert db.pool._idle.qsize() == db.pool._opened
+    rows.close()
+
+
+def test_prune_trims_diff_cache_and_validators(db):
+    for i in range(6):
+        db.save_cached_diff(f"key{i}", "x" * 1000 + str(i), {"changes": i})
+    db.save_validator("http://old", '"e1"', None, "hash-old")
+    db.save_validator("http://new", '"e2"', None, "hash-new")
+    with db._get_connection() as conn:
+        conn.execute("UPDATE upstream_validators SET updated_at = datetime('now', '-40 days') "
+                     "WHERE url = 'http://old'")
+        conn.execute("UPDATE diff_cache SET created_at = datetime('now', '-1 hour') WHERE key = 'key0'")
+
+    summary = db.prune_comparisons(max_age_days=30, max_rows=4)
+    assert summary["validators_removed"] == 1
+    assert summary["diff_cache_removed"] == 2
+    assert db.get_validator("http://old") is None
+    assert db.get_validator("http://new") is not None
+    assert db.get_cached_diff("key0") is None and db.get_cached_diff("key5") is not None
+
+    summary = db.prune_comparisons(diff_cache_max_bytes=1)
+    assert summary["diff_cache_removed"] == 4
+    assert summary["blobs_removed"] == 4
+
+
+def _view_bodies():
+    tibco = "\n".join(f"<f{i}>{i}</f{i}>" for i in range(300))
+    python = tibco.replace("<f10>10", "<f10>x").replace("<f150>150", "<f150>y") + "\n<extra/>"
+    return tibco, python
+
+
+def _diff(tibco: str, python: str) -> str:
+    return ResponseComparator.compare_xml(tibco, python)[0]
+
+
+def test_view_lines_are_read_from_chunks(db, monkeypatch):
+    monkeypatch.setattr(settings, "VIEW_CHUNK_LINES", 7)
+    tibco, python = _view_bodies()
+    view = ResponseComparator.build_view(tibco, python)
+    [comparison_id] = db.save_comparisons([{**_result(0), "tibco_response": tibco, "python_response": python,
+                                            "differences": _diff(tibco, python), "view": view}])
+
+    assert db.get_view_index(comparison_id) == ResponseComparator.view_index(view)
+    for kind in ("unified", "split"):
+        for offset, limit in ((0, 5), (3, 20), (6, 1), (280, 50), (10000, 5)):
+            assert db.get_view_lines(comparison_id, kind, offset, limit) == \
+                ResponseComparator.view_lines(view, kind, offset, limit)
+    db_module.comparison_cache.invalidate()
+    assert db.get_view(comparison_id) == view
+
+
+def test_views_are_built_or_rechunked_on_first_read(db):
+    tibco, python = _view_bodies()
+    view = ResponseComparator.build_view(tibco, python)
+    ids = db.save_comparisons([{**_result(0), "tibco_response": tibco, "python_response": python,
+                                "differences": _diff(tibco, python)}] * 2)
+    with db._get_connection() as conn:
+        # A view stored whole, as earlier versions did
+        conn.execute("UPDATE comparisons SET view_hash = ? WHERE id = ?",
+                     (db._store_blob(conn, json.dumps(view)), ids[1]))
+
+    for comparison_id in ids:
+        assert db.get_view_lines(comparison_id, "split", 0, 1000) == \
+            ResponseComparator.view_lines(view, "split", 0, 1000)
+    assert db.get_view(ids[0]) == db.get_view(ids[1]) == view
+    assert db.get_view_index(12345) is None
+
+
+def test_retention_runs_on_the_db_executor_without_converting_old_files(tmp_path, monkeypatch):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE placeholder (x)")  # an existing file keeps auto_vacuum=NONE
+    legacy.close()
+    monkeypatch.setattr(settings, "DB_PATH", str(path))
+    monkeypatch.setattr(settings, "RETENTION_MAX_AGE_DAYS", 0)
+    handler = AsyncDBHandler(DBHandler())
+    handler.db.migrate()
+    job = RetentionJob(handler)
+
+    def auto_vacuum():
+        with handler.db.pool.connection() as conn:
+            return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    try:
+        result = asyncio.run(job.run_once())
+        assert result["pages_freed"] == 0
+        assert auto_vacuum() == 0
+        assert handler.stats.snapshot()["prune_comparisons"]["calls"] == 1
+
+        assert asyncio.run(job.convert_auto_vacuum())["converted"] is True
+        assert auto_vacuum() == 2
+        assert asyncio.run(job.convert_auto_vacuum())["converted"] is False
+    finally:
+        handler.close()
+        close_pools()
+
+
+class _RecordingDB:
+    """Wraps a DBHandler and records the size of every save_comparisons batch.
+
+    A batch fails when ``fail`` is set or it contains a row ``reject`` matches.
+    """
+
+    def __init__(self, db, fail: bool = False, reject=None):
+        self.db = db
+        self.fail = fail
+        self.reject = reject
+        self.batches = []
+
+    def save_comparisons(self, results):
+        self.batches.append(len(results))
+        if self.fail or (self.reject and any(self.reject(r) for r in results)):
+            raise DatabaseError("disk full")
+        return self.db.save_comparisons(results)
+
+
+def test_writer_batches_concurrent_submits_and_returns_their_ids(db):
+    store = _RecordingDB(db)
+
+    async def run():
+        writer = ComparisonWriter(store, max_batch=4, flush_interval=0.5)
+        ids = await asyncio.gather(*(writer.submit(_result(i)) for i in range(10)))
+        await writer.stop()
+        return ids
+
+    ids = asyncio.run(run())
+    assert store.batches == [4, 4, 2]
+    assert len(set(ids)) == 10
+    for i, row_id in enumerate(ids):
+        assert db.get_comparison(row_id).tibco_url == f"http://tibco/{i}"
+
+
+def test_writer_failure_fails_the_batch_and_keeps_running(db):
+    store = _RecordingDB(db, fail=True)
+
+    async def run():
+        writer = ComparisonWriter(store, max_batch=10, flush_interval=0.05)
+        outcomes = await asyncio.gather(*(writer.submit(_result(i)) for i in range(3)), return_exceptions=True)
+        store.fail = False
+        row_id = await writer.submit(_result(3))
+        await writer.stop()
+        return outcomes, row_id
+
+    outcomes, row_id = asyncio.run(run())
+    assert store.batches == [3, 1, 1, 1, 1]
+    assert all(isinstance(outcome, DatabaseError) for outcome in outcomes)
+    assert db.get_comparison(row_id).tibco_url == "http://tibco/3"
+
+
+def test_writer_retries_a_failed_batch_row_by_row(db):
+    store = _RecordingDB(db, reject=lambda result: result["tibco_url"] == "http://tibco/1")
+
+    async def run():
+        writer = ComparisonWriter(store, max_batch=10, flush_interval=0.05)
+        outcomes = await asyncio.gather(*(writer.submit(_result(i)) for i in range(3)), return_exceptions=True)
+        await writer.stop()
+        return outcomes
+
+    outcomes = asyncio.run(run())
+    assert store.batches == [3, 1, 1, 1]
+    assert isinstance(outcomes[1], DatabaseError)
+    assert db.get_comparison(outcomes[0]).tibco_url == "http://tibco/0"
+    assert db.get_comparison(outcomes[2]).tibco_url == "http://tibco/2"
+
+
+def test_writer_stop_flushes_queued_results(db):
+    async def run():
+        writer = ComparisonWriter(db, flush_interval=0.2)
+        pending = asyncio.ensure_future(writer.submit(_result(0)))
+        await asyncio.sleep(0)
+        await writer.stop()
+        return await pending
+
+    assert db.get_comparison(asyncio.run(run())) is not None
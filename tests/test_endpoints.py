@@ -0,0 +1,91 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import endpoints
+from app.config import settings
+
+ALLOWED = "http://upstream.test/orders?orderNo=1"
+OTHER = "http://169.254.169.254/latest/meta-data"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_ALLOWED_HOSTS", ["upstream.test"])
+    calls = []
+
+    async def run_batch(pairs, compare_type="xml", concurrency=None):
+        calls.append(pairs)
+        return {"total": len(pairs), "succeeded": len(pairs), "failed": 0, "with_differences": 0, "items": []}
+
+    async def iter_batch(pairs, compare_type="xml", concurrency=None):
+        calls.append(pairs)
+        for index, (tibco_url, python_url) in enumerate(pairs):
+            yield {"index": index, "tibco_url": tibco_url, "python_url": python_url, "status": "ok"}
+        yield {"summary": {"total": len(pairs)}}
+
+    async def run_large_comparison(tibco_url=None, python_url=None):
+        calls.append([(tibco_url, python_url)])
+        return {"id": 1, "has_differences": False, "metrics": {}}
+
+    monkeypatch.setattr(endpoints.engine, "run_batch", run_batch)
+    monkeypatch.setattr(endpoints.engine, "iter_batch", iter_batch)
+    monkeypatch.setattr(endpoints.engine, "run_large_comparison", run_large_comparison)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    with TestClient(app) as test_client:
+        test_client.calls = calls
+        yield test_client
+
+
+def test_batch_rejects_pairs_outside_the_allowlist(client):
+    body = {"pairs": [{"tibco_url": ALLOWED, "python_url": ALLOWED},
+                      {"tibco_url": ALLOWED, "python_url": OTHER}]}
+    response = client.post("/api/v1/compare/batch", json=body)
+    assert response.status_code == 400
+    assert "Pair 1" in response.json()["detail"]
+    assert client.calls == []
+
+
+def test_batch_rejects_non_http_schemes(client):
+    body = {"pairs": [{"tibco_url": "file:///etc/passwd", "python_url": ALLOWED}]}
+    assert client.post("/api/v1/compare/batch", json=body).status_code == 400
+
+
+def test_batch_runs_allowed_pairs(client):
+    body = {"pairs": [{"tibco_url": ALLOWED, "python_url": "https://UPSTREAM.test/orders?orderNo=2"}]}
+    response = client.post("/api/v1/compare/batch", json=body)
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+
+
+def test_streamed_batch_checks_templates_before_streaming(client):
+    body = {"tibco_url_template": "http://upstream.test/o?orderNo={order_no}",
+            "python_url_template": "http://evil.test/o?orderNo={order_no}",
+            "order_numbers": ["1", "2"]}
+    response = client.post("/api/v1/compare/batch?stream=true", json=body)
+    assert response.status_code == 400
+    assert client.calls == []
+
+    body["python_url_template"] = "https://upstream.test/o?orderNo={order_no}"
+    response = client.post("/api/v1/compare/batch?stream=true", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(endpoints.NDJSON_MEDIA_TYPE)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r.get("index") for r in records] == [0, 1, None]
+    assert records[-1] == {"summary": {"total": 2}}
+
+
+def test_large_comparison_checks_supplied_urls_only(client):
+    assert client.post("/api/v1/compare/large", params={"tibco_url": OTHER}).status_code == 400
+    assert client.post("/api/v1/compare/large", params={"python_url": ALLOWED}).status_code == 200
+    assert client.calls == [[(None, ALLOWED)]]
+
+
+def test_allowlist_defaults_to_the_configured_upstream_hosts(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_ALLOWED_HOSTS", [])
+    monkeypatch.setattr(settings, "TIBCO_URL", "http://tibco.test:8023/orders")
+    monkeypatch.setattr(settings, "PYTHON_URL", "http://python.test/orders")
+    assert endpoints._allowed_upstream_hosts() == {"tibco.test", "python.test"}
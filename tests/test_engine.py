@@ -0,0 +1,337 @@
+import asyncio
+import time
+
+import pytest
+
+from app.config import settings
+from app.core.comparator import ResponseComparator
+from app.core.engine import ComparisonEngine, ComparisonError, _record
+from app.core import engine as engine_module
+from app.core.workers import DiffWorkerPool, run_large_diff, run_pipeline
+from app.data import db as db_module
+from app.data.db import close_pools
+from app.models import ComparisonResult
+
+
+def _sleep_then_return(seconds: float, value):
+    time.sleep(seconds)
+    return value
+
+
+def _fail():
+    raise ValueError("bad payload")
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_PATH", str(tmp_path / "comparisons.db"))
+    db_module.comparison_cache.invalidate()
+    engine = ComparisonEngine()
+    engine.db.migrate()
+    yield engine
+    engine.close()
+    engine.thread_pool.shutdown(wait=False)
+    close_pools()
+    db_module.comparison_cache.invalidate()
+
+
+def _fake_fetch_to_file(bodies, delay=0.0, calls=None):
+    async def fetch_to_file(url, path):
+        if calls is not None:
+            calls.append(url)
+        await asyncio.sleep(delay)
+        with open(path, "wb") as target:
+            target.write(bodies[url].encode("utf-8"))
+    return fetch_to_file
+
+
+def _counting_run(calls, delay=0.1, error=None):
+    async def run_comparison(compare_type, tibco_url, python_url):
+        calls.append((tibco_url, python_url, compare_type))
+        run_id = len(calls)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return ComparisonResult(id=run_id, tibco_response="<a/>", python_response="<a/>",
+                                differences="", metrics={"n": run_id})
+    return run_comparison
+
+
+def test_worker_pool_timeout_kills_only_that_task():
+    pool = DiffWorkerPool(max_workers=2)
+
+    async def scenario():
+        slow = asyncio.ensure_future(pool.run(time.sleep, 30, timeout=2))
+        other = asyncio.ensure_future(pool.run(_sleep_then_return, 3, "done", timeout=20))
+        with pytest.raises(asyncio.TimeoutError):
+            await slow
+        # The concurrent task is still running in its own worker and finishes normally
+        assert not other.done()
+        assert await other == "done"
+        # The killed worker's slot is refilled on demand
+        assert await pool.run(_sleep_then_return, 0, 42, timeout=20) == 42
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_cancellation_kills_the_worker():
+    pool = DiffWorkerPool(max_workers=1)
+
+    async def scenario():
+        task = asyncio.ensure_future(pool.run(time.sleep, 30, timeout=60))
+        while not pool._busy:
+            await asyncio.sleep(0.05)
+        worker = next(iter(pool._busy))
+        await asyncio.sleep(1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        worker.process.join(timeout=5)
+        assert not worker.process.is_alive()
+        assert pool._idle == []
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_reraises_task_errors_and_keeps_the_worker():
+    pool = DiffWorkerPool(max_workers=1)
+
+    async def scenario():
+        with pytest.raises(ValueError, match="bad payload"):
+            await pool.run(_fail, timeout=20)
+        assert len(pool._idle) == 1
+        assert await pool.run(_sleep_then_return, 0, "ok", timeout=20) == "ok"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+
+def test_offloaded_diff_timeout_raises_comparison_error(engine, monkeypatch):
+    monkeypatch.setattr(settings, "DIFF_EXECUTOR", "process")
+    monkeypatch.setattr(settings, "DIFF_INLINE_MAX_BYTES", 0)
+    monkeypatch.setattr(settings, "DIFF_TIMEOUT", 1.0)
+
+    with pytest.raises(ComparisonError, match="did not finish"):
+        asyncio.run(engine._run_offloaded(time.sleep, 30, size=1))
+
+
+def test_diff_pipeline_matches_inline_run(engine, monkeypatch):
+    monkeypatch.setattr(settings, "DIFF_EXECUTOR", "process")
+    monkeypatch.setattr(settings, "DIFF_CACHE_ENABLED", False)
+    tibco = "<root><a>1</a><b>2</b></root>"
+    python = "<root><a>1</a><b>3</b></root>"
+
+    monkeypatch.setattr(settings, "DIFF_INLINE_MAX_BYTES", 1 << 20)
+    inline = asyncio.run(engine._diff(tibco, python, "xml", None))
+    monkeypatch.setattr(settings, "DIFF_INLINE_MAX_BYTES", 0)
+    offloaded = asyncio.run(engine._diff(tibco, python, "xml", None))
+
+    assert offloaded == inline
+    assert inline[0] and inline[2] is not None
+
+
+def test_pipeline_view_shows_raw_bodies_when_normalized():
+    tibco = "<r>\n  <ts>2024-01-01T00:00:00.123Z</ts>\n  <v>1</v>\n</r>"
+    python = "<r>\n  <ts>2024-01-01T00:00:00.456Z</ts>\n  <v>2</v>\n</r>"
+    diff_args = ("text", [], "keyed", [])
+
+    _, _, view = run_pipeline(tibco, python, "xml", diff_args, ([], None, 1), 1 << 20)
+    assert view == ResponseComparator.build_view(tibco, python)
+
+    diff, metrics, view = run_pipeline(tibco, python, "xml", diff_args, None, 1 << 20)
+    assert (diff, metrics) == ResponseComparator.compare_xml(tibco, python)
+    assert view == ResponseComparator.build_view(tibco, python)
+
+
+def test_large_diff_matches_pipeline(tmp_path):
+    tibco = '<r messageNo="1"><a>1</a><b>2.001</b><c>x</c></r>'
+    python = '<r messageNo="2">\n  <a>1</a>\n  <b>2.004</b>\n  <c>y</c>\n  <d/>\n</r>'
+    normalize_args = (["messageNo"], 2, 1)
+    line_options = {"window": 50, "max_line_bytes": 64, "max_hunk_lines": 100}
+    (tmp_path / "t").write_text(tibco)
+    (tmp_path / "p").write_text(python)
+
+    metrics = run_large_diff(str(tmp_path / "t"), str(tmp_path / "p"), str(tmp_path / "d"),
+                             normalize_args, line_options)
+    diff, expected, _ = run_pipeline(tibco, python, "xml", ("text", [], "keyed", []), normalize_args,
+                                     0, line_options)
+    assert metrics == expected
+    assert (tmp_path / "d").read_text() == diff
+
+
+def test_large_comparison_reports_the_same_metrics_as_run_comparison(engine, monkeypatch, tmp_path):
+    bodies = {"http://t/1": "<r><a>1</a><b>2</b><c>3</c></r>",
+              "http://p/1": "<r>\n<a>1</a>\n<b>20</b>\n<c>3</c>\n<d/>\n</r>"}
+    monkeypatch.setattr(settings, "NORMALIZE_ENABLED", True)
+    monkeypatch.setattr(settings, "XML_DIFF_MODE", "text")
+    monkeypatch.setattr(settings, "DIFF_EXECUTOR", "process")
+    monkeypatch.setattr(settings, "DIFF_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "STREAM_TEMP_DIR", tmp_path)
+    monkeypatch.setattr(engine_module, "fetch_to_file", _fake_fetch_to_file(bodies))
+
+    large = asyncio.run(engine.run_large_comparison("http://t/1", "http://p/1"))
+    _, metrics, _, _ = asyncio.run(engine._diff(bodies["http://t/1"], bodies["http://p/1"], "xml", None))
+    assert large["metrics"] == metrics
+    assert large["has_differences"] and large["id"]
+    assert not [p for p in tmp_path.iterdir() if p.is_dir()]  # temp files removed
+
+
+def test_large_comparison_deadline_and_coalescing(engine, monkeypatch):
+    bodies = {"http://t/1": "<r/>", "http://p/1": "<r/>"}
+    calls = []
+    monkeypatch.setattr(settings, "DIFF_EXECUTOR", "thread")
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    monkeypatch.setattr(settings, "COALESCE_WINDOW", 0.0)
+    monkeypatch.setattr(engine_module, "fetch_to_file", _fake_fetch_to_file(bodies, 0.2, calls))
+
+    async def concurrent():
+        return await asyncio.gather(*(engine.run_large_comparison("http://t/1", "http://p/1") for _ in range(3)))
+
+    results = asyncio.run(concurrent())
+    assert len(calls) == 2
+    assert results[0] == results[1] == results[2] and results[0] is not results[1]
+
+    monkeypatch.setattr(settings, "COMPARISON_DEADLINE", 0.05)
+    with pytest.raises(ComparisonError, match="deadline"):
+        asyncio.run(engine.run_large_comparison("http://t/1", "http://p/1"))
+
+
+def test_concurrent_comparisons_of_a_pair_share_one_run(engine, monkeypatch):
+    calls = []
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    monkeypatch.setattr(engine, "_run_comparison", _counting_run(calls))
+
+    async def scenario():
+        return await asyncio.gather(
+            engine.run_comparison("xml", "http://t/1", "http://p/1"),
+            engine.run_comparison("xml", "http://t/1", "http://p/1"),
+            engine.run_comparison("xml", "http://t/2", "http://p/2"),
+            engine.run_comparison("json", "http://t/1", "http://p/1"),
+        )
+
+    first, second, other_pair, other_type = asyncio.run(scenario())
+    assert len(calls) == 3
+    assert first == second and first is not second
+    first.metrics["n"] = 99  # each caller gets its own copy
+    assert second.metrics["n"] != 99
+    assert other_pair.id != first.id and other_type.id != first.id
+
+
+def test_coalescing_reuses_a_finished_run_only_within_the_window(engine, monkeypatch):
+    calls = []
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    monkeypatch.setattr(settings, "COALESCE_WINDOW", 0.5)
+    monkeypatch.setattr(engine, "_run_comparison", _counting_run(calls, delay=0))
+
+    async def scenario():
+        first = await engine.run_comparison("xml", "http://t/1", "http://p/1")
+        within = await engine.run_comparison("xml", "http://t/1", "http://p/1")
+        await asyncio.sleep(0.6)
+        after = await engine.run_comparison("xml", "http://t/1", "http://p/1")
+        return first, within, after
+
+    first, within, after = asyncio.run(scenario())
+    assert within.id == first.id == 1
+    assert after.id == 2 and len(calls) == 2
+
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", False)
+    asyncio.run(scenario())
+    assert len(calls) == 5
+
+
+def test_a_failed_shared_run_fails_every_caller(engine, monkeypatch):
+    calls = []
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    monkeypatch.setattr(settings, "COALESCE_WINDOW", 0.0)
+    monkeypatch.setattr(engine, "_run_comparison", _counting_run(calls, error=ComparisonError("upstream down")))
+
+    async def scenario():
+        return await asyncio.gather(
+            *(engine.run_comparison("xml", "http://t/1", "http://p/1") for _ in range(3)),
+            return_exceptions=True
+        )
+
+    outcomes = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(o, ComparisonError) and str(o) == "upstream down" for o in outcomes)
+    # The failure is not reused once the window has passed
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+class _Upstream:
+    """fetch_conditional stand-in: answers 304 when the request's ETag matches ``etag``"""
+
+    def __init__(self, body, etag=None):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    async def __call__(self, url, etag=None, last_modified=None):
+        self.requests.append(etag)
+        if etag is not None and etag == self.etag:
+            return None, etag, None
+        return self.body, self.etag, None
+
+
+def _counting_validator_reads(engine, monkeypatch):
+    reads = []
+    get_validator = engine.db.get_validator
+
+    def counted(url):
+        reads.append(url)
+        return get_validator(url)
+
+    monkeypatch.setattr(engine.db, "get_validator", counted)
+    return reads
+
+
+def test_not_modified_reuses_the_stored_body(engine, monkeypatch):
+    upstream = _Upstream("<order>1</order>", etag='"v1"')
+    monkeypatch.setattr(engine_module, "fetch_conditional", upstream)
+    body, body_hash, not_modified = asyncio.run(engine._fetch_conditional("http://t/1"))
+    assert (body, not_modified) == ("<order>1</order>", False)
+    engine.db.save_comparisons([_record(ComparisonResult(
+        tibco_response=body, python_response="<order/>", differences="", metrics={}))])
+
+    # A fresh engine revalidates with the persisted ETag and serves the stored blob
+    engine._validators.clear()
+    upstream.body = None
+    assert asyncio.run(engine._fetch_conditional("http://t/1")) == ("<order>1</order>", body_hash, True)
+    assert upstream.requests == [None, '"v1"']
+
+
+def test_not_modified_with_pruned_body_refetches(engine, monkeypatch):
+    upstream = _Upstream("<order>1</order>", etag='"v1"')
+    monkeypatch.setattr(engine_module, "fetch_conditional", upstream)
+    asyncio.run(engine._fetch_conditional("http://t/1"))  # validator saved, body never stored
+
+    assert asyncio.run(engine._fetch_conditional("http://t/1"))[::2] == ("<order>1</order>", False)
+    assert upstream.requests == [None, '"v1"', None]
+
+
+def test_missing_validators_are_cached(engine, monkeypatch):
+    upstream = _Upstream("<order>1</order>")
+    monkeypatch.setattr(engine_module, "fetch_conditional", upstream)
+    reads = _counting_validator_reads(engine, monkeypatch)
+
+    for _ in range(3):
+        assert asyncio.run(engine._fetch_conditional("http://t/1"))[2] is False
+    assert reads == ["http://t/1"]
+    assert upstream.requests == [None, None, None]
+
+    # An upstream that stops sending validators is not revalidated with the old ones
+    upstream.etag = '"v2"'
+    asyncio.run(engine._fetch_conditional("http://t/2"))
+    upstream.etag = None
+    asyncio.run(engine._fetch_conditional("http://t/2"))
+    asyncio.run(engine._fetch_conditional("http://t/2"))
+    assert upstream.requests[3:] == [None, '"v2"', None]
@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services import fetcher
+from app.services.fetcher import CircuitBreaker, CircuitOpenError
+
+
+class _Clock:
+    """Stands in for the ``time`` module inside the fetcher"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(fetcher, "time", clock)
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "BREAKER_RESET_TIMEOUT", 30.0)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("upstream")
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_success()
+    assert breaker.consecutive_failures == 0
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+    assert breaker.status()["retry_in"] == 30.0
+
+
+def test_breaker_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker("upstream")
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 29.9
+    assert not breaker.allow_request()
+    clock.now += 0.1
+    assert breaker.allow_request()
+    assert breaker.state == "half_open"
+    assert not breaker.allow_request()  # only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow_request()
+
+
+def test_breaker_half_open_trial_reopens_on_failure(clock):
+    breaker = CircuitBreaker("upstream")
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 30.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+    assert breaker.status()["retry_in"] == 30.0
+
+    clock.now += 30.0
+    assert breaker.allow_request()
+    assert breaker.state == "half_open"
+
+
+def test_requests_fail_fast_while_circuit_is_open(clock, monkeypatch):
+    monkeypatch.setattr(fetcher, "_breakers", {})
+    monkeypatch.setattr(settings, "HTTP_RETRIES", 1)
+    monkeypatch.setattr(settings, "HTTP_RETRY_BACKOFF", 0.0)
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise httpx.ConnectError("refused")
+
+    url = "http://upstream.test/order"
+    with pytest.raises(ValueError, match="Connection error"):
+        asyncio.run(fetcher._request_with_retries(url, send))
+    assert len(calls) == 2
+
+    # The third failure opens the breaker, so the retry is refused without sending
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(fetcher._request_with_retries(url, send))
+    assert len(calls) == 3
+    assert fetcher.breaker_states()["upstream.test"]["state"] == "open"
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from app.core.normalizer import ResponseNormalizer, compile_path_matcher
+
+
+@pytest.mark.parametrize("pattern, path, expected", [
+    ("messageNo", ".messageNo", True),
+    ("messageNo", ".order.header.messageNo", True),
+    ("messageNo", ".Order.@messageNo", True),
+    ("messageNo", ".order.messageNoSuffix", False),
+    ("order.orderDate", ".order.orderDate", True),
+    ("order.orderDate", ".other.order.orderDate", False),
+    ("order.*.price", ".order.lines.price", True),
+    ("order.*.price", ".order.lines.items.price", False),
+    ("order.**.price", ".order.price", True),
+    ("order.**.price", ".order.lines.items.price", True),
+    ("order.line*Price", ".order.linePrice", True),
+    ("order.line*Price", ".order.lines.linePrice", False),
+    ("Order.Line.@ts", ".Order.Line.@ts", True),
+    ("Order.Line.@ts", ".Order.Line.ts", False),
+])
+def test_path_matcher_globs(pattern, path, expected):
+    matcher = compile_path_matcher((pattern,))
+    assert (matcher.fullmatch(path) is not None) is expected
+
+
+def test_path_matcher_without_patterns():
+    assert compile_path_matcher(()) is None
+    assert compile_path_matcher(("", " ")) is None
+
+
+def test_json_is_canonical_and_drops_ignored_paths():
+    normalizer = ResponseNormalizer(["messageNo", "payment.authCode"])
+    tibco = json.dumps({"messageNo": 1, "b": 1, "a": [{"y": 2, "x": 1}], "payment": {"authCode": "A"}})
+    python = json.dumps({"a": [{"x": 1, "y": 2}], "payment": {"authCode": "B"}, "b": 1, "messageNo": 2})
+    assert normalizer.normalize(tibco) == normalizer.normalize(python)
+    assert json.loads(normalizer.normalize(tibco)) == {"a": [{"x": 1, "y": 2}], "b": 1, "payment": {}}
+
+
+def test_xml_is_canonical_and_drops_ignored_paths():
+    normalizer = ResponseNormalizer(["messageNo", "authCode"])
+    tibco = '<?xml version="1.0"?><Order b="1" a="2" messageNo="7"><!-- x --><Line> hi </Line>' \
+            '<authCode>1</authCode></Order>'
+    python = '<Order a="2"  b="1" messageNo="8">\n  <Line>hi</Line>\n  <authCode>2</authCode>\n</Order>'
+    assert normalizer.normalize(tibco) == normalizer.normalize(python)
+    assert normalizer.normalize(tibco) == '<Order a="2" b="1">\n  <Line>hi</Line>\n</Order>'
+
+
+def test_format_is_detected_from_the_body():
+    normalizer = ResponseNormalizer(["messageNo"])
+    assert "messageNo" not in normalizer.normalize('\n  {"messageNo": 1, "a": 2}')
+    assert "messageNo" not in normalizer.normalize('\ufeff<a messageNo="1"/>')
+
+
+def test_unparseable_or_unknown_bodies_pass_through():
+    normalizer = ResponseNormalizer(["messageNo"])
+    assert normalizer.normalize('<a><b>') == '<a><b>'
+    assert normalizer.normalize('{"messageNo": ') == '{"messageNo": '
+    assert normalizer.normalize('plain text') == 'plain text'
+
+
+def test_decimals_and_timestamps():
+    normalizer = ResponseNormalizer(decimals=2, timestamp_resolution=1)
+    tibco = json.loads(normalizer.normalize('{"qty": 1.005, "ts": "2024-01-01T10:00:00.9Z"}'))
+    python = json.loads(normalizer.normalize('{"qty": 1.0049, "ts": "2024-01-01T05:00:00-05:00"}'))
+    assert tibco == python == {"qty": 1.0, "ts": "2024-01-01T10:00:00+00:00"}
+    assert normalizer.normalize('<a p="10.5">10.499</a>') == '<a p="10.50">10.50</a>'
+
+
+def test_xml_file_normalization_matches_in_memory(tmp_path):
+    normalizer = ResponseNormalizer(["messageNo"], decimals=2)
+    body = '\ufeff\n<?xml version="1.0"?><x:Order xmlns:x="urn:o" messageNo="1"><x:Line p="1.005">a &amp; b' \
+           '</x:Line><Empty q="&quot;"/><!-- c --><Line>  </Line></x:Order>'
+    source = tmp_path / "body.xml"
+    source.write_bytes(body.encode("utf-8"))
+
+    with open(source, "rb") as src, open(tmp_path / "out.xml", "wb") as target:
+        assert normalizer.normalize_xml_file(src, target, chunk_bytes=7)
+    assert (tmp_path / "out.xml").read_text(encoding="utf-8") == normalizer.normalize(body)
+
+    source.write_bytes(b"<a><b>")
+    with open(source, "rb") as src, open(tmp_path / "out.xml", "wb") as target:
+        assert not normalizer.normalize_xml_file(src, target)
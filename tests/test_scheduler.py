@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.core.scheduler import ComparisonScheduler, _Target
+from app.models import ComparisonResult
+
+
+class _FakeEngine:
+    """run_comparison that takes ``duration`` seconds and fails while ``failing``"""
+
+    def __init__(self, duration=0.0, failing=False):
+        self.duration = duration
+        self.failing = failing
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def run_comparison(self, compare_type="xml", tibco_url=None, python_url=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.duration)
+            if self.failing:
+                raise RuntimeError("upstream down")
+            return ComparisonResult(id=self.calls, tibco_response="", python_response="",
+                                    differences="", metrics={})
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def scheduler_settings(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_TARGETS",
+                        [{"name": "orders", "tibco_url": "http://t/1", "python_url": "http://p/1"}])
+    monkeypatch.setattr(settings, "SCHEDULER_INTERVAL", 0.1)
+    monkeypatch.setattr(settings, "SCHEDULER_JITTER", 0.0)
+    monkeypatch.setattr(settings, "SCHEDULER_MAX_CONCURRENCY_PER_TARGET", 1)
+    monkeypatch.setattr(settings, "SCHEDULER_BACKOFF_MAX", 0.5)
+
+
+def _run_for(scheduler: ComparisonScheduler, seconds: float):
+    async def scenario():
+        scheduler.start()
+        await asyncio.sleep(seconds)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    return scheduler.targets[0]
+
+
+def test_tick_is_skipped_while_a_run_is_in_flight(scheduler_settings):
+    engine = _FakeEngine(duration=0.45)
+    target = _run_for(ComparisonScheduler(engine), 0.7)
+
+    assert engine.max_in_flight == 1
+    assert target.skipped >= 1
+    assert target.runs == 1 and target.last_result_id == 1
+
+
+def test_consecutive_failures_back_off_up_to_the_cap(scheduler_settings):
+    scheduler = ComparisonScheduler(_FakeEngine())
+    target = _Target("orders", "http://t/1", "http://p/1", 1)
+    assert scheduler._delay(target) == pytest.approx(0.1)
+    target.consecutive_failures = 2
+    assert scheduler._delay(target) == pytest.approx(0.4)
+    target.consecutive_failures = 10
+    assert scheduler._delay(target) == pytest.approx(0.5)
+
+
+def test_failures_are_counted_and_reset_by_a_success(scheduler_settings):
+    engine = _FakeEngine(failing=True)
+    scheduler = ComparisonScheduler(engine)
+    target = _run_for(scheduler, 0.5)
+
+    # Backoff spaces the failing runs out: 0.2s, then 0.4s, instead of every 0.1s
+    assert engine.calls == 2
+    assert target.failures == target.consecutive_failures == 2
+    assert target.last_error == "upstream down"
+
+    engine.failing = False
+    asyncio.run(scheduler._run(target))
+    assert target.consecutive_failures == 0 and target.failures == 2
+    assert target.last_error is None and target.runs == 3
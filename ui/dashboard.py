@@ -1,490 +1,658 @@
-import streamlit as st
-import requests
-import time
-from datetime import datetime
-from difflib import unified_diff, ndiff
-from typing import List, Dict, Tuple, Optional
-from html import escape
-import uuid
-from app.config import settings
-
-API_BASE_URL = settings.API_BASE_URL
-
-# API documentation curl commands with proper versioning
-compare_curl = f"""curl -X 'POST' \\
-  '{API_BASE_URL}/api/v1/compare' \\
-  -H 'accept: application/json' \\
-  -d ''
-"""
-
-latest_curl = f"""curl -X 'GET' \\
-  '{API_BASE_URL}/api/v1/latest' \\
-  -H 'accept: application/json'
-"""
-
-history_curl = f"""curl -X 'GET' \\
-  '{API_BASE_URL}/api/v1/history?limit=10' \\
-  -H 'accept: application/json'
-"""
-
-docs_curl = f"""curl -X 'GET' \\
-  '{API_BASE_URL}/docs' \\
-  -H 'accept: application/json'
-"""
-
-
-def show_api_endpoints():
-    """Display API documentation in sidebar"""
-    st.sidebar.title("API Documentation")
-    with st.sidebar.expander("Compare APIs"):
-        st.markdown("**POST** - Run a new comparison")
-        st.code(compare_curl, language="bash")
-    with st.sidebar.expander("Get Latest Comparison"):
-        st.markdown("**GET** - Get the latest comparison result")
-        st.code(latest_curl, language="bash")
-    with st.sidebar.expander("Get History of Comparisons"):
-        st.markdown("**GET** - Get recent comparison results")
-        st.code(history_curl, language="bash")
-    with st.sidebar.expander("API Documentation"):
-        st.markdown("**GET** - OpenAPI/Swagger documentation")
-        st.code(docs_curl, language="bash")
-
-
-def show_api_tester(key_suffix=""):
-    """API testing interface in sidebar"""
-    st.sidebar.title("API Tester")
-    with st.sidebar.expander("Test Endpoints"):
-        endpoint = st.selectbox(
-            "Select Endpoint",
-            ["/api/v1/compare", "/api/v1/latest", "/api/v1/history", "/"],
-            index=0,
-            key=f"api_tester_endpoint{key_suffix}"
-        )
-        if endpoint == "/api/v1/compare":
-            if st.button("Send POST Request", key=f"post_btn{key_suffix}"):
-                with st.spinner("Sending request..."):
-                    try:
-                        response = requests.post(f"{API_BASE_URL}{endpoint}")
-                        if response.status_code == 200:
-                            st.sidebar.success("Request successful!")
-                        else:
-                            st.sidebar.error(f"Error: {response.status_code} - {response.text}")
-                    except Exception as e:
-                        st.sidebar.error(f"Request failed: {str(e)}")
-        else:
-            if st.button("Send GET Request", key=f"get_btn{key_suffix}"):
-                with st.spinner("Sending request..."):
-                    try:
-                        response = requests.get(f"{API_BASE_URL}{endpoint}")
-                        if response.status_code == 200:
-                            st.sidebar.success("Request successful!")
-                        else:
-                            st.sidebar.error(f"Error: {response.status_code} - {response.text}")
-                    except Exception as e:
-                        st.sidebar.error(f"Request failed: {str(e)}")
-
-
-def fetch_latest_comparison() -> Optional[Dict]:
-    """Fetch the latest comparison from API"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/api/v1/latest")
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"API connection failed: {str(e)}")
-        return None
-
-
-def fetch_comparisons(limit: int = 10) -> List[Dict]:
-    """Fetch comparison history from API"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/api/v1/history", params={"limit": limit})
-        if response.status_code == 200:
-            return response.json()
-        return []
-    except requests.exceptions.RequestException as e:
-        st.error(f"API connection failed: {str(e)}")
-        return []
-
-
-def parse_diff(old_text: str, new_text: str) -> Tuple[Dict[str, List[str]], str]:
-    """Parse differences between two texts"""
-    diff = list(unified_diff(
-        old_text.splitlines(),
-        new_text.splitlines(),
-        fromfile='tibco',
-        tofile='python'
-    ))
-    changes = {'added': [], 'removed': [], 'changed': []}
-    for line in diff[3:]:
-        if line.startswith('+') and not line.startswith('+++'):
-            field = line[1:].split(':')[0].strip(' "\'')
-            if field:
-                changes['added'].append(field)
-        elif line.startswith('-') and not line.startswith('---'):
-            field = line[1:].split(':')[0].strip(' "\'')
-            if field:
-                changes['removed'].append(field)
-    changes['changed'] = list(set(changes['added']) & set(changes['removed']))
-    changes['added'] = [f for f in changes['added'] if f not in changes['changed']]
-    changes['removed'] = [f for f in changes['removed'] if f not in changes['changed']]
-    return changes, '\n'.join(diff)
-
-
-def prepare_report_text(changes: Dict[str, List[str]], diff_text: str) -> str:
-    """Prepare a text report of differences"""
-    content = []
-    if changes['changed']:
-        content.append("Changed Fields:\n" + "\n".join([f"- {field}" for field in changes['changed']]) + "\n")
-    if changes['added']:
-        content.append("Added Fields:\n" + "\n".join([f"+ {field}" for field in changes['added']]) + "\n")
-    if changes['removed']:
-        content.append("Removed Fields:\n" + "\n".join([f"- {field}" for field in changes['removed']]) + "\n")
-    content.append("Full Differences:\n" + diff_text)
-    return "\n\n".join(content)
-
-
-def render_github_like_diff(diff_text: str):
-    """Render diff in GitHub style"""
-    styled_lines = []
-    for line in diff_text.splitlines():
-        if line.startswith('+') and not line.startswith('+++'):
-            styled_lines.append(
-                f'<div style="background-color:#e6ffed;padding:2px 6px;font-family:monospace;">{line}</div>')
-        elif line.startswith('-') and not line.startswith('---'):
-            styled_lines.append(
-                f'<div style="background-color:#ffeef0;padding:2px 6px;font-family:monospace;">{line}</div>')
-        elif line.startswith('@@'):
-            styled_lines.append(
-                f'<div style="background-color:#f0f0f0;padding:2px 6px;font-family:monospace;font-weight:bold;">{line}</div>')
-        else:
-            styled_lines.append(
-                f'<div style="background-color:#f6f8fa;padding:2px 6px;font-family:monospace;">{line}</div>')
-    html_diff = "\n".join(styled_lines)
-    st.markdown(html_diff, unsafe_allow_html=True)
-
-
-def render_split_diff(old: str, new: str):
-    """Render side-by-side diff view"""
-    left_lines = old.splitlines()
-    right_lines = new.splitlines()
-    diffs = list(ndiff(left_lines, right_lines))
-    table_style = """
-        <style>
-        .diff-wrapper {
-            overflow-x: auto;
-            border: 1px solid #ccc;
-            max-width: 100%;
-            padding: 10px;
-        }
-        .diff-table {
-            border-collapse: collapse;
-            width: 100%;
-            font-family: monospace;
-            table-layout: fixed;
-        }
-        .diff-table th, .diff-table td {
-            padding: 6px 10px;
-            vertical-align: top;
-            word-wrap: break-word;
-            border: 1px solid #ddd;
-            white-space: pre-wrap;
-        }
-        .diff-add {
-            background-color: #e6ffed;
-        }
-        .diff-remove {
-            background-color: #ffeef0;
-        }
-        .diff-context {
-            background-color: #f6f8fa;
-        }
-        .diff-empty {
-            background-color: #fff;
-        }
-        </style>
-    """
-    html = [table_style, "<div class='diff-wrapper'>", "<table class='diff-table'>",
-            "<tr><th>TIBCO</th><th>Python</th></tr>"]
-    for line in diffs:
-        tag = line[0]
-        content = escape(line[2:])
-        if tag == ' ':
-            left_cell = f"<td class='diff-context'>{content}</td>"
-            right_cell = f"<td class='diff-context'>{content}</td>"
-        elif tag == '-':
-            left_cell = f"<td class='diff-remove'>{content}</td>"
-            right_cell = f"<td class='diff-empty'></td>"
-        elif tag == '+':
-            left_cell = f"<td class='diff-empty'></td>"
-            right_cell = f"<td class='diff-add'>{content}</td>"
-        else:
-            continue
-        html.append(f"<tr>{left_cell}{right_cell}</tr>")
-    html.append("</table></div>")
-    st.markdown("\n".join(html), unsafe_allow_html=True)
-
-
-def show_comparison_result(comp: Dict, idx: int, section_prefix: str = "recent"):
-    """Display a single comparison result"""
-    if not all(k in comp for k in ['tibco_response', 'python_response']):
-        st.error("Invalid comparison data structure")
-        return
-
-    diff_mode = st.radio(
-        "Select Diff View Mode",
-        ["Unified", "Split"],
-        horizontal=True,
-        key=f"diff_mode_{section_prefix}_{idx}"
-    )
-    changes, diff_text = parse_diff(comp["tibco_response"], comp["python_response"])
-    report_text = prepare_report_text(changes, diff_text)
-
-    with st.expander("View Detailed Differences", expanded=False):
-        if diff_mode == "Unified":
-            render_github_like_diff(diff_text)
-        else:
-            render_split_diff(comp["tibco_response"], comp["python_response"])
-
-    with st.expander("View Full Responses", expanded=False):
-        col1, col2 = st.columns(2)
-        with col1:
-            st.subheader("TIBCO Response")
-            st.code(comp["tibco_response"],
-                    language="xml" if comp["tibco_response"].strip().startswith('<') else "json")
-        with col2:
-            st.subheader("Python Response")
-            st.code(comp["python_response"],
-                    language="xml" if comp["python_response"].strip().startswith('<') else "json")
-
-    st.download_button(
-        label="Download Full Differences Report",
-        data=report_text,
-        file_name=f"comparison_{comp.get('id', uuid.uuid4().hex)}.txt",
-        mime="text/plain",
-        key=f"dl_{section_prefix}_{idx}"
-    )
-
-
-def show_dashboard():
-    """Main dashboard function"""
-    st.set_page_config(layout="wide", page_title="Comparison Dashboard", page_icon="🔍")
-    show_api_endpoints()
-    show_api_tester(key_suffix="_main")
-
-    st.title("Comparison Dashboard")
-    st.markdown("---")
-
-    # Initialize session state with robust structure
-    if 'comparison_data' not in st.session_state:
-        st.session_state.comparison_data = {
-            'all_history': [],  # Complete history from API
-            'latest': None,  # Latest comparison object
-            'last_fetched': None,  # Timestamp of last fetch
-            'api_status': 'pending'  # API health status
-        }
-
-    def fetch_all_comparisons():
-        """Fetch and validate all comparison data from API"""
-        try:
-            # Get full history with increased timeout
-            history_response = requests.get(f"{API_BASE_URL}/api/v1/history?limit=20", timeout=10)
-            if history_response.status_code != 200:
-                st.session_state.comparison_data['api_status'] = f"history_error_{history_response.status_code}"
-                return False
-
-            history = history_response.json()
-            if not isinstance(history, list):
-                st.session_state.comparison_data['api_status'] = "history_invalid_format"
-                return False
-
-            # Get latest comparison with validation
-            latest_response = requests.get(f"{API_BASE_URL}/api/v1/latest", timeout=10)
-            if latest_response.status_code != 200:
-                st.session_state.comparison_data['api_status'] = f"latest_error_{latest_response.status_code}"
-                return False
-
-            latest = latest_response.json()
-            if not all(k in latest for k in ['id', 'tibco_response', 'python_response']):
-                st.session_state.comparison_data['api_status'] = "latest_incomplete_data"
-                return False
-
-            # Update session state
-            st.session_state.comparison_data = {
-                'all_history': history,
-                'latest': latest,
-                'last_fetched': datetime.now().isoformat(),
-                'api_status': "ok"
-            }
-            return True
-
-        except requests.exceptions.RequestException as e:
-            st.session_state.comparison_data['api_status'] = f"request_error_{str(e)}"
-            return False
-        except Exception as e:
-            st.session_state.comparison_data['api_status'] = f"unexpected_error_{str(e)}"
-            return False
-
-    # Initial data load
-    if not st.session_state.comparison_data['all_history']:
-        with st.spinner("Loading comparison history..."):
-            if not fetch_all_comparisons():
-                st.error("Initial data load failed")
-
-    # Run new comparison
-    with st.form("new_comparison"):
-        st.subheader("Run New Comparison")
-        if st.form_submit_button("Execute Comparison"):
-            with st.spinner("Running comparison..."):
-                try:
-                    response = requests.post(f"{API_BASE_URL}/api/v1/compare", timeout=10)
-                    if response.status_code == 200:
-                        st.success("Comparison completed!")
-                        # Force full refresh
-                        if fetch_all_comparisons():
-                            st.rerun()
-                        else:
-                            st.warning("Refresh after comparison failed")
-                    else:
-                        st.error(f"Comparison failed: {response.text}")
-                except Exception as e:
-                    st.error(f"Request failed: {str(e)}")
-
-    # Display controls
-    with st.container():
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🔄 Refresh All Data", help="Force reload from API"):
-                with st.spinner("Refreshing data..."):
-                    if fetch_all_comparisons():
-                        st.rerun()
-                    else:
-                        st.error("Refresh failed")
-        with col2:
-            debug_expander = st.expander("🔍 Debug Tools")
-
-    # Display latest comparison with validation
-    st.subheader("Latest Comparison")
-    latest = st.session_state.comparison_data.get('latest')
-    if latest:
-        if all(k in latest for k in ['tibco_response', 'python_response']):
-            show_comparison_result(latest, 0, "latest")
-        else:
-            st.error("Latest comparison has missing data")
-    else:
-        st.warning("No latest comparison available")
-
-    # Display recent comparisons with robust handling
-    st.subheader("Recent Comparisons")
-    all_history = st.session_state.comparison_data.get('all_history', [])
-    latest_id = latest.get('id') if latest else None
-
-    if len(all_history) > 0:
-        # Create list of recent comparisons excluding latest
-        recent_comparisons = [
-            comp for comp in all_history
-            if str(comp.get('id')) != str(latest_id)
-        ]
-
-        if recent_comparisons:
-            st.success(f"Showing {len(recent_comparisons)} recent comparisons (of {len(all_history)} total)")
-
-            # Display each comparison with validation
-            for idx, comp in enumerate(recent_comparisons[:10], 1):  # Limit to 10
-                if not all(k in comp for k in ['tibco_response', 'python_response']):
-                    st.error(f"Comparison #{comp.get('id')} has missing data - skipping")
-                    continue
-
-                with st.expander(f"Comparison #{comp.get('id', idx)} - {comp.get('created_at', 'Unknown date')}"):
-                    show_comparison_result(comp, idx, "recent")
-        else:
-            st.info("No additional comparisons found (only latest available)")
-    else:
-        st.warning("No comparison history available")
-
-    # Enhanced debug information
-    with debug_expander:
-        st.write("### System Status")
-        status_col1, status_col2 = st.columns(2)
-
-        with status_col1:
-            st.write("**API Status:**")
-            status = st.session_state.comparison_data.get('api_status', 'unknown')
-            if status == 'ok':
-                st.success("✅ Operational")
-            else:
-                st.error(f"❌ {status}")
-
-            st.write("**Last Fetched:**")
-            st.write(st.session_state.comparison_data.get('last_fetched', 'Never'))
-
-        with status_col2:
-            st.write("**Data Counts:**")
-            st.write(f"Total: {len(all_history)}")
-            st.write(f"Latest ID: {latest_id or 'None'}")
-
-        st.write("### Verification Tools")
-
-        if st.button("Verify API Endpoints"):
-            try:
-                st.write("#### History Endpoint")
-                history_resp = requests.get(f"{API_BASE_URL}/api/v1/history?limit=5")
-                if history_resp.status_code == 200:
-                    history_data = history_resp.json()
-                    st.success(f"✅ Returned {len(history_data)} comparisons")
-                    st.json({
-                        "sample_ids": [x.get('id') for x in history_data],
-                        "first_item": {k: v for k, v in history_data[0].items()
-                                       if k in ['id', 'created_at']} if history_data else None
-                    })
-                else:
-                    st.error(f"❌ Failed: {history_resp.status_code}")
-
-                st.write("#### Latest Endpoint")
-                latest_resp = requests.get(f"{API_BASE_URL}/api/v1/latest")
-                if latest_resp.status_code == 200:
-                    latest_data = latest_resp.json()
-                    st.success("✅ Operational")
-                    st.json({
-                        "id": latest_data.get('id'),
-                        "created_at": latest_data.get('created_at')
-                    })
-                else:
-                    st.error(f"❌ Failed: {latest_resp.status_code}")
-
-            except Exception as e:
-                st.error(f"Verification failed: {str(e)}")
-
-        if st.button("Check Data Consistency"):
-            try:
-                history = requests.get(f"{API_BASE_URL}/api/v1/history?limit=1").json()
-                latest = requests.get(f"{API_BASE_URL}/api/v1/latest").json()
-
-                st.write("#### Consistency Report")
-                cols = st.columns(3)
-
-                with cols[0]:
-                    st.write("**History**")
-                    st.write(f"Count: {len(history)}")
-                    st.write(f"First ID: {history[0]['id'] if history else 'None'}")
-
-                with cols[1]:
-                    st.write("**Latest**")
-                    st.write(f"ID: {latest.get('id', 'None')}")
-
-                with cols[2]:
-                    st.write("**Match**")
-                    if history and latest:
-                        match = history[0]['id'] == latest['id']
-                        st.write("✅" if match else "❌")
-                        st.write("Consistent" if match else "Inconsistent")
-                    else:
-                        st.write("⚠️ No data")
-
-            except Exception as e:
-                st.error(f"Check failed: {str(e)}")
-
-
-if __name__ == "__main__":
-    show_dashboard()
+import streamlit as st
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, List, Dict, Optional, Tuple
+from html import escape
+import uuid
+from app.config import settings
+
+API_BASE_URL = settings.API_BASE_URL
+VIEW_PAGE_LINES = 500  # diff lines fetched and rendered at a time
+HUNKS_PER_PAGE = 20
+
+# API documentation curl commands with proper versioning
+compare_curl = f"""curl -X 'POST' \\
+  '{API_BASE_URL}/api/v1/compare' \\
+  -H 'accept: application/json' \\
+  -d ''
+"""
+
+latest_curl = f"""curl -X 'GET' \\
+  '{API_BASE_URL}/api/v1/latest' \\
+  -H 'accept: application/json'
+"""
+
+history_curl = f"""curl -X 'GET' \\
+  '{API_BASE_URL}/api/v1/history?limit=10' \\
+  -H 'accept: application/json'
+"""
+
+docs_curl = f"""curl -X 'GET' \\
+  '{API_BASE_URL}/docs' \\
+  -H 'accept: application/json'
+"""
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """HTTP session of this browser session, kept across reruns so API connections stay alive.
+
+    requests.Session is not thread-safe, so it is never shared between
+    browser sessions (whose script runs may overlap); reruns of one browser
+    session run one at a time.
+    """
+    if "http_session" not in st.session_state:
+        st.session_state.http_session = _new_session()
+    return st.session_state.http_session
+
+
+_fetcher_local = threading.local()
+
+
+def _fetcher_session() -> requests.Session:
+    """HTTP session of the calling overview fetcher thread (see get_overview_pool)"""
+    if not hasattr(_fetcher_local, "session"):
+        _fetcher_local.session = _new_session()
+    return _fetcher_local.session
+
+
+@st.cache_resource
+def get_overview_pool() -> ThreadPoolExecutor:
+    """Long-lived threads for parallel overview fetches, each with its own HTTP session"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="dashboard-fetch")
+
+
+class _Uncached(Exception):
+    """Raised by a cached function to return ``result`` without it being cached (errors, non-200s)"""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+def _get(path: str, params: Optional[Dict] = None,
+         session: Optional[requests.Session] = None) -> Tuple[int, Any]:
+    response = (session or get_session()).get(f"{API_BASE_URL}{path}", params=params, timeout=30)
+    try:
+        return response.status_code, response.json()
+    except ValueError:
+        return response.status_code, response.text
+
+
+def _fetch_in_worker(path: str, params: Optional[Dict] = None) -> Tuple[int, Any]:
+    return _get(path, params, _fetcher_session())
+
+
+@st.cache_data(ttl=settings.DASHBOARD_CACHE_TTL, show_spinner=False)
+def _cached_get(path: str, **params) -> Tuple[int, Any]:
+    status_code, body = _get(path, params or None)
+    if status_code != 200:
+        raise _Uncached((status_code, body))
+    return status_code, body
+
+
+def api_get(path: str, **params) -> Tuple[int, Any]:
+    """GET an API path; returns (status_code, JSON body or text). Only 200s are cached, per path and params"""
+    try:
+        return _cached_get(path, **params)
+    except _Uncached as e:
+        return e.result
+
+
+@st.cache_data(ttl=settings.DASHBOARD_CACHE_TTL, show_spinner=False)
+def _cached_overview(history_limit: int) -> Dict[str, Tuple[int, Any]]:
+    pool = get_overview_pool()
+    history = pool.submit(_fetch_in_worker, "/api/v1/comparisons", {"limit": history_limit})
+    latest = pool.submit(_fetch_in_worker, "/api/v1/latest")
+    overview = {"history": history.result(), "latest": latest.result()}
+    if any(status_code != 200 for status_code, _ in overview.values()):
+        raise _Uncached(overview)
+    return overview
+
+
+def fetch_overview(history_limit: int) -> Dict[str, Tuple[int, Any]]:
+    """Body-free history listing and latest comparison, fetched in parallel and cached together when both succeed"""
+    try:
+        return _cached_overview(history_limit)
+    except _Uncached as e:
+        return e.result
+
+
+def invalidate_api_cache():
+    """Drop every cached API response (after a new comparison or a manual refresh)"""
+    _cached_get.clear()
+    _cached_overview.clear()
+
+
+def show_api_endpoints():
+    """Display API documentation in sidebar"""
+    st.sidebar.title("API Documentation")
+    with st.sidebar.expander("Compare APIs"):
+        st.markdown("**POST** - Run a new comparison")
+        st.code(compare_curl, language="bash")
+    with st.sidebar.expander("Get Latest Comparison"):
+        st.markdown("**GET** - Get the latest comparison result")
+        st.code(latest_curl, language="bash")
+    with st.sidebar.expander("Get History of Comparisons"):
+        st.markdown("**GET** - Get recent comparison results")
+        st.code(history_curl, language="bash")
+    with st.sidebar.expander("API Documentation"):
+        st.markdown("**GET** - OpenAPI/Swagger documentation")
+        st.code(docs_curl, language="bash")
+
+
+def show_api_tester(key_suffix=""):
+    """API testing interface in sidebar"""
+    st.sidebar.title("API Tester")
+    with st.sidebar.expander("Test Endpoints"):
+        endpoint = st.selectbox(
+            "Select Endpoint",
+            ["/api/v1/compare", "/api/v1/latest", "/api/v1/history", "/"],
+            index=0,
+            key=f"api_tester_endpoint{key_suffix}"
+        )
+        if endpoint == "/api/v1/compare":
+            if st.button("Send POST Request", key=f"post_btn{key_suffix}"):
+                with st.spinner("Sending request..."):
+                    try:
+                        response = get_session().post(f"{API_BASE_URL}{endpoint}")
+                        invalidate_api_cache()
+                        if response.status_code == 200:
+                            st.sidebar.success("Request successful!")
+                        else:
+                            st.sidebar.error(f"Error: {response.status_code} - {response.text}")
+                    except Exception as e:
+                        st.sidebar.error(f"Request failed: {str(e)}")
+        else:
+            if st.button("Send GET Request", key=f"get_btn{key_suffix}"):
+                with st.spinner("Sending request..."):
+                    try:
+                        response = get_session().get(f"{API_BASE_URL}{endpoint}")
+                        if response.status_code == 200:
+                            st.sidebar.success("Request successful!")
+                        else:
+                            st.sidebar.error(f"Error: {response.status_code} - {response.text}")
+                    except Exception as e:
+                        st.sidebar.error(f"Request failed: {str(e)}")
+
+
+def fetch_latest_comparison() -> Optional[Dict]:
+    """Fetch the latest comparison from API"""
+    try:
+        status_code, body = api_get("/api/v1/latest")
+        if status_code == 200:
+            return body
+        return None
+    except requests.exceptions.RequestException as e:
+        st.error(f"API connection failed: {str(e)}")
+        return None
+
+
+def fetch_comparisons(limit: int = 10) -> List[Dict]:
+    """Fetch comparison history from API"""
+    try:
+        status_code, body = api_get("/api/v1/history", limit=limit)
+        if status_code == 200:
+            return body
+        return []
+    except requests.exceptions.RequestException as e:
+        st.error(f"API connection failed: {str(e)}")
+        return []
+
+
+def fetch_comparison_detail(comparison_id) -> Optional[Dict]:
+    """Fetch one full comparison (responses and diff); only called when its row is opened"""
+    try:
+        status_code, body = api_get(f"/api/v1/comparisons/{comparison_id}")
+        if status_code == 200:
+            return body
+        return None
+    except requests.exceptions.RequestException as e:
+        st.error(f"API connection failed: {str(e)}")
+        return None
+
+
+def fetch_view_index(comparison_id) -> Optional[Dict]:
+    """Fetch the field changes and hunk index of a comparison's precomputed diff view"""
+    try:
+        status_code, body = api_get(f"/api/v1/comparisons/{comparison_id}/view/index")
+        if status_code == 200:
+            return body
+        return None
+    except requests.exceptions.RequestException as e:
+        st.error(f"API connection failed: {str(e)}")
+        return None
+
+
+def fetch_view_lines(comparison_id, kind: str, offset: int, limit: int) -> List[List]:
+    """Fetch one page of unified or side-by-side diff lines"""
+    try:
+        status_code, body = api_get(f"/api/v1/comparisons/{comparison_id}/view/lines",
+                                    kind=kind, offset=offset, limit=limit)
+        if status_code == 200:
+            return body["lines"]
+        return []
+    except requests.exceptions.RequestException as e:
+        st.error(f"API connection failed: {str(e)}")
+        return []
+
+
+def fetch_unified_text(comparison_id, total: int) -> str:
+    """Plain unified diff text, fetched page by page (only used for the downloadable report)"""
+    if not total:
+        return ""
+    lines = ["--- tibco", "+++ python"]
+    for offset in range(0, total, 5000):
+        for tag, _, _, text in fetch_view_lines(comparison_id, "unified", offset, 5000):
+            lines.append(text if tag == '@' else tag + text)
+    return "\n".join(lines)
+
+
+def prepare_report_text(changes: Dict[str, List[str]], diff_text: str) -> str:
+    """Prepare a text report of differences"""
+    content = []
+    if changes['changed']:
+        content.append("Changed Fields:\n" + "\n".join([f"- {field}" for field in changes['changed']]) + "\n")
+    if changes['added']:
+        content.append("Added Fields:\n" + "\n".join([f"+ {field}" for field in changes['added']]) + "\n")
+    if changes['removed']:
+        content.append("Removed Fields:\n" + "\n".join([f"- {field}" for field in changes['removed']]) + "\n")
+    content.append("Full Differences:\n" + diff_text)
+    return "\n\n".join(content)
+
+
+def render_github_like_diff(lines: List[List]):
+    """Render diff lines ([tag, old_no, new_no, text]) in GitHub style"""
+    line_style = "padding:2px 6px;font-family:monospace;white-space:pre-wrap;"
+    backgrounds = {'+': "#e6ffed", '-': "#ffeef0", ' ': "#f6f8fa"}
+    styled_lines = []
+    for tag, _, _, text in lines:
+        if tag == '@':
+            styled_lines.append(
+                f'<div style="background-color:#f0f0f0;{line_style}font-weight:bold;">{escape(text)}</div>')
+        else:
+            styled_lines.append(
+                f'<div style="background-color:{backgrounds[tag]};{line_style}">{escape(tag + text)}</div>')
+    html_diff = "\n".join(styled_lines)
+    st.markdown(html_diff, unsafe_allow_html=True)
+
+
+def render_split_diff(rows: List[List], skipped_before: int = 0):
+    """Render side-by-side diff rows ([old_no, old, new_no, new, kind]) from the backend"""
+    table_style = """
+        <style>
+        .diff-wrapper {
+            overflow-x: auto;
+            border: 1px solid #ccc;
+            max-width: 100%;
+            padding: 10px;
+        }
+        .diff-table {
+            border-collapse: collapse;
+            width: 100%;
+            font-family: monospace;
+            table-layout: fixed;
+        }
+        .diff-table th, .diff-table td {
+            padding: 6px 10px;
+            vertical-align: top;
+            word-wrap: break-word;
+            border: 1px solid #ddd;
+            white-space: pre-wrap;
+        }
+        .diff-add {
+            background-color: #e6ffed;
+        }
+        .diff-remove {
+            background-color: #ffeef0;
+        }
+        .diff-context {
+            background-color: #f6f8fa;
+        }
+        .diff-empty {
+            background-color: #fff;
+        }
+        </style>
+    """
+    left_class = {'context': 'diff-context', 'change': 'diff-remove', 'remove': 'diff-remove', 'add': 'diff-empty'}
+    right_class = {'context': 'diff-context', 'change': 'diff-add', 'remove': 'diff-empty', 'add': 'diff-add'}
+    html = [table_style, "<div class='diff-wrapper'>", "<table class='diff-table'>",
+            "<tr><th>TIBCO</th><th>Python</th></tr>"]
+    if skipped_before:
+        html.append(f"<tr><td class='diff-context' colspan='2'>⋯ {skipped_before} unchanged lines</td></tr>")
+    for _, left, _, right, kind in rows:
+        left_cell = f"<td class='{left_class[kind]}'>{escape(left) if left is not None else ''}</td>"
+        right_cell = f"<td class='{right_class[kind]}'>{escape(right) if right is not None else ''}</td>"
+        html.append(f"<tr>{left_cell}{right_cell}</tr>")
+    html.append("</table></div>")
+    st.markdown("\n".join(html), unsafe_allow_html=True)
+
+
+def show_metrics(metrics: Dict):
+    """Display the change metrics computed by the backend comparator"""
+    if not metrics or "changed_lines" not in metrics:
+        return
+    cols = st.columns(5)
+    cols[0].metric("Added", metrics.get("added_lines", 0))
+    cols[1].metric("Removed", metrics.get("removed_lines", 0))
+    cols[2].metric("Modified", metrics.get("modified_lines", 0))
+    cols[3].metric("Hunks", metrics.get("hunks", 0))
+    if "similarity" in metrics:
+        cols[4].metric("Similarity", f"{metrics['similarity']:.1%}")
+
+
+def paged_offset(count: int, key: str, page_size: int = VIEW_PAGE_LINES, label: str = "Page") -> int:
+    """Page selector for ``count`` items; returns the offset of the chosen page"""
+    pages = (count + page_size - 1) // page_size
+    if pages <= 1:
+        return 0
+    page = st.number_input(f"{label} (of {pages})", min_value=1, max_value=pages, value=1, key=key)
+    return (page - 1) * page_size
+
+
+def show_diff_viewer(comparison_id, index: Dict, diff_mode: str, key_prefix: str):
+    """Windowed diff viewer: hunks are folded and only the open hunks' visible page of lines is fetched"""
+    hunks = index["hunks"]
+    if not hunks:
+        st.info("No differences")
+        return
+    hunk_start = paged_offset(len(hunks), f"{key_prefix}_hunk_page", HUNKS_PER_PAGE, "Hunk page")
+    for number in range(hunk_start, min(hunk_start + HUNKS_PER_PAGE, len(hunks))):
+        hunk = hunks[number]
+        label = f"{hunk['header']}  (+{hunk['added']} / -{hunk['removed']})"
+        if not st.toggle(label, key=f"{key_prefix}_hunk_{number}"):
+            continue
+        page_key = f"{key_prefix}_hunk_{number}_page"
+        if diff_mode == "Unified":
+            offset = paged_offset(hunk["count"], page_key)
+            limit = min(VIEW_PAGE_LINES, hunk["count"] - offset)
+            render_github_like_diff(fetch_view_lines(comparison_id, "unified", hunk["offset"] + offset, limit))
+        else:
+            offset = paged_offset(hunk["split_count"], page_key)
+            limit = min(VIEW_PAGE_LINES, hunk["split_count"] - offset)
+            skipped = 0
+            if index["split_context"] == "full" and not offset:
+                previous = hunks[number - 1] if number else None
+                skipped = hunk["split_offset"] - (previous["split_offset"] + previous["split_count"] if previous else 0)
+            render_split_diff(fetch_view_lines(comparison_id, "split", hunk["split_offset"] + offset, limit),
+                              skipped_before=skipped)
+
+
+def show_comparison_result(comp: Dict, idx: int, section_prefix: str = "recent"):
+    """Display a single comparison result"""
+    if not all(k in comp for k in ['tibco_response', 'python_response']):
+        st.error("Invalid comparison data structure")
+        return
+
+    show_metrics(comp.get("metrics", {}))
+
+    diff_mode = st.radio(
+        "Select Diff View Mode",
+        ["Unified", "Split"],
+        horizontal=True,
+        key=f"diff_mode_{section_prefix}_{idx}"
+    )
+    index = fetch_view_index(comp["id"]) if "id" in comp else None
+    if index is None:
+        st.error("Diff view unavailable for this comparison")
+        return
+
+    with st.expander("View Detailed Differences", expanded=False):
+        show_diff_viewer(comp["id"], index, diff_mode, f"{section_prefix}_{idx}")
+
+    with st.expander("View Full Responses", expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("TIBCO Response")
+            st.code(comp["tibco_response"],
+                    language="xml" if comp["tibco_response"].strip().startswith('<') else "json")
+        with col2:
+            st.subheader("Python Response")
+            st.code(comp["python_response"],
+                    language="xml" if comp["python_response"].strip().startswith('<') else "json")
+
+    # The full report needs every diff line, so it is only fetched on request
+    if st.button("Prepare Differences Report", key=f"report_{section_prefix}_{idx}"):
+        report_text = prepare_report_text(index["changes"], fetch_unified_text(comp["id"], index["unified_lines"]))
+        st.download_button(
+            label="Download Full Differences Report",
+            data=report_text,
+            file_name=f"comparison_{comp.get('id', uuid.uuid4().hex)}.txt",
+            mime="text/plain",
+            key=f"dl_{section_prefix}_{idx}"
+        )
+
+
+def show_dashboard():
+    """Main dashboard function"""
+    st.set_page_config(layout="wide", page_title="Comparison Dashboard", page_icon="🔍")
+    show_api_endpoints()
+    show_api_tester(key_suffix="_main")
+
+    st.title("Comparison Dashboard")
+    st.markdown("---")
+
+    # Initialize session state with robust structure
+    if 'comparison_data' not in st.session_state:
+        st.session_state.comparison_data = {
+            'all_history': [],  # Complete history from API
+            'latest': None,  # Latest comparison object
+            'last_fetched': None,  # Timestamp of last fetch
+            'api_status': 'pending'  # API health status
+        }
+
+    def fetch_all_comparisons():
+        """Fetch and validate all comparison data from API"""
+        try:
+            # History and latest are fetched in parallel and served from cache on reruns
+            overview = fetch_overview(20)
+            history_status, history = overview["history"]
+            if history_status != 200:
+                st.session_state.comparison_data['api_status'] = f"history_error_{history_status}"
+                return False
+
+            if not isinstance(history, dict) or not isinstance(history.get("items"), list):
+                st.session_state.comparison_data['api_status'] = "history_invalid_format"
+                return False
+
+            # Validate latest comparison
+            latest_status, latest = overview["latest"]
+            if latest_status != 200:
+                st.session_state.comparison_data['api_status'] = f"latest_error_{latest_status}"
+                return False
+
+            if not all(k in latest for k in ['id', 'tibco_response', 'python_response']):
+                st.session_state.comparison_data['api_status'] = "latest_incomplete_data"
+                return False
+
+            # Update session state
+            st.session_state.comparison_data = {
+                'all_history': history["items"],
+                'latest': latest,
+                'last_fetched': datetime.now().isoformat(),
+                'api_status': "ok"
+            }
+            return True
+
+        except requests.exceptions.RequestException as e:
+            st.session_state.comparison_data['api_status'] = f"request_error_{str(e)}"
+            return False
+        except Exception as e:
+            st.session_state.comparison_data['api_status'] = f"unexpected_error_{str(e)}"
+            return False
+
+    # Initial data load
+    if not st.session_state.comparison_data['all_history']:
+        with st.spinner("Loading comparison history..."):
+            if not fetch_all_comparisons():
+                st.error("Initial data load failed")
+
+    # Run new comparison
+    with st.form("new_comparison"):
+        st.subheader("Run New Comparison")
+        if st.form_submit_button("Execute Comparison"):
+            with st.spinner("Running comparison..."):
+                try:
+                    response = get_session().post(f"{API_BASE_URL}/api/v1/compare", timeout=10)
+                    if response.status_code == 200:
+                        st.success("Comparison completed!")
+                        invalidate_api_cache()
+                        # Force full refresh
+                        if fetch_all_comparisons():
+                            st.rerun()
+                        else:
+                            st.warning("Refresh after comparison failed")
+                    else:
+                        st.error(f"Comparison failed: {response.text}")
+                except Exception as e:
+                    st.error(f"Request failed: {str(e)}")
+
+    # Display controls
+    with st.container():
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔄 Refresh All Data", help="Force reload from API"):
+                with st.spinner("Refreshing data..."):
+                    invalidate_api_cache()
+                    if fetch_all_comparisons():
+                        st.rerun()
+                    else:
+                        st.error("Refresh failed")
+        with col2:
+            debug_expander = st.expander("🔍 Debug Tools")
+
+    # Display latest comparison with validation
+    st.subheader("Latest Comparison")
+    latest = st.session_state.comparison_data.get('latest')
+    if latest:
+        if all(k in latest for k in ['tibco_response', 'python_response']):
+            show_comparison_result(latest, 0, "latest")
+        else:
+            st.error("Latest comparison has missing data")
+    else:
+        st.warning("No latest comparison available")
+
+    # Display recent comparisons with robust handling
+    st.subheader("Recent Comparisons")
+    all_history = st.session_state.comparison_data.get('all_history', [])
+    latest_id = latest.get('id') if latest else None
+
+    if len(all_history) > 0:
+        # Create list of recent comparisons excluding latest
+        recent_comparisons = [
+            comp for comp in all_history
+            if str(comp.get('id')) != str(latest_id)
+        ]
+
+        if recent_comparisons:
+            st.success(f"Showing {len(recent_comparisons)} recent comparisons (of {len(all_history)} total)")
+
+            # Rows are summaries; the full comparison is only fetched once a row is opened
+            for idx, comp in enumerate(recent_comparisons[:10], 1):  # Limit to 10
+                label = f"Comparison #{comp.get('id', idx)} - {comp.get('created_at', 'Unknown date')}"
+                if not st.toggle(label, key=f"recent_open_{comp.get('id', idx)}"):
+                    continue
+                detail = fetch_comparison_detail(comp['id'])
+                if detail is None:
+                    st.error(f"Comparison #{comp.get('id')} could not be loaded")
+                    continue
+                with st.container(border=True):
+                    show_comparison_result(detail, idx, "recent")
+        else:
+            st.info("No additional comparisons found (only latest available)")
+    else:
+        st.warning("No comparison history available")
+
+    # Enhanced debug information
+    with debug_expander:
+        st.write("### System Status")
+        status_col1, status_col2 = st.columns(2)
+
+        with status_col1:
+            st.write("**API Status:**")
+            status = st.session_state.comparison_data.get('api_status', 'unknown')
+            if status == 'ok':
+                st.success("✅ Operational")
+            else:
+                st.error(f"❌ {status}")
+
+            st.write("**Last Fetched:**")
+            st.write(st.session_state.comparison_data.get('last_fetched', 'Never'))
+
+        with status_col2:
+            st.write("**Data Counts:**")
+            st.write(f"Total: {len(all_history)}")
+            st.write(f"Latest ID: {latest_id or 'None'}")
+
+        st.write("### Verification Tools")
+
+        if st.button("Verify API Endpoints"):
+            try:
+                st.write("#### History Endpoint")
+                history_status, history_data = api_get("/api/v1/history", limit=5)
+                if history_status == 200:
+                    st.success(f"✅ Returned {len(history_data)} comparisons")
+                    st.json({
+                        "sample_ids": [x.get('id') for x in history_data],
+                        "first_item": {k: v for k, v in history_data[0].items()
+                                       if k in ['id', 'created_at']} if history_data else None
+                    })
+                else:
+                    st.error(f"❌ Failed: {history_status}")
+
+                st.write("#### Latest Endpoint")
+                latest_status, latest_data = api_get("/api/v1/latest")
+                if latest_status == 200:
+                    st.success("✅ Operational")
+                    st.json({
+                        "id": latest_data.get('id'),
+                        "created_at": latest_data.get('created_at')
+                    })
+                else:
+                    st.error(f"❌ Failed: {latest_status}")
+
+            except Exception as e:
+                st.error(f"Verification failed: {str(e)}")
+
+        if st.button("Check Data Consistency"):
+            try:
+                history = api_get("/api/v1/history", limit=1)[1]
+                latest = api_get("/api/v1/latest")[1]
+
+                st.write("#### Consistency Report")
+                cols = st.columns(3)
+
+                with cols[0]:
+                    st.write("**History**")
+                    st.write(f"Count: {len(history)}")
+                    st.write(f"First ID: {history[0]['id'] if history else 'None'}")
+
+                with cols[1]:
+                    st.write("**Latest**")
+                    st.write(f"ID: {latest.get('id', 'None')}")
+
+                with cols[2]:
+                    st.write("**Match**")
+                    if history and latest:
+                        match = history[0]['id'] == latest['id']
+                        st.write("✅" if match else "❌")
+                        st.write("Consistent" if match else "Inconsistent")
+                    else:
+                        st.write("⚠️ No data")
+
+            except Exception as e:
+                st.error(f"Check failed: {str(e)}")
+
+
+if __name__ == "__main__":
+    show_dashboard()